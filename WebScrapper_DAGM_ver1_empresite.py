@@ -8,16 +8,11 @@ import time
 from pathlib import Path
 from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 
-import tkinter as tk
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-from tkinter import messagebox, ttk
+from normalizacion import limpiar_email, normalizar_telefono, obtener_dominio
+from registros_compactos import Empresa, a_json
 
+# Selenium, bs4 y tkinter se importan dentro de las funciones que los usan:
+# importar el modulo (parseo offline, lotes, benchmarks) no carga el stack del navegador.
 
 OUTPUT_DIR = Path("resultados")
 OUTPUT_DIR.mkdir(exist_ok=True)
@@ -60,15 +55,17 @@ EXCLUDE_HTML_PATTERNS = re.compile(
 )
 
 CHROME_PROFILE_DIR = Path("selenium_profile_empresite")
-DETAIL_DELAY_SECONDS = (0.0, 0.0)
-PAGE_DELAY_SECONDS = (0.0, 0.0)
-COOLDOWN_EVERY_N_DETAILS = 0
-COOLDOWN_SECONDS = (0.0, 0.0)
+# Pausa entre cargas del navegador: ritmo adaptativo (ritmo_adaptativo) en vez de pausas fijas.
+# Empieza sin pausa; paginas de desafio o errores de carga la doblan, y cada carga buena la baja.
+PAUSA_INICIAL_SECONDS = 0.0
 # Para testing/interaccion con captcha: mantener navegador visible.
 BROWSER_HIDE_ENABLED = False
 BROWSER_HIDDEN_POS = (-32000, -32000)  # Windows: off-screen (si se activa)
 BROWSER_VISIBLE_POS = (60, 60)
 BROWSER_VISIBLE_SIZE = (1200, 900)
+# Las fichas se parsean en procesos (tuberia_parseo) mientras el navegador carga la siguiente.
+# Con un solo navegador dos procesos bastan para que el parseo nunca le haga esperar; 0 = sin procesos.
+PROCESOS_PARSEO = 2
 
 def aplicar_filtros_empresite(base_url, solo_con_email):
     """
@@ -92,29 +89,6 @@ telefono_regex = re.compile(r"(\+34\s?\d{9}|\b\d{9}\b)")
 email_regex = re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
 
 
-def limpiar_email(email):
-    return email.strip().rstrip(".,;:")
-
-
-def normalizar_telefono(telefono):
-    telefono = telefono.replace(" ", "").replace("-", "")
-    if telefono.startswith("+34"):
-        return telefono
-    if telefono.isdigit() and len(telefono) == 9:
-        return f"+34{telefono}"
-    return telefono
-
-
-def obtener_dominio(url):
-    try:
-        dominio = urlparse(url).netloc.lower()
-        if dominio.startswith("www."):
-            dominio = dominio[4:]
-        return dominio if "." in dominio else None
-    except Exception:
-        return None
-
-
 def obtener_dominio_fiable(data):
     if data["web"] != "No disponible":
         dominio = obtener_dominio(data["web"])
@@ -258,6 +232,10 @@ def nombre_desde_url_ficha(detail_url):
 
 
 def crear_driver(use_profile=True):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
     options = Options()
     # Mantener visible para poder interactuar con cookies/captcha.
     options.add_argument("--start-maximized")
@@ -302,6 +280,10 @@ def intentar_aceptar_cookies(driver, log_func, timeout=6):
     """
     Intenta cerrar/aceptar banners de cookies comunes.
     """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
     labels = [
         "Aceptar",
         "Aceptar todo",
@@ -352,6 +334,10 @@ def humanizar_pagina(driver):
 
 
 def esperar_y_obtener_html(driver, url, log_func, timeout=25, esperar_email=False):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
     driver.get(url)
     try:
         WebDriverWait(driver, timeout).until(
@@ -377,6 +363,8 @@ def esperar_y_obtener_html(driver, url, log_func, timeout=25, esperar_email=Fals
 
 
 def extraer_datos_ficha_desde_html(html):
+    from bs4 import BeautifulSoup
+
     datos = {"email": "No disponible", "web": "No disponible", "telefono": "No disponible"}
     soup = BeautifulSoup(html, "html.parser")
 
@@ -403,85 +391,193 @@ def extraer_datos_ficha_desde_html(html):
     return datos
 
 
-def iniciar_scraping_empresite(base_url, max_paginas, log_func, use_profile=True, pagina_inicio=1):
+def fichas_de_listado(html):
+    """
+    (url_ficha, texto, title) de cada empresa de un listado, sin repetir; None si la pagina
+    no tiene ningun enlace de ficha.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    anchors = soup.select(
+        'a[onclick*="location.href"], a[href$=".html"], a[href*="/empresa/"], a[href*="/EMPRESA/"]'
+    )
+    if not anchors:
+        return None
+
+    detail_urls = []
+    seen_page = set()
+    for a in anchors:
+        detail = extraer_url_ficha_empresite(a)
+        if detail and detail not in seen_page:
+            seen_page.add(detail)
+            detail_urls.append((detail, a.get_text(" ", strip=True), a.get("title", "")))
+    return detail_urls
+
+
+def nueva_empresa_de_listado(detail_url, txt, title, localidad):
+    data = new_empresa(localidad_default=localidad)
+    data["url_detalle"] = detail_url
+
+    nombre = (txt or "").strip() or (title or "").strip()
+    if nombre and nombre.lower() != "ver ficha":
+        data["nombre"] = nombre
+    else:
+        data["nombre"] = nombre_desde_url_ficha(detail_url)
+    return data
+
+
+def aplicar_datos_ficha(data, ficha):
+    data["email"] = ficha["email"]
+    data["web"] = ficha["web"]
+    data["telefono"] = ficha["telefono"]
+    return data
+
+
+def anadir_emails_posibles(data):
+    dominio = obtener_dominio_fiable(data)
+    if dominio:
+        data["email_posible_info"] = f"info@{dominio}"
+        data["email_posible_contacto"] = f"contacto@{dominio}"
+        data["email_posible_administracion"] = f"administracion@{dominio}"
+    return data
+
+
+def iniciar_scraping_empresite(
+    base_url,
+    max_paginas,
+    log_func,
+    use_profile=True,
+    pagina_inicio=1,
+    usar_indice=True,
+    archivar_html=False,
+    procesos_parseo=PROCESOS_PARSEO,
+    metricas=None,
+    ritmo=None,
+):
+    from metricas_scraper import MetricasScraper
+    from ritmo_adaptativo import ControlRitmo
+    from tuberia_parseo import TuberiaParseo
+
+    metricas = metricas or MetricasScraper("empresite")
+    # Un solo navegador: concurrencia 1. Sin pico de latencia: el tiempo incluye las esperas de Selenium.
+    ritmo = ritmo or ControlRitmo(
+        concurrencia_inicial=1,
+        concurrencia_maxima=1,
+        pausa_inicial=PAUSA_INICIAL_SECONDS,
+        factor_latencia=None,
+        metricas=metricas,
+        log_func=log_func,
+    )
+
+    def obtener_html(url, esperar_email):
+        # El navegador no da el codigo HTTP: 200 si carga, "error" si no.
+        with ritmo.turno(url) as turno:
+            t0 = time.perf_counter()
+            html, ok = esperar_y_obtener_html(driver, url, log_func, esperar_email=esperar_email)
+            turno.informar(200 if ok else None, html)
+        metricas.registrar_descarga(200 if ok else None, len(html.encode("utf-8")) if ok else 0, time.perf_counter() - t0)
+        return html, ok
+
     tipo, localidad = extraer_tipo_localidad_empresite(base_url)
+    # Toda la ejecucion en memoria: registros compactos, a dict solo al guardar (registros_compactos).
     empresas_totales = []
     vistas = set()
     procesadas = set()  # url_detalle normalizada para no repetir entre paginas
+    # Entre ejecuciones: fichas ya visitadas hace poco no se vuelven a abrir (indice_empresas).
+    indice = None
+    if usar_indice:
+        from indice_empresas import IndiceEmpresas
+
+        indice = IndiceEmpresas()
+    # HTML crudo de listados y fichas para re-parsear sin red (archivo_html).
+    archivo = None
+    if archivar_html:
+        from archivo_html import FUENTE_EMPRESITE, ArchivoHTML
+
+        archivo = ArchivoHTML()
 
     driver = crear_driver(use_profile=use_profile)
+    tuberia = None
     try:
+        tuberia = TuberiaParseo(procesos_parseo, metricas=metricas)
         detalles_ok = 0
         pagina_inicio = max(1, int(pagina_inicio or 1))
         for pagina in range(pagina_inicio, max_paginas + 1):
             list_url = construir_url_empresite(base_url, pagina)
             log_func(f"Scrapeando pagina {pagina}: {list_url}")
-            html, ok = esperar_y_obtener_html(driver, list_url, log_func, esperar_email=False)
+            html, ok = obtener_html(list_url, esperar_email=False)
             if not ok:
                 break
+            if archivo is not None:
+                archivo.guardar(list_url, html, FUENTE_EMPRESITE, "listado", base_url=base_url, pagina=pagina)
 
-            soup = BeautifulSoup(html, "html.parser")
-            anchors = soup.select(
-                'a[onclick*="location.href"], a[href$=".html"], a[href*="/empresa/"], a[href*="/EMPRESA/"]'
-            )
-            if not anchors:
+            with metricas.cronometro("parseo"):
+                detail_urls = fichas_de_listado(html)
+            if detail_urls is None:
                 log_func("No se encontraron fichas en esta pagina.")
                 break
 
-            detail_urls = []
-            seen_page = set()
-            for a in anchors:
-                detail = extraer_url_ficha_empresite(a)
-                if detail and detail not in seen_page:
-                    seen_page.add(detail)
-                    detail_urls.append((detail, a.get_text(" ", strip=True), a.get("title", "")))
-
-            empresas_pagina = []
+            # (url_norm, data, fresca, futuro con los datos de la ficha); se resuelven en orden
+            # al terminar la pagina, cuando el navegador ya no espera al parseo.
+            pendientes = []
             for detail_url, txt, title in detail_urls:
                 url_norm = (detail_url or "").strip().lower()
                 if not url_norm or url_norm in procesadas:
                     continue
                 procesadas.add(url_norm)
 
-                data = new_empresa(localidad_default=localidad)
-                data["url_detalle"] = detail_url
-
-                nombre = (txt or "").strip() or (title or "").strip()
-                if nombre and nombre.lower() != "ver ficha":
-                    data["nombre"] = nombre
-                else:
-                    data["nombre"] = nombre_desde_url_ficha(detail_url)
-
-                detail_html, ok_detail = esperar_y_obtener_html(driver, detail_url, log_func, esperar_email=True)
-                if not ok_detail:
-                    break
-                ficha = extraer_datos_ficha_desde_html(detail_html)
-                data["email"] = ficha["email"]
-                data["web"] = ficha["web"]
-                data["telefono"] = ficha["telefono"]
-
-                dominio = obtener_dominio_fiable(data)
-                if dominio:
-                    data["email_posible_info"] = f"info@{dominio}"
-                    data["email_posible_contacto"] = f"contacto@{dominio}"
-                    data["email_posible_administracion"] = f"administracion@{dominio}"
+                data = nueva_empresa_de_listado(detail_url, txt, title, localidad)
+
+                fresca = False
+                if indice is not None:
+                    guardados, fresca = indice.buscar(data)
+                    if fresca:
+                        indice.completar(data, guardados)
+
+                futuro = None
+                if not fresca:
+                    detail_html, ok_detail = obtener_html(detail_url, esperar_email=True)
+                    if not ok_detail:
+                        break
+                    if archivo is not None:
+                        archivo.guardar(detail_url, detail_html, FUENTE_EMPRESITE, "ficha", base_url=base_url, pagina=pagina)
+                    futuro = tuberia.enviar(extraer_datos_ficha_desde_html, detail_html)
+                    detalles_ok += 1
+                pendientes.append((url_norm, data, fresca, futuro))
+
+            empresas_pagina = []
+            for url_norm, data, fresca, futuro in pendientes:
+                if futuro is not None:
+                    aplicar_datos_ficha(data, futuro.result())
+                anadir_emails_posibles(data)
 
                 # Deduplicacion global: la URL de ficha es el identificador mas estable.
                 clave = url_norm
                 if clave not in vistas and datosvalidos(data):
                     vistas.add(clave)
-                    empresas_totales.append(data)
+                    empresas_totales.append(Empresa.desde_dict(data))
                     empresas_pagina.append(data)
+                    metricas.registrar_empresa(data)
+                    if indice is not None:
+                        indice.registrar(data, fuente="empresite", enriquecida=not fresca)
 
-                detalles_ok += 1
-                # Sin sleeps/cooldowns: máximo ritmo. Si aparece captcha, se esperará en esperar_y_obtener_html.
-
+            metricas.registrar_pagina()
             log_func(f"Pagina {pagina} procesada ({len(empresas_totales)} empresas acumuladas)")
-            guardar_resultado_pagina(base_url, tipo, localidad, pagina, empresas_pagina, log_func)
-            guardar_resultado_acumulado_parcial(base_url, tipo, localidad, pagina, empresas_totales, log_func)
-            # Sin sleep entre paginas.
+            with metricas.cronometro("escritura"):
+                guardar_resultado_pagina(base_url, tipo, localidad, pagina, empresas_pagina, log_func)
+                guardar_resultado_acumulado_parcial(base_url, tipo, localidad, pagina, empresas_totales, log_func)
     finally:
         driver.quit()
+        log_func(f"Ritmo: {ritmo.resumen()}")
+        if tuberia is not None:
+            tuberia.cerrar()
+        if indice is not None:
+            log_func(f"Indice de empresas: {indice.resumen()}")
+            indice.cerrar()
+        if archivo is not None:
+            log_func(f"HTML archivado: {archivo.guardadas} paginas")
+            archivo.cerrar()
 
     return tipo, localidad, empresas_totales
 
@@ -495,7 +591,7 @@ def guardar_resultado(base_url, tipo, localidad, empresas_totales, log_func):
     output = OUTPUT_DIR / generar_nombre_archivo(base_url)
     tmp = output.with_suffix(output.suffix + ".tmp")
     with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(resultado_final, f, ensure_ascii=False, indent=4)
+        json.dump(resultado_final, f, ensure_ascii=False, indent=4, default=a_json)
     tmp.replace(output)
     log_func(f"Scraping finalizado. Total empresas: {len(empresas_totales)}")
     log_func(f"Guardado en: {output}")
@@ -517,7 +613,7 @@ def guardar_resultado_pagina(base_url, tipo, localidad, pagina, empresas_pagina,
 
     tmp = output.with_suffix(output.suffix + ".tmp")
     with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=4)
+        json.dump(payload, f, ensure_ascii=False, indent=4, default=a_json)
     tmp.replace(output)
     log_func(f"Checkpoint pagina {pagina}: {len(empresas_pagina)} empresas guardadas en: {output}")
 
@@ -535,23 +631,56 @@ def guardar_resultado_acumulado_parcial(base_url, tipo, localidad, pagina, empre
     }
     tmp = output.with_suffix(output.suffix + ".tmp")
     with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=4)
+        json.dump(payload, f, ensure_ascii=False, indent=4, default=a_json)
     tmp.replace(output)
     log_func(f"Checkpoint acumulado hasta pagina {pagina}: {len(empresas_totales)} empresas en: {output}")
 
 
-def iniciar_scraping(base_url, max_paginas, log_func, use_profile=True, pagina_inicio=1):
+def iniciar_scraping(
+    base_url,
+    max_paginas,
+    log_func,
+    use_profile=True,
+    pagina_inicio=1,
+    usar_indice=True,
+    archivar_html=False,
+    procesos_parseo=PROCESOS_PARSEO,
+    metricas=None,
+):
+    """
+    Metricas (metricas_scraper) en resultados/metricas/<busqueda>.json mientras dura el scraping;
+    SCRAPER_PERFIL=cprofile|pyinstrument perfila la ejecucion.
+    """
+    from metricas_scraper import RUTA_METRICAS, MetricasScraper, VolcadoMetricas, motor_perfil, perfilar
+
     dominio = obtener_dominio(base_url) or ""
     if "empresite.eleconomista.es" not in dominio:
         log_func("Este scraper es exclusivo para empresite.eleconomista.es")
         return
-    tipo, localidad, empresas_totales = iniciar_scraping_empresite(
-        base_url, max_paginas, log_func, use_profile=use_profile, pagina_inicio=pagina_inicio
-    )
-    guardar_resultado(base_url, tipo, localidad, empresas_totales, log_func)
+    metricas = metricas or MetricasScraper("empresite")
+    nombre = generar_nombre_archivo(base_url).replace(".json", "")
+    with perfilar(motor_perfil(), RUTA_METRICAS / f"{nombre}_perfil", log_func):
+        with VolcadoMetricas(metricas, RUTA_METRICAS / f"{nombre}.json"):
+            tipo, localidad, empresas_totales = iniciar_scraping_empresite(
+                base_url,
+                max_paginas,
+                log_func,
+                use_profile=use_profile,
+                pagina_inicio=pagina_inicio,
+                usar_indice=usar_indice,
+                archivar_html=archivar_html,
+                procesos_parseo=procesos_parseo,
+                metricas=metricas,
+            )
+            with metricas.cronometro("escritura"):
+                guardar_resultado(base_url, tipo, localidad, empresas_totales, log_func)
+    log_func(f"Metricas: {metricas.resumen()}")
 
 
 def lanzar_gui():
+    import tkinter as tk
+    from tkinter import messagebox, ttk
+
     log_queue = queue.Queue()
     running = {"value": False}
 
@@ -573,7 +702,7 @@ def lanzar_gui():
         running["value"] = is_running
         btn_scrap.config(state=("disabled" if is_running else "normal"))
 
-    def worker(url, pagina_inicio, paginas, solo_email, use_profile):
+    def worker(url, pagina_inicio, paginas, solo_email, use_profile, usar_indice, archivar_html):
         try:
             url_filtrada = aplicar_filtros_empresite(url, solo_email)
             iniciar_scraping(
@@ -582,6 +711,8 @@ def lanzar_gui():
                 log,
                 use_profile=use_profile,
                 pagina_inicio=pagina_inicio,
+                usar_indice=usar_indice,
+                archivar_html=archivar_html,
             )
             root.after(0, lambda: messagebox.showinfo("Finalizado", "Scraping completado"))
         except Exception as exc:
@@ -609,6 +740,8 @@ def lanzar_gui():
                 paginas,
                 var_solo_email.get(),
                 var_use_profile.get(),
+                var_indice.get(),
+                var_archivar.get(),
             ),
             daemon=True,
         ).start()
@@ -650,6 +783,20 @@ def lanzar_gui():
         variable=var_use_profile,
     ).pack(anchor="w")
 
+    var_indice = tk.BooleanVar(value=True)
+    ttk.Checkbutton(
+        frame,
+        text="No reabrir fichas ya visitadas (indice de empresas)",
+        variable=var_indice,
+    ).pack(anchor="w")
+
+    var_archivar = tk.BooleanVar(value=False)
+    ttk.Checkbutton(
+        frame,
+        text="Guardar HTML crudo (re-parseo sin red)",
+        variable=var_archivar,
+    ).pack(anchor="w")
+
     btn_scrap = ttk.Button(frame, text="Iniciar scraping", command=ejecutar)
     btn_scrap.pack(pady=10)
 
@@ -1,10 +1,10 @@
 import requests
 from bs4 import BeautifulSoup
-import time
-import random
 import re
 import json
 
+from ritmo_adaptativo import ControlRitmo
+
 # ----------- CONFIGURACIÓN -----------
 BASE_URL = "https://www.paginasamarillas.es/search/asesorias-y-gestorias/all-ma/madrid/all-is/all-ci/all-ba/all-pu/all-nc/{}?co=Asesorias+y+gestorias&what=Asesorias+y+gestorias&ub=false&qc=true"
 
@@ -17,6 +17,9 @@ telefono_regex = re.compile(r"(\+34\d{9}|\b\d{9}\b)")
 
 empresas = []
 
+# Pausa y reintentos por host segun responda el servidor (sustituye a las esperas fijas).
+ritmo = ControlRitmo(concurrencia_maxima=1, log_func=print)
+
 # ----------- SCRAPING AUTOMÁTICO POR PÁGINA -----------
 pagina = 1
 
@@ -24,7 +27,7 @@ while True:
     url = BASE_URL.format(pagina)
     print(f"Scrapeando página {pagina}: {url}")
 
-    response = requests.get(url, headers=HEADERS, timeout=15)
+    response = ritmo.get(requests, url, headers=HEADERS, timeout=15)
     if response.status_code != 200:
         print(f"No se pudo acceder a la página {pagina}. Código: {response.status_code}")
         break
@@ -38,8 +41,6 @@ while True:
         break
 
     for empresa in empresas_html:
-        time.sleep(random.uniform(0.3, 0.8))  # delay por empresa
-
         nombre_empresa = "No disponible"
         telefono = "No disponible"
         sitio_web = "No disponible"
@@ -94,7 +95,6 @@ while True:
         })
 
     pagina += 1
-    time.sleep(random.uniform(1.5, 3))  # delay entre páginas
 
 # ----------- GUARDAR RESULTADOS EN JSON -----------
 with open("empresas_madrid_todas.json", "w", encoding="utf-8") as f:
@@ -1,15 +1,14 @@
-import requests
-from bs4 import BeautifulSoup
-import time
-import random
 import re
 import json
 from pathlib import Path
 from urllib.parse import urlparse
-import tkinter as tk
-from tkinter import ttk, messagebox
 import unicodedata
 
+from paginacion_pa import recorrer_paginas
+
+# requests, bs4 y tkinter se importan dentro de las funciones que los usan:
+# importar el modulo (lotes, benchmarks) no paga su coste de carga.
+
 # ---------------- CONFIGURACIÓN ----------------
 
 BASE_URL = (
@@ -50,13 +49,13 @@ def limpiar_email(email):
     return email.strip().rstrip(".,;:")
 
 def obtener_email_web(url):
+    # Portada + páginas de contacto (contacto_web). Prefiere un email del dominio de la web;
+    # si no hay ninguno, el primero que aparezca (comportamiento de siempre de ver5).
+    from contacto_web import buscar_email_web
+
     try:
-        r = requests.get(url, headers=HEADERS, timeout=10)
-        if r.status_code != 200:
-            return None
-        match = email_regex.search(r.text)
-        return limpiar_email(match.group()) if match else None
-    except:
+        return buscar_email_web(url, HEADERS, solo_dominio=False)
+    except Exception:
         return None
 
 from urllib.parse import parse_qs, urlparse
@@ -170,29 +169,45 @@ def normalizar_telefono(telefono):
 
 
 # ---------------- SCRAPING ----------------
-def iniciar_scraping(base_url, max_paginas, scrapear_email_web, log_func):
+def cajas_empresas(html):
+    from bs4 import BeautifulSoup
 
-    for pagina in range(1, max_paginas + 1):
-        url = construir_url(base_url, pagina)
-        log_func(f"📄 Scrapeando página {pagina}")
+    soup = BeautifulSoup(html, "html.parser")
+    return soup.find_all("div", class_="box")
 
-        response = requests.get(url, headers=HEADERS, timeout=15)
-        if response.status_code != 200:
-            log_func(f"❌ Error HTTP {response.status_code}")
-            break
-
-        soup = BeautifulSoup(response.text, "html.parser")
-        empresas_html = soup.find_all("div", class_="box")
-
-        if not empresas_html:
-            log_func("⚠️ No hay más empresas")
-            break
+def descargar_pagina(url, ritmo=None):
+    # ritmo (ritmo_adaptativo.ControlRitmo): turno del host y reintentos si el servidor rechaza.
+    import requests
 
+    try:
+        if ritmo is not None:
+            response = ritmo.get(requests, url, headers=HEADERS, timeout=15)
+        else:
+            response = requests.get(url, headers=HEADERS, timeout=15)
+        return response.status_code, response.text
+    except requests.RequestException as exc:
+        return None, str(exc)
+
+def iniciar_scraping(base_url, max_paginas, scrapear_email_web, log_func, usar_indice=True, ritmo=None):
+    # max_paginas = 0 recorre todas: el total de páginas se saca de la página 1 (paginacion_pa).
+    # usar_indice: no repetir la búsqueda de email de empresas ya vistas (indice_empresas).
+    # ritmo (ritmo_adaptativo.ControlRitmo): páginas en paralelo y pausa según responda el servidor.
+    from ritmo_adaptativo import ControlRitmo
+
+    # Sin log_func: el ritmo avisaría desde los hilos de descarga y el log de la GUI es de Tk.
+    ritmo = ritmo or ControlRitmo()
+    tipo_empresa, localidad = extraer_info_url(base_url)
+    nombre_archivo = generar_nombre_archivo(base_url)
+    indice = None
+    if usar_indice:
+        from indice_empresas import IndiceEmpresas
+
+        indice = IndiceEmpresas()
+
+    def procesar(pagina, empresas_html):
         empresas = []
 
         for empresa in empresas_html:
-            time.sleep(random.uniform(0.3, 0.8))
-
             data = {
                 "nombre": "No disponible",
                 "telefono": "No disponible",
@@ -239,20 +254,28 @@ def iniciar_scraping(base_url, max_paginas, scrapear_email_web, log_func):
             if web_tag:
                 data["web"] = web_tag["href"].split("?")[0].strip()
 
+            # Empresa ya enriquecida en otra ejecución (indice_empresas)
+            fresca = False
+            if indice is not None:
+                guardados, fresca = indice.buscar(data)
+                if fresca:
+                    indice.completar(data, guardados)
+
             # Email desde web externa
-            if scrapear_email_web and data["email"] == "No disponible" and data["web"] != "No disponible":
+            if not fresca and scrapear_email_web and data["email"] == "No disponible" and data["web"] != "No disponible":
                 email_web = obtener_email_web(data["web"])
                 if email_web:
                     data["email"] = email_web
 
             # Emails posibles
+            dominio = None
             if data["email"] == "No disponible":
                 dominio = obtener_dominio_fiable(data)
             if dominio:
                  data["email_posible_info"] = f"info@{dominio}"
                  data["email_posible_contacto"] = f"contacto@{dominio}"
                  data["email_posible_administracion"] = f"administracion@{dominio}"
-                
+
             # Dirección
             tag = empresa.select_one("span[itemprop='streetAddress']")
             if tag:
@@ -265,33 +288,51 @@ def iniciar_scraping(base_url, max_paginas, scrapear_email_web, log_func):
             tag = empresa.select_one("span[itemprop='addressLocality']")
             if tag:
                 data["localidad"] = tag.get_text(strip=True)
-            
+
             if datosvalidos(data):
                 empresas.append(data)
+                if indice is not None:
+                    indice.registrar(data, fuente="paginasamarillas", enriquecida=scrapear_email_web and not fresca)
             else:
                 log_func("⏭️ Empresa descartada (sin datos útiles)")
 
-
-        tipo_empresa, localidad = extraer_info_url(base_url)
-
         resultado = {
             "localidad": localidad,
             "tipo_empresa": tipo_empresa,
             "resultados": empresas
         }
 
-        nombre_archivo = generar_nombre_archivo(base_url)
         output_file = OUTPUT_DIR / f"{nombre_archivo.replace('.json', '')}_pagina_{pagina}.json"
         with open(output_file, "w", encoding="utf-8") as f:
             json.dump(resultado, f, ensure_ascii=False, indent=4)
 
         log_func(f"✅ Página {pagina} guardada ({len(empresas)} empresas)")
 
+    try:
+        # Tantos hilos como el techo del ritmo: cuántos descargan de verdad lo decide ritmo.turno.
+        recorrer_paginas(
+            base_url,
+            max_paginas,
+            construir_url,
+            lambda url: descargar_pagina(url, ritmo),
+            cajas_empresas,
+            procesar,
+            log_func,
+            hilos=ritmo.concurrencia_maxima,
+        )
+    finally:
+        if indice is not None:
+            log_func(f"🗂️ {indice.resumen()}")
+            indice.cerrar()
+        for host, estado in ritmo.resumen().items():
+            log_func(f"🚦 {host}: {estado}")
     log_func("🎉 Scraping finalizado")
 
 # ---------------- INTERFAZ GRÁFICA ----------------
 
 def lanzar_gui():
+    import tkinter as tk
+    from tkinter import ttk, messagebox
 
     # ---------------- MENÚ CONTEXTUAL ----------------
     def crear_menu_contextual(widget):
@@ -320,7 +361,8 @@ def lanzar_gui():
                 base_url,
                 paginas,
                 var_email_web.get(),
-                log
+                log,
+                usar_indice=var_indice.get()
             )
 
             messagebox.showinfo("Finalizado", "Scraping completado")
@@ -346,9 +388,9 @@ def lanzar_gui():
     entry_url.pack(fill="x", pady=5)
     crear_menu_contextual(entry_url)
 
-    ttk.Label(frame, text="Número de páginas:").pack(anchor="w")
+    ttk.Label(frame, text="Número de páginas (0 = todas):").pack(anchor="w")
     entry_paginas = ttk.Entry(frame)
-    entry_paginas.insert(0, "3")
+    entry_paginas.insert(0, "0")
     entry_paginas.pack(fill="x")
     crear_menu_contextual(entry_paginas)
 
@@ -359,6 +401,13 @@ def lanzar_gui():
         variable=var_email_web
     ).pack(anchor="w", pady=5)
 
+    var_indice = tk.BooleanVar(value=True)
+    ttk.Checkbutton(
+        frame,
+        text="Reutilizar empresas ya vistas (índice)",
+        variable=var_indice
+    ).pack(anchor="w")
+
     ttk.Button(
         frame,
         text="Iniciar scraping",
@@ -1,15 +1,16 @@
-import requests
-from bs4 import BeautifulSoup
 import time
-import random
 import re
 import json
 from pathlib import Path
-from urllib.parse import urlparse, parse_qs
-import tkinter as tk
-from tkinter import ttk, messagebox
+from urllib.parse import urlparse, parse_qs, urlencode
 import unicodedata
 
+from normalizacion import limpiar_email, normalizar_telefono, obtener_dominio
+from paginacion_pa import recorrer_paginas
+
+# requests, bs4 y tkinter se importan dentro de las funciones que los usan:
+# importar el modulo (lotes, benchmarks) no paga su coste de carga.
+
 # ---------------- CONFIGURACIÓN ----------------
 
 HEADERS = {
@@ -25,43 +26,16 @@ email_regex = re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
 
 # ---------------- FUNCIONES AUXILIARES ----------------
 
-def limpiar_email(email):
-    return email.strip().rstrip(".,;:")
-
-def normalizar_telefono(telefono):
-    telefono = telefono.replace(" ", "").replace("-", "")
-    if telefono.startswith("+34"):
-        return telefono
-    if telefono.isdigit() and len(telefono) == 9:
-        return f"+34{telefono}"
-    return telefono
+def obtener_email_web(url):
+    """
+    Extrae email SOLO si coincide con el dominio de la web.
+    Mira la portada y, si no está, sus páginas de contacto/aviso legal (ver contacto_web).
+    """
+    from contacto_web import buscar_email_web
 
-def obtener_dominio(url):
     try:
-        dominio = urlparse(url).netloc.lower()
-        if dominio.startswith("www."):
-            dominio = dominio[4:]
-        return dominio if "." in dominio else None
-    except:
-        return None
-
-def obtener_email_web(url):
-    """Extrae email SOLO si coincide con el dominio de la web"""
-    try:
-        dominio = obtener_dominio(url)
-        if not dominio:
-            return None
-
-        r = requests.get(url, headers=HEADERS, timeout=10)
-        if r.status_code != 200:
-            return None
-
-        for email in email_regex.findall(r.text):
-            email = limpiar_email(email)
-            if dominio in email:
-                return email
-        return None
-    except:
+        return buscar_email_web(url, HEADERS)
+    except Exception:
         return None
 
 def obtener_dominio_fiable(data):
@@ -87,14 +61,29 @@ def datosvalidos(data):
 
 def construir_url(base_url, pagina):
     """
-    Construye la URL reemplazando el número entre comillas después de /all-nc/"
+    Construye la URL reemplazando el número de página después de /all-nc/ (con o sin comillas)
     """
     def reemplazo(match):
         return f'{match.group(1)}{pagina}{match.group(2)}'
 
-    nueva_url = re.sub(r'(/all-nc/")\d+(")', reemplazo, base_url)
+    nueva_url = re.sub(r'(/all-nc/"?)\d+("?)', reemplazo, base_url)
     return nueva_url
-    
+
+def construir_url_busqueda(what, where, provincia="madrid"):
+    """
+    URL base (página 1) de una búsqueda what/where, con el mismo formato que las URLs copiadas
+    del navegador: /search/<what>/all-ma/<provincia>/all-is/<where>/all-ba/all-pu/all-nc/1?what=..&where=..
+    """
+    def slug(texto):
+        texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+        return re.sub(r"[^a-z0-9]+", "-", texto.lower()).strip("-") or "all"
+
+    query = urlencode({"what": what, "where": where, "qc": "true"})
+    return (
+        f"https://www.paginasamarillas.es/search/{slug(what)}/all-ma/{slug(provincia or 'all')}"
+        f"/all-is/{slug(where)}/all-ba/all-pu/all-nc/1?{query}"
+    )
+
 def extraer_info_url(url):
     try:
         params = parse_qs(urlparse(url).query)
@@ -119,108 +108,278 @@ def generar_nombre_archivo(base_url):
 
 # ---------------- SCRAPING ----------------
 
-def iniciar_scraping(base_url, max_paginas, scrapear_email_web, log_func):
+def cajas_empresas(html):
+    """Devuelve los bloques div.box de un listado (lista vacía = no hay más resultados)"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    return soup.find_all("div", class_="box")
+
+def parsear_empresa(empresa, telefono_texto=None):
+    """
+    Datos de un bloque div.box tal y como vienen en el listado (sin red ni índice).
+    telefono_texto: primer teléfono del texto del bloque si ya se buscó por lotes
+    (extraccion_lotes); "" = no tiene. None = buscarlo aquí.
+    """
+    data = {
+        "nombre": "No disponible",
+        "telefono": "No disponible",
+        "email": "No disponible",
+        "email_posible_info": "No disponible",
+        "email_posible_contacto": "No disponible",
+        "email_posible_administracion": "No disponible",
+        "web": "No disponible",
+        "direccion": "No disponible",
+        "codigo_postal": "No disponible",
+        "localidad": "No disponible"
+    }
+
+    # ---------------- NOMBRE ----------------
+    tag = empresa.select_one("span[itemprop='name']")
+    if tag:
+        data["nombre"] = tag.get_text(strip=True)
+
+    # ---------------- TELÉFONO (HIBRIDO) ----------------
+    tel_tag = empresa.find("a", href=re.compile(r"^tel:"))
+    if tel_tag:
+        data["telefono"] = normalizar_telefono(
+            tel_tag["href"].replace("tel:", "")
+        )
+    else:
+        if telefono_texto is None:
+            match = telefono_regex.search(empresa.get_text(" ", strip=True))
+            telefono_texto = normalizar_telefono(match.group()) if match else ""
+        if telefono_texto:
+            data["telefono"] = telefono_texto
+
+    # ---------------- EMAIL DIRECTO ----------------
+    email_tag = empresa.find("a", href=re.compile(r"^mailto:"))
+    if email_tag:
+        data["email"] = limpiar_email(
+            email_tag["href"].replace("mailto:", "")
+        )
+
+    # ---------------- WEB / MÁS INFO (ROBUSTO) ----------------
+    web_tag = empresa.find("a", class_=re.compile("web|website", re.I))
+    if not web_tag:
+        for a in empresa.find_all("a", href=True):
+            href = a["href"]
+            if href.startswith("http") and "paginasamarillas" not in href:
+                web_tag = a
+                break
+
+    if web_tag:
+        data["web"] = web_tag["href"].split("?")[0]
+
+    # ---------------- DIRECCIÓN ----------------
+    tag = empresa.select_one("span[itemprop='streetAddress']")
+    if tag:
+        data["direccion"] = tag.get_text(strip=True)
+
+    tag = empresa.select_one("span[itemprop='postalCode']")
+    if tag:
+        data["codigo_postal"] = tag.get_text(strip=True)
+
+    tag = empresa.select_one("span[itemprop='addressLocality']")
+    if tag:
+        data["localidad"] = tag.get_text(strip=True)
+
+    return data
+
+def parsear_listado(html, extractor=None):
+    """
+    Empresas de un listado completo, sin enriquecer (lista vacía = no hay más resultados).
+    Solo CPU: es la función que ejecutan los procesos de tuberia_parseo.
+    extractor (extraccion_lotes.ExtractorLotes): los teléfonos del texto de todas las cajas
+    se buscan de una pasada en vez de caja a caja (re-parseo del archivo, archivo_html).
+    """
+    cajas = cajas_empresas(html)
+    if extractor is None:
+        return [parsear_empresa(caja) for caja in cajas]
+
+    from extraccion_lotes import extraer_de_cajas
+
+    encontrados = extraer_de_cajas(cajas, extractor)
+    return [parsear_empresa(caja, e.get("telefono") or "") for caja, e in zip(cajas, encontrados)]
 
-    for pagina in range(1, max_paginas + 1):
-        url = construir_url(base_url, pagina)
-        log_func(f"📄 Scrapeando página {pagina}")
+def enriquecer_empresa(data, scrapear_email_web, indice=None):
+    """
+    Completa una empresa de parsear_empresa (email de su web, emails posibles); None si no
+    tiene ningún dato útil.
+    indice (indice_empresas.IndiceEmpresas): si la empresa ya se enriqueció hace poco se
+    reutilizan sus datos y no se vuelve a visitar su web.
+    """
+    # ---------------- ÍNDICE ENTRE EJECUCIONES ----------------
+    fresca = False
+    if indice is not None:
+        guardados, fresca = indice.buscar(data)
+        if fresca:
+            indice.completar(data, guardados)
+
+    # ---------------- EMAIL DESDE WEB ----------------
+    if not fresca and scrapear_email_web and data["email"] == "No disponible" and data["web"] != "No disponible":
+        email_web = obtener_email_web(data["web"])
+        if email_web:
+            data["email"] = email_web
+
+    # ---------------- EMAILS POSIBLES ----------------
+    dominio = obtener_dominio_fiable(data)
+    if dominio:
+        data["email_posible_info"] = f"info@{dominio}"
+        data["email_posible_contacto"] = f"contacto@{dominio}"
+        data["email_posible_administracion"] = f"administracion@{dominio}"
+
+    if not datosvalidos(data):
+        return None
+    if indice is not None:
+        indice.registrar(data, fuente="paginasamarillas", enriquecida=scrapear_email_web and not fresca)
+    return data
 
-        r = requests.get(url, headers=HEADERS, timeout=15)
-        if r.status_code != 200:
-            log_func(f"❌ Error HTTP {r.status_code}")
-            break
+def extraer_empresa(empresa, scrapear_email_web, indice=None):
+    """
+    Extrae los datos de un bloque div.box; None si no tiene ningún dato útil.
+    """
+    return enriquecer_empresa(parsear_empresa(empresa), scrapear_email_web, indice)
 
-        soup = BeautifulSoup(r.text, "html.parser")
-        empresas_html = soup.find_all("div", class_="box")
+def pedir_pagina(url, ritmo=None, cache=None):
+    """
+    requests.Response, o cache_http.RespuestaCache si la página no hizo falta bajarla.
+    ritmo (ritmo_adaptativo.ControlRitmo): turno del host y reintentos si el servidor rechaza.
+    cache (cache_http.CacheHTTP): páginas frescas sin red, caducadas revalidadas (304).
+    """
+    import requests
 
-        if not empresas_html:
-            log_func("⚠️ No hay más empresas")
-            break
+    if cache is not None:
+        return cache.get(requests, url, ritmo=ritmo, headers=HEADERS, timeout=15)
+    if ritmo is not None:
+        return ritmo.get(requests, url, headers=HEADERS, timeout=15)
+    return requests.get(url, headers=HEADERS, timeout=15)
 
+def descargar_pagina(url, ritmo=None, cache=None):
+    import requests
+
+    try:
+        r = pedir_pagina(url, ritmo, cache)
+        return r.status_code, r.text
+    except requests.RequestException as exc:
+        return None, str(exc)
+
+def iniciar_scraping(
+    base_url,
+    max_paginas,
+    scrapear_email_web,
+    log_func,
+    usar_indice=True,
+    archivar_html=False,
+    procesos_parseo=None,
+    metricas=None,
+    ritmo=None,
+    usar_cache=True,
+):
+    """
+    max_paginas: tope de páginas; 0 = todas (el total se calcula con la página 1,
+    ver paginacion_pa). Las páginas conocidas se descargan en paralelo.
+    usar_indice: reutilizar empresas ya enriquecidas en ejecuciones anteriores (indice_empresas).
+    archivar_html: guardar cada listado para re-parsearlo sin red (archivo_html).
+    procesos_parseo: procesos que parsean los listados mientras se descargan los siguientes
+    (tuberia_parseo); None = uno por CPU, 0 = parsear en este hilo.
+    metricas (metricas_scraper.MetricasScraper): por defecto una nueva; se vuelca cada pocos
+    segundos a resultados/metricas/<busqueda>.json. SCRAPER_PERFIL=cprofile|pyinstrument
+    perfila toda la ejecución.
+    ritmo (ritmo_adaptativo.ControlRitmo): páginas en paralelo y pausa entre peticiones según
+    responda el servidor; por defecto uno nuevo (empieza con 2 páginas a la vez y 0.5 s de pausa).
+    usar_cache: listados en resultados/cache_http.sqlite (cache_http); repetir la búsqueda el
+    mismo día no los vuelve a descargar y al día siguiente solo baja los que cambiaron.
+    """
+    from metricas_scraper import RUTA_METRICAS, MetricasScraper, VolcadoMetricas, motor_perfil, perfilar
+    from ritmo_adaptativo import ControlRitmo
+
+    metricas = metricas or MetricasScraper("paginasamarillas")
+    # Sin log_func: el ritmo avisaría desde los hilos de descarga y el log de la GUI es de Tk.
+    ritmo = ritmo or ControlRitmo(metricas=metricas)
+    nombre = generar_nombre_archivo(base_url).replace(".json", "")
+    with perfilar(motor_perfil(), RUTA_METRICAS / f"{nombre}_perfil", log_func):
+        with VolcadoMetricas(metricas, RUTA_METRICAS / f"{nombre}.json"):
+            _scraping_listado(
+                base_url,
+                max_paginas,
+                scrapear_email_web,
+                log_func,
+                usar_indice,
+                archivar_html,
+                procesos_parseo,
+                metricas,
+                ritmo,
+                usar_cache,
+            )
+    log_func(f"📊 {metricas.resumen()}")
+    for host, estado in ritmo.resumen().items():
+        log_func(f"🚦 {host}: {estado}")
+
+def _scraping_listado(
+    base_url,
+    max_paginas,
+    scrapear_email_web,
+    log_func,
+    usar_indice,
+    archivar_html,
+    procesos_parseo,
+    metricas,
+    ritmo,
+    usar_cache,
+):
+    import requests
+
+    from cache_http import bytes_transferidos
+    from tuberia_parseo import TuberiaParseo
+
+    tipo, localidad = extraer_info_url(base_url)
+    nombre_archivo = generar_nombre_archivo(base_url)
+    indice = None
+    if usar_indice:
+        from indice_empresas import IndiceEmpresas
+
+        indice = IndiceEmpresas()
+    cache = None
+    if usar_cache:
+        from cache_http import CacheHTTP
+
+        cache = CacheHTTP()
+    archivo = None
+    if archivar_html:
+        from archivo_html import FUENTE_PA, ArchivoHTML
+
+        archivo = ArchivoHTML()
+    paginas_por_url = {}
+
+    def construir(base, pagina):
+        url = construir_url(base, pagina)
+        paginas_por_url[url] = pagina
+        return url
+
+    def descargar(url):
+        t0 = time.perf_counter()
+        try:
+            r = pedir_pagina(url, ritmo, cache)
+        except requests.RequestException as exc:
+            metricas.registrar_descarga(None, 0, time.perf_counter() - t0)
+            return None, str(exc)
+        # Las páginas servidas por la cache no cuentan como bytes descargados ni se re-archivan.
+        transferidos = bytes_transferidos(r)
+        metricas.registrar_descarga(r.status_code, transferidos, time.perf_counter() - t0)
+        if archivo is not None and r.status_code == 200 and transferidos:
+            archivo.guardar(url, r.text, FUENTE_PA, "listado", base_url=base_url, pagina=paginas_por_url.get(url))
+        return r.status_code, r.text
+
+    def procesar(pagina, registros):
         empresas = []
 
-        for empresa in empresas_html:
-            time.sleep(random.uniform(0.3, 0.7))
-
-            data = {
-                "nombre": "No disponible",
-                "telefono": "No disponible",
-                "email": "No disponible",
-                "email_posible_info": "No disponible",
-                "email_posible_contacto": "No disponible",
-                "email_posible_administracion": "No disponible",
-                "web": "No disponible",
-                "direccion": "No disponible",
-                "codigo_postal": "No disponible",
-                "localidad": "No disponible"
-            }
-
-            # ---------------- NOMBRE ----------------
-            tag = empresa.select_one("span[itemprop='name']")
-            if tag:
-                data["nombre"] = tag.get_text(strip=True)
-
-            # ---------------- TELÉFONO (HIBRIDO) ----------------
-            tel_tag = empresa.find("a", href=re.compile(r"^tel:"))
-            if tel_tag:
-                data["telefono"] = normalizar_telefono(
-                    tel_tag["href"].replace("tel:", "")
-                )
-            else:
-                texto = empresa.get_text(" ", strip=True)
-                match = telefono_regex.search(texto)
-                if match:
-                    data["telefono"] = normalizar_telefono(match.group())
-
-            # ---------------- EMAIL DIRECTO ----------------
-            email_tag = empresa.find("a", href=re.compile(r"^mailto:"))
-            if email_tag:
-                data["email"] = limpiar_email(
-                    email_tag["href"].replace("mailto:", "")
-                )
-
-            # ---------------- WEB / MÁS INFO (ROBUSTO) ----------------
-            web_tag = empresa.find("a", class_=re.compile("web|website", re.I))
-            if not web_tag:
-                for a in empresa.find_all("a", href=True):
-                    href = a["href"]
-                    if href.startswith("http") and "paginasamarillas" not in href:
-                        web_tag = a
-                        break
-
-            if web_tag:
-                data["web"] = web_tag["href"].split("?")[0]
-
-            # ---------------- EMAIL DESDE WEB ----------------
-            if scrapear_email_web and data["email"] == "No disponible" and data["web"] != "No disponible":
-                email_web = obtener_email_web(data["web"])
-                if email_web:
-                    data["email"] = email_web
-
-            # ---------------- EMAILS POSIBLES ----------------
-            dominio = obtener_dominio_fiable(data)
-            if dominio:
-                data["email_posible_info"] = f"info@{dominio}"
-                data["email_posible_contacto"] = f"contacto@{dominio}"
-                data["email_posible_administracion"] = f"administracion@{dominio}"
-
-            # ---------------- DIRECCIÓN ----------------
-            tag = empresa.select_one("span[itemprop='streetAddress']")
-            if tag:
-                data["direccion"] = tag.get_text(strip=True)
-
-            tag = empresa.select_one("span[itemprop='postalCode']")
-            if tag:
-                data["codigo_postal"] = tag.get_text(strip=True)
-
-            tag = empresa.select_one("span[itemprop='addressLocality']")
-            if tag:
-                data["localidad"] = tag.get_text(strip=True)
-
-            if datosvalidos(data):
+        for data in registros:
+            with metricas.cronometro("enriquecimiento"):
+                data = enriquecer_empresa(data, scrapear_email_web, indice)
+            if data:
                 empresas.append(data)
-
-        tipo, localidad = extraer_info_url(base_url)
+                metricas.registrar_empresa(data)
 
         resultado = {
             "localidad": localidad,
@@ -228,19 +387,46 @@ def iniciar_scraping(base_url, max_paginas, scrapear_email_web, log_func):
             "resultados": empresas
         }
 
-        nombre_archivo = generar_nombre_archivo(base_url)
         output = OUTPUT_DIR / nombre_archivo.replace(".json", f"_pagina_{pagina}.json")
 
-        with open(output, "w", encoding="utf-8") as f:
+        with metricas.cronometro("escritura"), open(output, "w", encoding="utf-8") as f:
             json.dump(resultado, f, ensure_ascii=False, indent=4)
+        metricas.registrar_pagina()
 
         log_func(f"✅ Página {pagina} guardada ({len(empresas)} empresas)")
 
+    tuberia = TuberiaParseo(procesos_parseo, metricas=metricas)
+    try:
+        # Tantos hilos como el techo del ritmo: cuántos descargan de verdad lo decide ritmo.turno.
+        recorrer_paginas(
+            base_url,
+            max_paginas,
+            construir,
+            descargar,
+            parsear_listado,
+            procesar,
+            log_func,
+            hilos=ritmo.concurrencia_maxima,
+            tuberia=tuberia,
+        )
+    finally:
+        tuberia.cerrar()
+        if indice is not None:
+            log_func(f"🗂️ {indice.resumen()}")
+            indice.cerrar()
+        if cache is not None:
+            log_func(f"💾 {cache.resumen()}")
+            cache.cerrar()
+        if archivo is not None:
+            log_func(f"📦 HTML archivado: {archivo.guardadas} páginas")
+            archivo.cerrar()
     log_func("🎉 Scraping finalizado")
 
 # ---------------- GUI ----------------
 
 def lanzar_gui():
+    import tkinter as tk
+    from tkinter import ttk, messagebox
 
     def log(msg):
         text_log.insert(tk.END, msg + "\n")
@@ -253,7 +439,10 @@ def lanzar_gui():
                 entry_url.get().strip(),
                 int(entry_paginas.get()),
                 var_email_web.get(),
-                log
+                log,
+                usar_indice=var_indice.get(),
+                archivar_html=var_archivar.get(),
+                usar_cache=var_cache.get()
             )
             messagebox.showinfo("Finalizado", "Scraping completado")
         except ValueError:
@@ -270,14 +459,23 @@ def lanzar_gui():
     entry_url = ttk.Entry(frame)
     entry_url.pack(fill="x")
 
-    ttk.Label(frame, text="Número de páginas:").pack(anchor="w")
+    ttk.Label(frame, text="Número de páginas (0 = todas):").pack(anchor="w")
     entry_paginas = ttk.Entry(frame)
-    entry_paginas.insert(0, "3")
+    entry_paginas.insert(0, "0")
     entry_paginas.pack(fill="x")
 
     var_email_web = tk.BooleanVar(value=True)
     ttk.Checkbutton(frame, text="Buscar email en web externa", variable=var_email_web).pack(anchor="w")
 
+    var_indice = tk.BooleanVar(value=True)
+    ttk.Checkbutton(frame, text="Reutilizar empresas ya vistas (índice)", variable=var_indice).pack(anchor="w")
+
+    var_cache = tk.BooleanVar(value=True)
+    ttk.Checkbutton(frame, text="Cache de listados (no repetir descargas)", variable=var_cache).pack(anchor="w")
+
+    var_archivar = tk.BooleanVar(value=False)
+    ttk.Checkbutton(frame, text="Guardar HTML crudo (re-parseo sin red)", variable=var_archivar).pack(anchor="w")
+
     ttk.Button(frame, text="Iniciar scraping", command=ejecutar).pack(pady=10)
 
     text_log = tk.Text(frame, height=15)
@@ -0,0 +1,321 @@
+"""
+Archivo del HTML crudo descargado por los scrapers, para re-parsear sin volver a la red.
+
+Cuando cambian (o se arreglan) los selectores de WebScrapper_DAGM_ver6.extraer_empresa o de
+extraer_datos_ficha_desde_html (Empresite) no hace falta re-crawlear: con el archivo activado
+cada listado y cada ficha se guarda comprimido y el comando reparsear rehace los JSON.
+
+Formato (resultados/archivo_html/):
+- paginas.pack: solo se añade al final; cada pagina es un bloque comprimido con zstd
+  (paquete zstandard, opcional) o zlib si no esta instalado
+- paginas.idx.jsonl: una linea por pagina con url, fecha, fuente, tipo (listado/ficha),
+  base_url, pagina, offset, longitud y codec
+Un solo proceso escribe a la vez en cada carpeta (los hilos de un mismo proceso, si).
+
+Uso:
+    python archivo_html.py resumen
+    python archivo_html.py reparsear --procesos 8 --salida resultados/reparseo
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import sys
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import zstandard as _zstd
+except ImportError:  # opcional
+    _zstd = None
+
+RUTA_ARCHIVO = Path("resultados") / "archivo_html"
+NOMBRE_PACK = "paginas.pack"
+NOMBRE_INDICE = "paginas.idx.jsonl"
+NIVEL_ZSTD = 10
+NIVEL_ZLIB = 6
+
+FUENTE_PA = "paginasamarillas"
+FUENTE_EMPRESITE = "empresite"
+
+
+def _comprimir(datos):
+    if _zstd is not None:
+        return "zstd", _zstd.ZstdCompressor(level=NIVEL_ZSTD).compress(datos)
+    return "zlib", zlib.compress(datos, NIVEL_ZLIB)
+
+
+def _descomprimir(codec, datos):
+    if codec == "zstd":
+        if _zstd is None:
+            raise RuntimeError("El archivo tiene paginas zstd: instala el paquete zstandard")
+        return _zstd.ZstdDecompressor().decompress(datos)
+    if codec == "zlib":
+        return zlib.decompress(datos)
+    raise ValueError(f"Codec desconocido: {codec}")
+
+
+class ArchivoHTML:
+    def __init__(self, carpeta=RUTA_ARCHIVO):
+        self.carpeta = Path(carpeta)
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pack = open(self.carpeta / NOMBRE_PACK, "ab")
+        self._indice = open(self.carpeta / NOMBRE_INDICE, "a", encoding="utf-8")
+        self.guardadas = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        with self._lock:
+            if self._pack is not None:
+                self._pack.close()
+                self._indice.close()
+                self._pack = self._indice = None
+
+    def guardar(self, url, html, fuente, tipo, base_url=None, pagina=None):
+        codec, bloque = _comprimir(html.encode("utf-8"))
+        entrada = {
+            "url": url,
+            "fecha": dt.datetime.now().isoformat(timespec="seconds"),
+            "fuente": fuente,
+            "tipo": tipo,
+            "base_url": base_url,
+            "pagina": pagina,
+            "codec": codec,
+            "longitud": len(bloque),
+        }
+        with self._lock:
+            # El indice se escribe despues del bloque: si se corta a medias, el bloque queda huerfano
+            # pero el indice nunca apunta a datos incompletos.
+            self._pack.seek(0, os.SEEK_END)
+            entrada["offset"] = self._pack.tell()
+            self._pack.write(bloque)
+            self._pack.flush()
+            self._indice.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+            self._indice.flush()
+            self.guardadas += 1
+        return entrada
+
+
+def leer_indice(carpeta=RUTA_ARCHIVO):
+    entradas = []
+    ruta = Path(carpeta) / NOMBRE_INDICE
+    if not ruta.exists():
+        return entradas
+    with open(ruta, "r", encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                entradas.append(json.loads(linea))
+            except json.JSONDecodeError:
+                continue  # ultima linea cortada
+    return entradas
+
+
+def ultimas_capturas(entradas):
+    """Solo la captura mas reciente de cada (fuente, tipo, url)."""
+    ultimas = {}
+    for e in entradas:
+        clave = (e.get("fuente"), e.get("tipo"), e.get("url"))
+        if clave not in ultimas or e["fecha"] >= ultimas[clave]["fecha"]:
+            ultimas[clave] = e
+    return list(ultimas.values())
+
+
+def leer_html(carpeta, entrada, pack=None):
+    if pack is None:
+        with open(Path(carpeta) / NOMBRE_PACK, "rb") as f:
+            return leer_html(carpeta, entrada, f)
+    pack.seek(entrada["offset"])
+    return _descomprimir(entrada["codec"], pack.read(entrada["longitud"])).decode("utf-8")
+
+
+# ---------------- RE-PARSEO (procesos) ----------------
+# Funciones de modulo: ProcessPoolExecutor las envia por pickle a cada proceso.
+
+_extractor_telefonos = None
+
+
+def _extractor():
+    # Uno por proceso: los patrones (hyperscan/re2) se compilan una vez, no por listado.
+    global _extractor_telefonos
+    if _extractor_telefonos is None:
+        from extraccion_lotes import PATRONES, ExtractorLotes
+
+        _extractor_telefonos = ExtractorLotes(patrones={"telefono": PATRONES["telefono"]})
+    return _extractor_telefonos
+
+
+def _parsear_listado_pa(args):
+    import WebScrapper_DAGM_ver6 as pa
+
+    # Sin enriquecer: el indice (proceso principal) completa antes de los emails posibles.
+    carpeta, entrada = args
+    return entrada, pa.parsear_listado(leer_html(carpeta, entrada), extractor=_extractor())
+
+
+def _parsear_listado_empresite(args):
+    import WebScrapper_DAGM_ver1_empresite as es
+
+    carpeta, entrada = args
+    return entrada, es.fichas_de_listado(leer_html(carpeta, entrada))
+
+
+def _parsear_ficha_empresite(args):
+    import WebScrapper_DAGM_ver1_empresite as es
+
+    carpeta, entrada = args
+    return entrada, es.extraer_datos_ficha_desde_html(leer_html(carpeta, entrada))
+
+
+def _guardar_json(ruta, payload):
+    tmp = ruta.with_suffix(ruta.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=4)
+    tmp.replace(ruta)
+
+
+def reparsear(carpeta=RUTA_ARCHIVO, salida=None, procesos=None, indice=None, log_func=print):
+    """
+    Rehace los JSON de resultados a partir del archivo, sin red.
+    - Paginas Amarillas: un <busqueda>_pagina_N.json por listado (formato de ver6)
+    - Empresite: un <busqueda>.json por busqueda (formato de guardar_resultado)
+    indice (IndiceEmpresas, opcional): completa los emails que en su dia salieron de la web de
+    la empresa o de fichas que no se archivaron.
+    """
+    import WebScrapper_DAGM_ver1_empresite as es
+    import WebScrapper_DAGM_ver6 as pa
+
+    carpeta = Path(carpeta)
+    salida = Path(salida) if salida else carpeta.parent / "reparseo"
+    salida.mkdir(parents=True, exist_ok=True)
+    entradas = ultimas_capturas(leer_indice(carpeta))
+
+    def por_tipo(fuente, tipo):
+        return [(str(carpeta), e) for e in entradas if e.get("fuente") == fuente and e.get("tipo") == tipo]
+
+    listados_pa = por_tipo(FUENTE_PA, "listado")
+    listados_es = por_tipo(FUENTE_EMPRESITE, "listado")
+    fichas_es = por_tipo(FUENTE_EMPRESITE, "ficha")
+    log_func(
+        f"📦 {len(entradas)} páginas archivadas: {len(listados_pa)} listados PA, "
+        f"{len(listados_es)} listados Empresite, {len(fichas_es)} fichas Empresite"
+    )
+
+    def completar(data):
+        if indice is not None:
+            guardados, _ = indice.buscar(data)
+            if guardados:
+                indice.completar(data, guardados)
+        return data
+
+    archivos = 0
+    with ProcessPoolExecutor(max_workers=procesos or os.cpu_count()) as pool:
+        # ---- Paginas Amarillas: cada listado es independiente ----
+        for entrada, empresas in pool.map(_parsear_listado_pa, listados_pa, chunksize=8):
+            base_url = entrada.get("base_url") or entrada["url"]
+            tipo, localidad = pa.extraer_info_url(base_url)
+            nombre = pa.generar_nombre_archivo(base_url).replace(".json", f"_pagina_{entrada.get('pagina') or 1}.json")
+            # Mismo orden que ver6 enriquecer_empresa: indice, despues emails posibles y validez.
+            resultados = [pa.enriquecer_empresa(completar(d), scrapear_email_web=False) for d in empresas]
+            _guardar_json(
+                salida / nombre,
+                {"localidad": localidad, "tipo_empresa": tipo, "resultados": [d for d in resultados if d]},
+            )
+            archivos += 1
+
+        # ---- Empresite: fichas en paralelo, luego se ensambla cada busqueda en orden ----
+        fichas = {
+            (e["url"] or "").strip().lower(): datos
+            for e, datos in pool.map(_parsear_ficha_empresite, fichas_es, chunksize=16)
+        }
+        busquedas = {}
+        for entrada, detalles in pool.map(_parsear_listado_empresite, listados_es, chunksize=8):
+            busquedas.setdefault(entrada.get("base_url") or entrada["url"], []).append((entrada.get("pagina") or 0, detalles))
+
+    for base_url, paginas in busquedas.items():
+        tipo, localidad = es.extraer_tipo_localidad_empresite(base_url)
+        empresas = []
+        vistas = set()
+        for _, detalles in sorted(paginas, key=lambda p: p[0]):
+            for detail_url, txt, title in detalles or []:
+                url_norm = (detail_url or "").strip().lower()
+                if not url_norm or url_norm in vistas:
+                    continue
+                data = es.nueva_empresa_de_listado(detail_url, txt, title, localidad)
+                if url_norm in fichas:
+                    es.aplicar_datos_ficha(data, fichas[url_norm])
+                else:
+                    completar(data)
+                es.anadir_emails_posibles(data)
+                if es.datosvalidos(data):
+                    vistas.add(url_norm)
+                    empresas.append(data)
+        _guardar_json(
+            salida / es.generar_nombre_archivo(base_url),
+            {"localidad": localidad, "tipo_empresa": tipo, "resultados": empresas},
+        )
+        archivos += 1
+
+    log_func(f"🎉 Re-parseo terminado: {archivos} ficheros en {salida}")
+    return {"paginas": len(entradas), "ficheros": archivos, "salida": str(salida)}
+
+
+def resumen(carpeta=RUTA_ARCHIVO):
+    entradas = leer_indice(carpeta)
+    pack = Path(carpeta) / NOMBRE_PACK
+    por_tipo = {}
+    for e in entradas:
+        clave = f"{e.get('fuente')}/{e.get('tipo')}"
+        por_tipo[clave] = por_tipo.get(clave, 0) + 1
+    return {
+        "capturas": len(entradas),
+        "urls_distintas": len({e["url"] for e in entradas}),
+        "por_tipo": por_tipo,
+        "bytes_pack": pack.stat().st_size if pack.exists() else 0,
+        "codecs": sorted({e.get("codec") for e in entradas}),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archivo", default=str(RUTA_ARCHIVO), help="Carpeta del archivo")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    sub.add_parser("resumen", help="Capturas archivadas y tamaño")
+
+    p = sub.add_parser("reparsear", help="Rehace los JSON de resultados desde el archivo (sin red)")
+    p.add_argument("--salida", help="Carpeta de salida (por defecto <archivo>/../reparseo)")
+    p.add_argument("--procesos", type=int, default=None, help="Procesos de parseo (por defecto, uno por CPU)")
+    p.add_argument("--sin-indice", action="store_true", help="No completar emails con indice_empresas")
+    args = parser.parse_args(argv)
+
+    if args.comando == "resumen":
+        print(json.dumps(resumen(args.archivo), ensure_ascii=False, indent=2))
+        return 0
+
+    indice = None
+    if not args.sin_indice:
+        from indice_empresas import RUTA_INDICE, IndiceEmpresas
+
+        if RUTA_INDICE.exists():
+            indice = IndiceEmpresas()
+    try:
+        reparsear(args.archivo, args.salida, args.procesos, indice)
+    finally:
+        if indice is not None:
+            indice.cerrar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
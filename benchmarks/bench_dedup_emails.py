@@ -0,0 +1,141 @@
+"""
+Benchmark de las consultas de limpieza de emails sobre una tabla sintetica (1M filas por defecto).
+
+Crea `empresa` y `email` en una base de datos DE PRUEBA (--database), mide
+resumen_limpieza_emails y buscar_redundancias_email_nombre_empresa antes y despues de
+migrar_columnas_normalizadas, y guarda los tiempos en JSON.
+
+Uso:
+    python benchmarks/bench_dedup_emails.py --filas 1000000 --database bench_consultor
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import consultor_core as consultor  # noqa: E402
+
+TIPOS_EMAIL = ("RE", "IN", "CO", "AD")
+BATCH_INSERT = 10000
+
+
+def _medir(nombre, fn, resultados):
+    t0 = time.perf_counter()
+    res = fn()
+    dt_s = time.perf_counter() - t0
+    resultados[nombre] = round(dt_s, 3)
+    print(f"{nombre}: {dt_s:.3f}s")
+    return res
+
+
+def crear_datos(filas, semilla):
+    """
+    empresa (filas/4) + email (filas). ~10% duplicados con variaciones de mayusculas/espacios,
+    ~2% placeholders invalidos y nombres repetidos para que haya redundancias.
+    """
+    rnd = random.Random(semilla)
+    n_empresas = max(1, filas // 4)
+    conn = consultor.conectar_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DROP TABLE IF EXISTS email")
+        cursor.execute("DROP TABLE IF EXISTS empresa")
+        cursor.execute(
+            """
+            CREATE TABLE empresa (
+                id_empresa INT AUTO_INCREMENT PRIMARY KEY,
+                nombre VARCHAR(255),
+                telefono VARCHAR(32),
+                web VARCHAR(255)
+            )
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE email (
+                id_email INT AUTO_INCREMENT PRIMARY KEY,
+                id_empresa INT NOT NULL,
+                id_tipo_email VARCHAR(2),
+                email VARCHAR(255),
+                KEY idx_email_empresa (id_empresa)
+            )
+            """
+        )
+
+        lote = []
+        for i in range(1, n_empresas + 1):
+            nombre = f"Empresa {rnd.randint(1, n_empresas // 2 or 1)}"
+            lote.append((nombre, f"9{i:08d}", f"https://empresa{i}.es"))
+            if len(lote) >= BATCH_INSERT:
+                cursor.executemany("INSERT INTO empresa (nombre, telefono, web) VALUES (%s, %s, %s)", lote)
+                lote = []
+        if lote:
+            cursor.executemany("INSERT INTO empresa (nombre, telefono, web) VALUES (%s, %s, %s)", lote)
+
+        lote = []
+        for i in range(filas):
+            id_empresa = rnd.randint(1, n_empresas)
+            r = rnd.random()
+            if r < 0.02:
+                email = rnd.choice(("no disponible", "", None, "NULL"))
+            elif r < 0.12:
+                # Duplicado "sucio" de un email de la misma empresa.
+                email = f"  INFO@EMPRESA{id_empresa}.ES "
+            else:
+                email = f"{rnd.choice(('info', 'contacto', 'admin'))}@empresa{id_empresa}.es"
+            lote.append((id_empresa, rnd.choice(TIPOS_EMAIL), email))
+            if len(lote) >= BATCH_INSERT:
+                cursor.executemany(
+                    "INSERT INTO email (id_empresa, id_tipo_email, email) VALUES (%s, %s, %s)", lote
+                )
+                lote = []
+        if lote:
+            cursor.executemany("INSERT INTO email (id_empresa, id_tipo_email, email) VALUES (%s, %s, %s)", lote)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=1000000)
+    parser.add_argument("--database", default="bench_consultor", help="Base de datos de prueba (se borran sus tablas)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--reusar-datos", action="store_true", help="No regenerar las tablas sinteticas")
+    parser.add_argument("--salida", default=str(Path(__file__).resolve().parent / "resultados" / "dedup_emails.json"))
+    args = parser.parse_args()
+
+    if args.database == consultor.DB_CONFIG.get("database"):
+        parser.error("--database no puede ser la base de datos de produccion configurada en .env")
+    consultor.DB_CONFIG["database"] = args.database
+
+    resultados = {"filas": args.filas, "database": args.database, "tiempos_s": {}}
+    tiempos = resultados["tiempos_s"]
+
+    if not args.reusar_datos:
+        _medir("crear_datos", lambda: crear_datos(args.filas, args.semilla), tiempos)
+
+    resumen = _medir("resumen_sin_normalizar", consultor.resumen_limpieza_emails, tiempos)
+    _medir("redundancias_sin_normalizar", consultor.buscar_redundancias_email_nombre_empresa, tiempos)
+    _medir("migrar_columnas_normalizadas", consultor.migrar_columnas_normalizadas, tiempos)
+    resumen_norm = _medir("resumen_normalizado", consultor.resumen_limpieza_emails, tiempos)
+    _medir("redundancias_normalizado", consultor.buscar_redundancias_email_nombre_empresa, tiempos)
+
+    if resumen != resumen_norm:
+        print(f"AVISO: los resultados difieren: {resumen} vs {resumen_norm}")
+    resultados["resumen"] = resumen_norm
+
+    salida = Path(args.salida)
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, ensure_ascii=False, indent=2)
+    print(f"Resultados guardados en: {salida}")
+
+
+if __name__ == "__main__":
+    main()
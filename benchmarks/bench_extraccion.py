@@ -0,0 +1,111 @@
+"""
+Benchmark de extraccion de telefonos/emails: ficha a ficha (como WebScrapper_DAGM_ver6)
+contra extraccion_lotes.ExtractorLotes sobre textos sinteticos de fichas.
+
+Comprueba ademas que ambos devuelven exactamente lo mismo.
+
+Uso:
+    python benchmarks/bench_extraccion.py --fichas 200000
+    python benchmarks/bench_extraccion.py --fichas 1000000 --lote 50000 --motor re
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import extraccion_lotes as ex  # noqa: E402
+
+telefono_regex = re.compile(r"(\+34\s?\d{9}|\b\d{9}\b)")
+email_regex = re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
+
+PALABRAS = "fontaneria reformas madrid calle avenida gestoria asesoria servicios urgentes 24h presupuesto".split()
+
+
+def crear_textos(n, semilla):
+    """
+    Textos parecidos al get_text de un div.box: nombre, direccion, a veces telefono y email.
+    ~5000 telefonos/emails distintos para que se repitan como en los datos reales.
+    """
+    rnd = random.Random(semilla)
+    textos = []
+    for i in range(n):
+        partes = [" ".join(rnd.choice(PALABRAS) for _ in range(rnd.randint(4, 12)))]
+        if rnd.random() < 0.8:
+            tel = f"9{rnd.randint(0, 4999):08d}"
+            partes.append(rnd.choice([tel, "+34" + tel, "+34 " + tel]))
+        if rnd.random() < 0.4:
+            partes.append(f"info{rnd.randint(0, 4999)}@empresa{rnd.randint(0, 999)}.es.")
+        partes.append(f"CP 28{rnd.randint(0, 999):03d}")
+        rnd.shuffle(partes)
+        textos.append(" ".join(partes))
+    return textos
+
+
+def extraer_ficha_a_ficha(textos):
+    resultado = []
+    for texto in textos:
+        fila = {"telefono": None, "email": None}
+        match = telefono_regex.search(texto)
+        if match:
+            fila["telefono"] = ex.normalizar_telefono(match.group())
+        match = email_regex.search(texto)
+        if match:
+            fila["email"] = ex.limpiar_email(match.group())
+        resultado.append(fila)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fichas", type=int, default=200000)
+    parser.add_argument("--lote", type=int, default=20000, help="Fichas por documento concatenado")
+    parser.add_argument("--motor", choices=["re", "re2", "hyperscan"], default=None)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--salida", default=str(Path(__file__).resolve().parent / "resultados" / "extraccion.json"))
+    args = parser.parse_args()
+
+    textos = crear_textos(args.fichas, args.semilla)
+    extractor = ex.ExtractorLotes(motor=args.motor)
+    print(f"{len(textos)} fichas | motor={extractor.motor} | lote={args.lote}")
+
+    t0 = time.perf_counter()
+    esperado = extraer_ficha_a_ficha(textos)
+    t_ficha = time.perf_counter() - t0
+    print(f"ficha a ficha: {t_ficha:.3f}s")
+
+    t0 = time.perf_counter()
+    obtenido = []
+    for i in range(0, len(textos), max(1, args.lote)):
+        obtenido.extend(extractor.extraer(textos[i : i + args.lote]))
+    t_lote = time.perf_counter() - t0
+    print(f"por lotes:     {t_lote:.3f}s (x{t_ficha / t_lote:.2f})")
+
+    distintos = sum(1 for a, b in zip(esperado, obtenido) if a != b)
+    print("resultados identicos" if not distintos else f"ATENCION: {distintos} fichas difieren")
+
+    salida = Path(args.salida)
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "fichas": len(textos),
+                "motor": extractor.motor,
+                "lote": args.lote,
+                "ficha_a_ficha_s": round(t_ficha, 3),
+                "por_lotes_s": round(t_lote, 3),
+                "fichas_distintas": distintos,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Resultados guardados en: {salida}")
+    return 1 if distintos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
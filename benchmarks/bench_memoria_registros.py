@@ -0,0 +1,117 @@
+"""
+Benchmark de memoria: empresas en memoria como dicts (como hasta ahora en empresas_totales)
+contra registros_compactos.Empresa, para un crawl de 1M de empresas.
+
+Las cadenas se construyen por empresa (como salen de BeautifulSoup), no como literales
+compartidos. Comprueba ademas que el JSON generado es identico.
+
+Uso:
+    python benchmarks/bench_memoria_registros.py --empresas 1000000
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from registros_compactos import NO_DISPONIBLE, Empresa, a_json  # noqa: E402
+
+LOCALIDADES = ["Madrid", "Coslada", "Alcala de Henares", "Getafe", "Leganes", "Mostoles", "Torrejon de Ardoz"]
+
+
+def crear_empresa(rnd, i):
+    """Dict con el esquema de new_empresa/extraer_empresa; ~60% de los campos sin dato."""
+    data = {
+        "nombre": f"Empresa {i} S.L.",
+        "telefono": NO_DISPONIBLE,
+        "email": NO_DISPONIBLE,
+        "email_posible_info": NO_DISPONIBLE,
+        "email_posible_contacto": NO_DISPONIBLE,
+        "email_posible_administracion": NO_DISPONIBLE,
+        "web": NO_DISPONIBLE,
+        "direccion": NO_DISPONIBLE,
+        "codigo_postal": NO_DISPONIBLE,
+        "localidad": (" " + rnd.choice(LOCALIDADES))[1:],  # copia nueva, como get_text()
+    }
+    if rnd.random() < 0.8:
+        data["telefono"] = f"+349{rnd.randint(0, 99999999):08d}"
+    if rnd.random() < 0.4:
+        data["web"] = f"https://www.empresa{i}.es"
+        dominio = f"empresa{i}.es"
+        data["email_posible_info"] = f"info@{dominio}"
+        data["email_posible_contacto"] = f"contacto@{dominio}"
+        data["email_posible_administracion"] = f"administracion@{dominio}"
+        if rnd.random() < 0.5:
+            data["email"] = f"info@{dominio}"
+    if rnd.random() < 0.5:
+        data["direccion"] = f"Calle {rnd.randint(1, 500)}, {rnd.randint(1, 90)}"
+        data["codigo_postal"] = f"28{rnd.randint(0, 999):03d}"
+    data["url_detalle"] = f"https://empresite.eleconomista.es/EMPRESA-{i}.html"
+    return data
+
+
+def medir(construir, n, semilla):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    rnd = random.Random(semilla)
+    registros = [construir(crear_empresa(rnd, i)) for i in range(n)]
+    segundos = time.perf_counter() - t0
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return registros, actual, segundos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--empresas", type=int, default=1000000)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--muestra", type=int, default=20000, help="Empresas cuyo JSON se compara")
+    parser.add_argument("--salida", default=str(Path(__file__).resolve().parent / "resultados" / "memoria_registros.json"))
+    args = parser.parse_args()
+    n = args.empresas
+    print(f"{n} empresas")
+
+    dicts, mem_dict, t_dict = medir(dict, n, args.semilla)
+    print(f"dicts:      {mem_dict / 2**20:8.1f} MiB ({mem_dict / n:.0f} B/empresa) en {t_dict:.1f}s")
+    muestra = dicts[: args.muestra]
+    del dicts
+    gc.collect()
+
+    registros, mem_reg, t_reg = medir(Empresa.desde_dict, n, args.semilla)
+    print(
+        f"compactos:  {mem_reg / 2**20:8.1f} MiB ({mem_reg / n:.0f} B/empresa) en {t_reg:.1f}s "
+        f"(x{mem_dict / mem_reg:.2f} menos memoria)"
+    )
+
+    identicos = json.dumps(muestra, ensure_ascii=False, indent=4) == json.dumps(
+        registros[: args.muestra], ensure_ascii=False, indent=4, default=a_json
+    )
+    print("JSON identico" if identicos else "ATENCION: el JSON de los registros compactos difiere")
+
+    salida = Path(args.salida)
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "empresas": n,
+                "dicts_bytes": mem_dict,
+                "compactos_bytes": mem_reg,
+                "dicts_s": round(t_dict, 2),
+                "compactos_s": round(t_reg, 2),
+                "json_identico": identicos,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Resultados guardados en: {salida}")
+    return 0 if identicos else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""
+Benchmark de los scrapers sin red: paginas guardadas (benchmarks/fixtures) servidas por
+servidor_stub.ServidorFixtures en 127.0.0.1.
+
+Mide:
+- parseo: ms por llamada de cada funcion de extraccion (mejor de --repeticiones-parseo);
+  "por caja" es el tiempo del listado entero dividido entre sus cajas
+- extremo a extremo, empresas/s (mejor de --repeticiones):
+  - WebScrapper_DAGM_ver6.iniciar_scraping completo (descarga, parseo, enriquecimiento
+    sin web, escritura de JSON)
+  - WebScrapper_DAGM_ver1_empresite.iniciar_scraping_empresite completo, con un navegador
+    de pega (NavegadorStub) que descarga con requests: todo lo demas (ritmo, tuberia de
+    parseo, fichas, checkpoints) es el codigo real
+- pico de memoria de cada recorrido (tracemalloc, en una pasada aparte para no falsear el
+  tiempo; solo el proceso principal, no los procesos de parseo de ver6)
+Guarda todo en JSON (con el commit de git) y, con --comparar, marca las regresiones
+respecto a un resultado anterior (sale con codigo 1).
+
+Uso:
+    python benchmarks/bench_scrapers.py
+    python benchmarks/bench_scrapers.py --paginas-pa 20 --procesos-parseo 0
+    python benchmarks/bench_scrapers.py --comparar benchmarks/resultados/scrapers_anterior.json
+    python benchmarks/bench_scrapers.py --grabar-desde-archivo resultados/archivo_html
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from servidor_stub import CARPETA_FIXTURES, HOST_EMPRESITE, ServidorFixtures, cargar_fixtures  # noqa: E402
+
+RUTA_PA = "/search/fontaneros/all-ma/madrid/all-is/coslada/all-ba/all-pu/all-nc/1?what=fontaneros&where=coslada"
+RUTA_EMPRESITE = "/actividad/fontaneria/localidad/COSLADA-MADRID/"
+
+# Metricas donde subir es peor (el resto, empresas/s, bajar es peor).
+PEOR_SI_SUBE = ("ms", "pico_memoria_mib", "segundos")
+
+
+def version_git():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _log_nulo(msg):
+    pass
+
+
+# ---------------- PARSEO ----------------
+
+def medir_parseo(repeticiones):
+    import WebScrapper_DAGM_ver1_empresite as es
+    import WebScrapper_DAGM_ver6 as pa
+    from contacto_web import emails_en_html
+    from paginacion_pa import analizar_paginacion
+
+    fx = cargar_fixtures()
+    listado_pa = fx["pa_listado"]
+    cajas = pa.cajas_empresas(listado_pa)
+    # nombre -> (funcion, llamadas que hace cada ejecucion)
+    casos = {
+        "pa.cajas_empresas": (lambda: pa.cajas_empresas(listado_pa), 1),
+        "pa.parsear_empresa (por caja)": (lambda: [pa.parsear_empresa(c) for c in cajas], max(1, len(cajas))),
+        "pa.parsear_listado": (lambda: pa.parsear_listado(listado_pa), 1),
+        "paginacion_pa.analizar_paginacion": (lambda: analizar_paginacion(listado_pa, len(cajas)), 1),
+        "es.fichas_de_listado": (lambda: es.fichas_de_listado(fx["empresite_listado"]), 1),
+        "es.extraer_datos_ficha_desde_html": (lambda: es.extraer_datos_ficha_desde_html(fx["empresite_ficha"]), 1),
+        "contacto_web.emails_en_html": (lambda: emails_en_html(fx["empresite_ficha"]), 1),
+    }
+    resultados = {}
+    for nombre, (fn, llamadas) in casos.items():
+        veces = timeit.repeat(fn, number=1, repeat=repeticiones)
+        resultados[nombre] = {"ms": round(min(veces) * 1000 / llamadas, 3)}
+        print(f"  {nombre:40s} {resultados[nombre]['ms']:9.3f} ms")
+    return resultados
+
+
+# ---------------- EXTREMO A EXTREMO ----------------
+
+def recorrer_ver6(url, procesos_parseo):
+    import WebScrapper_DAGM_ver6 as pa
+    from metricas_scraper import MetricasScraper
+    from ritmo_adaptativo import ControlRitmo
+
+    metricas = MetricasScraper("bench_ver6")
+    # Sin pausa inicial: el stub nunca frena, asi se mide la subida de concurrencia y no esperas fijas.
+    pa.iniciar_scraping(
+        url + RUTA_PA,
+        0,
+        False,
+        _log_nulo,
+        usar_indice=False,
+        usar_cache=False,
+        procesos_parseo=procesos_parseo,
+        metricas=metricas,
+        ritmo=ControlRitmo(pausa_inicial=0.0, metricas=metricas),
+    )
+    return metricas.empresas
+
+
+class NavegadorStub:
+    """Lo que usa iniciar_scraping_empresite del driver de Selenium, con requests contra el stub."""
+
+    def __init__(self, url_servidor):
+        import requests
+
+        self.url_servidor = url_servidor
+        self.sesion = requests.Session()
+        self.page_source = ""
+
+    def get(self, url):
+        self.page_source = self.sesion.get(url.replace(HOST_EMPRESITE, self.url_servidor), timeout=15).text
+
+    def quit(self):
+        self.sesion.close()
+
+
+def recorrer_empresite(url, paginas, procesos_parseo):
+    import WebScrapper_DAGM_ver1_empresite as es
+    from metricas_scraper import MetricasScraper
+
+    def obtener_html(driver, url_pagina, log_func, timeout=25, esperar_email=False):
+        driver.get(url_pagina)
+        return driver.page_source or "", True
+
+    # Solo se sustituye el navegador; esperas de Selenium y cookies no aplican sin el.
+    originales = es.crear_driver, es.esperar_y_obtener_html
+    es.crear_driver = lambda use_profile=True: NavegadorStub(url)
+    es.esperar_y_obtener_html = obtener_html
+    try:
+        _, _, empresas = es.iniciar_scraping_empresite(
+            HOST_EMPRESITE + RUTA_EMPRESITE,
+            paginas,
+            _log_nulo,
+            use_profile=False,
+            usar_indice=False,
+            procesos_parseo=es.PROCESOS_PARSEO if procesos_parseo is None else procesos_parseo,
+            metricas=MetricasScraper("bench_empresite"),
+        )
+    finally:
+        es.crear_driver, es.esperar_y_obtener_html = originales
+    return len(empresas)
+
+
+def medir_recorrido(nombre, fn, repeticiones):
+    mejores = None
+    empresas = 0
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        empresas = fn()
+        segundos = time.perf_counter() - t0
+        mejores = segundos if mejores is None else min(mejores, segundos)
+    tracemalloc.start()
+    fn()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    res = {
+        "empresas": empresas,
+        "segundos": round(mejores, 3),
+        "empresas_por_segundo": round(empresas / mejores, 1) if mejores else 0.0,
+        "pico_memoria_mib": round(pico / 2**20, 2),
+    }
+    print(
+        f"  {nombre:10s} {res['empresas']:6d} empresas en {res['segundos']:.2f}s -> "
+        f"{res['empresas_por_segundo']:8.1f} empresas/s | pico {res['pico_memoria_mib']:.1f} MiB"
+    )
+    return res
+
+
+# ---------------- COMPARACION ----------------
+
+def _aplanar(resultado):
+    planos = {}
+    for seccion in ("parseo", "extremo_a_extremo"):
+        for caso, valores in (resultado.get(seccion) or {}).items():
+            for metrica, valor in valores.items():
+                if isinstance(valor, (int, float)) and metrica != "empresas":
+                    planos[f"{seccion}/{caso}/{metrica}"] = (metrica, valor)
+    return planos
+
+
+def comparar(actual, anterior, tolerancia):
+    regresiones = []
+    a = _aplanar(actual)
+    b = _aplanar(anterior)
+    print(f"\nComparacion con {anterior.get('version')} ({anterior.get('fecha')}), tolerancia {tolerancia:.0%}:")
+    for clave in sorted(set(a) & set(b)):
+        metrica, nuevo = a[clave]
+        viejo = b[clave][1]
+        if not viejo:
+            continue
+        cambio = nuevo / viejo - 1
+        peor = cambio if metrica in PEOR_SI_SUBE else -cambio
+        marca = "REGRESION" if peor > tolerancia else ("mejora" if peor < -tolerancia else "")
+        print(f"  {clave:70s} {viejo:10.3f} -> {nuevo:10.3f} ({cambio:+.1%}) {marca}")
+        if marca == "REGRESION":
+            regresiones.append(clave)
+    return regresiones
+
+
+# ---------------- FIXTURES ----------------
+
+def grabar_desde_archivo(carpeta_archivo, destino):
+    """Copia la ultima captura de cada tipo del archivo_html como fixture."""
+    from archivo_html import FUENTE_EMPRESITE, FUENTE_PA, leer_html, leer_indice
+
+    entradas = leer_indice(carpeta_archivo)
+    destino = Path(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    grabadas = 0
+    for fichero, fuente, tipo in (
+        ("pa_listado.html", FUENTE_PA, "listado"),
+        ("empresite_listado.html", FUENTE_EMPRESITE, "listado"),
+        ("empresite_ficha.html", FUENTE_EMPRESITE, "ficha"),
+    ):
+        candidatas = [e for e in entradas if e.get("fuente") == fuente and e.get("tipo") == tipo]
+        if not candidatas:
+            print(f"  {fichero}: sin capturas en el archivo, se mantiene la actual")
+            continue
+        entrada = max(candidatas, key=lambda e: e["fecha"])
+        (destino / fichero).write_text(leer_html(carpeta_archivo, entrada), encoding="utf-8")
+        print(f"  {fichero} <- {entrada['url']} ({entrada['fecha']})")
+        grabadas += 1
+    return grabadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas-pa", type=int, default=10, help="Paginas del listado de Paginas Amarillas")
+    parser.add_argument("--paginas-empresite", type=int, default=3, help="Paginas del listado de Empresite")
+    parser.add_argument(
+        "--procesos-parseo",
+        type=int,
+        default=None,
+        help="Procesos de parseo de ver6 y Empresite (por defecto los de cada scraper)",
+    )
+    parser.add_argument("--latencia", type=float, default=0.0, help="Segundos de espera por peticion en el stub")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Pasadas de cada recorrido extremo a extremo")
+    parser.add_argument("--repeticiones-parseo", type=int, default=15, help="Pasadas de cada caso de parseo")
+    parser.add_argument("--salida", help="Fichero JSON (por defecto benchmarks/resultados/scrapers_<fecha>.json)")
+    parser.add_argument("--comparar", help="JSON de una ejecucion anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Cambio relativo que cuenta como regresion")
+    parser.add_argument("--grabar-desde-archivo", metavar="CARPETA", help="Renovar las fixtures desde un archivo_html y salir")
+    args = parser.parse_args()
+
+    if args.grabar_desde_archivo:
+        return 0 if grabar_desde_archivo(args.grabar_desde_archivo, CARPETA_FIXTURES) else 1
+
+    resultado = {
+        "version": version_git(),
+        "fecha": dt.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "parametros": {
+            "paginas_pa": args.paginas_pa,
+            "paginas_empresite": args.paginas_empresite,
+            "procesos_parseo": args.procesos_parseo,
+            "latencia": args.latencia,
+            "repeticiones": args.repeticiones,
+            "repeticiones_parseo": args.repeticiones_parseo,
+        },
+    }
+
+    repeticiones_parseo = max(1, args.repeticiones_parseo)
+    print(f"Parseo (mejor de {repeticiones_parseo}):")
+    resultado["parseo"] = medir_parseo(repeticiones_parseo)
+
+    print("Extremo a extremo:")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, ServidorFixtures(
+        paginas_pa=args.paginas_pa, paginas_empresite=args.paginas_empresite, latencia_seconds=args.latencia
+    ) as servidor:
+        # Los scrapers escriben en ./resultados: que sea en un directorio temporal.
+        os.chdir(tmp)
+        try:
+            Path("resultados").mkdir()
+            resultado["extremo_a_extremo"] = {
+                "ver6": medir_recorrido(
+                    "ver6", lambda: recorrer_ver6(servidor.url, args.procesos_parseo), args.repeticiones
+                ),
+                "empresite": medir_recorrido(
+                    "empresite",
+                    lambda: recorrer_empresite(servidor.url, args.paginas_empresite, args.procesos_parseo),
+                    args.repeticiones,
+                ),
+            }
+        finally:
+            os.chdir(cwd)
+        resultado["peticiones_servidas"] = servidor.peticiones
+
+    salida = Path(args.salida) if args.salida else (
+        Path(__file__).resolve().parent / "resultados" / f"scrapers_{dt.datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"Resultados guardados en: {salida}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            anterior = json.load(f)
+        regresiones = comparar(resultado, anterior, args.tolerancia)
+        if regresiones:
+            print(f"ATENCION: {len(regresiones)} regresiones")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
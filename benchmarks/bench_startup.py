@@ -0,0 +1,117 @@
+"""
+Benchmark de arranque: coste de importar cada punto de entrada (python -X importtime).
+
+Cada modulo se importa en un proceso limpio --repeticiones veces; se toma la mediana del
+tiempo acumulado y se compara con PRESUPUESTOS_MS. Ademas comprueba que las dependencias
+pesadas (Tk, Selenium, requests/bs4, mysql, smtplib) no se cargan al importar.
+Sale con codigo 1 si algun modulo se pasa de presupuesto o carga algo prohibido, para
+poder usarlo como paso de CI.
+
+Uso:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeticiones 10 --factor 1.5
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+# Mediana del tiempo acumulado de import (ms). Margen holgado sobre lo medido tras los imports diferidos.
+PRESUPUESTOS_MS = {
+    "consultor_core": 80,
+    "consultor_cli": 100,
+    "dedup_empresas": 20,
+    "WebScrapper_DAGM_ver5": 40,
+    "WebScrapper_DAGM_ver6": 40,
+    "WebScrapper_DAGM_ver1_empresite": 50,
+}
+
+PESADOS_SCRAPER = ("tkinter", "requests", "bs4", "selenium")
+PESADOS_CONSULTOR = ("tkinter", "mysql", "smtplib", "selenium", "requests", "bs4")
+PROHIBIDOS = {
+    "consultor_core": PESADOS_CONSULTOR,
+    "consultor_cli": PESADOS_CONSULTOR,
+    "dedup_empresas": PESADOS_CONSULTOR,
+    "WebScrapper_DAGM_ver5": PESADOS_SCRAPER,
+    "WebScrapper_DAGM_ver6": PESADOS_SCRAPER,
+    "WebScrapper_DAGM_ver1_empresite": PESADOS_SCRAPER,
+}
+
+LINEA_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|\s+(.+)$")
+
+
+def medir_import(modulo):
+    """
+    Devuelve (ms acumulados del modulo, modulos cargados) importandolo en un proceso nuevo.
+    """
+    codigo = f"import sys, json; import {modulo}; print(json.dumps(sorted(sys.modules)))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=RAIZ,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {modulo}:\n{proc.stderr[-2000:]}")
+
+    acumulado_us = None
+    for linea in proc.stderr.splitlines():
+        m = LINEA_IMPORTTIME.match(linea)
+        if m and m.group(3).strip() == modulo:
+            acumulado_us = int(m.group(2))
+    if acumulado_us is None:
+        raise RuntimeError(f"importtime no informo de {modulo}")
+    return acumulado_us / 1000.0, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--factor", type=float, default=1.0, help="Multiplica los presupuestos (maquinas lentas)")
+    parser.add_argument("--modulo", action="append", help="Limitar a estos modulos (repetible)")
+    parser.add_argument("--salida", default=str(Path(__file__).resolve().parent / "resultados" / "startup.json"))
+    args = parser.parse_args()
+
+    modulos = args.modulo or list(PRESUPUESTOS_MS)
+    resultados = {}
+    fallos = []
+    for modulo in modulos:
+        tiempos = []
+        cargados = []
+        for _ in range(max(1, args.repeticiones)):
+            ms, cargados = medir_import(modulo)
+            tiempos.append(ms)
+        mediana = statistics.median(tiempos)
+        presupuesto = PRESUPUESTOS_MS.get(modulo, 0) * args.factor
+        prohibidos = sorted(
+            {m.split(".")[0] for m in cargados} & set(PROHIBIDOS.get(modulo, ()))
+        )
+        ok = (not presupuesto or mediana <= presupuesto) and not prohibidos
+        resultados[modulo] = {
+            "mediana_ms": round(mediana, 1),
+            "min_ms": round(min(tiempos), 1),
+            "presupuesto_ms": presupuesto,
+            "prohibidos_cargados": prohibidos,
+            "ok": ok,
+        }
+        estado = "OK" if ok else "FALLO"
+        extra = f" | carga {', '.join(prohibidos)}" if prohibidos else ""
+        print(f"{estado:5} {modulo}: {mediana:.1f} ms (presupuesto {presupuesto:.0f} ms){extra}")
+        if not ok:
+            fallos.append(modulo)
+
+    salida = Path(args.salida)
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump({"python": sys.version.split()[0], "modulos": resultados}, f, ensure_ascii=False, indent=2)
+    print(f"Resultados guardados en: {salida}")
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
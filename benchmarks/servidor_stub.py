@@ -0,0 +1,184 @@
+"""
+Servidor HTTP local que sirve las paginas guardadas en benchmarks/fixtures, para medir los
+scrapers sin red.
+
+Rutas:
+- .../all-nc/<N>?what=..&where=..   listado de Paginas Amarillas (pa_listado.html)
+- .../PgNum-<N>/ o .../             listado de Empresite (empresite_listado.html)
+- /<FICHA>.html                     ficha de Empresite (empresite_ficha.html)
+Cada pagina N cambia los nombres y las URLs de ficha (si no, el scraper la tomaria por
+repetida) y el contador "N resultados" se ajusta a paginas_pa. Pasada la ultima pagina se
+devuelve un listado vacio. Cada respuesta lleva ETag y un If-None-Match que coincide recibe
+304 (revalidacion de cache_http).
+
+Uso suelto (para probar un scraper a mano):
+    python benchmarks/servidor_stub.py --puerto 8800 --paginas-pa 20
+"""
+import argparse
+import hashlib
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+CARPETA_FIXTURES = Path(__file__).resolve().parent / "fixtures"
+HOST_EMPRESITE = "https://empresite.eleconomista.es"
+
+_nombre_pa = re.compile(r'(itemprop="name">)([^<]+)')
+_total_pa = re.compile(r"\d+(\s+resultados)")
+_ficha_empresite = re.compile(re.escape(HOST_EMPRESITE) + r"/([A-Z0-9-]+)\.html")
+_pagina_pa = re.compile(r"/all-nc/(\d+)")
+_pagina_empresite = re.compile(r"/PgNum-(\d+)/?$")
+
+LISTADO_VACIO = "<!DOCTYPE html><html><body><h1>0 resultados</h1></body></html>"
+
+
+def cargar_fixtures(carpeta=CARPETA_FIXTURES):
+    carpeta = Path(carpeta)
+    return {
+        "pa_listado": (carpeta / "pa_listado.html").read_text(encoding="utf-8"),
+        "empresite_listado": (carpeta / "empresite_listado.html").read_text(encoding="utf-8"),
+        "empresite_ficha": (carpeta / "empresite_ficha.html").read_text(encoding="utf-8"),
+    }
+
+
+def cajas_por_listado_pa(html):
+    return html.count('class="box"')
+
+
+class ServidorFixtures:
+    """
+    with ServidorFixtures(paginas_pa=10) as servidor:
+        servidor.url  -> "http://127.0.0.1:<puerto>"
+    latencia_seconds: espera por peticion (simula la red; 0 = solo CPU).
+    """
+
+    def __init__(self, carpeta=CARPETA_FIXTURES, paginas_pa=5, paginas_empresite=3, latencia_seconds=0.0,
+                 puerto=0, host="127.0.0.1"):
+        self.fixtures = cargar_fixtures(carpeta)
+        self.paginas_pa = paginas_pa
+        self.paginas_empresite = paginas_empresite
+        self.latencia_seconds = latencia_seconds
+        self.peticiones = 0
+        self.no_modificadas = 0
+        self.bytes_servidos = 0
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._servidor = ThreadingHTTPServer((host, puerto), self._manejador())
+        self._servidor.daemon_threads = True
+        self.url = f"http://{host}:{self._servidor.server_address[1]}"
+        self._hilo = None
+
+    def __enter__(self):
+        self.iniciar()
+        return self
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._hilo.start()
+        return self.url
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    # ---------------- CONTENIDO ----------------
+
+    def listado_pa(self, pagina):
+        if pagina > self.paginas_pa:
+            return LISTADO_VACIO
+        html = self.fixtures["pa_listado"]
+        total = self.paginas_pa * cajas_por_listado_pa(html)
+        html = _total_pa.sub(lambda m: f"{total}{m.group(1)}", html, count=1)
+        return _nombre_pa.sub(lambda m: f"{m.group(1)}{m.group(2)} · p{pagina}", html)
+
+    def listado_empresite(self, pagina):
+        if pagina > self.paginas_empresite:
+            return LISTADO_VACIO
+        return _ficha_empresite.sub(
+            lambda m: f"{HOST_EMPRESITE}/{m.group(1)}-P{pagina}.html", self.fixtures["empresite_listado"]
+        )
+
+    def ficha_empresite(self, ruta):
+        nombre = ruta.rsplit("/", 1)[-1][: -len(".html")].replace("-", " ")
+        return self.fixtures["empresite_ficha"].replace("FONTANERIA GARCIA SL", nombre)
+
+    def contenido(self, ruta):
+        camino = ruta.split("?")[0]
+        m = _pagina_pa.search(camino)
+        if m:
+            return self.listado_pa(int(m.group(1)))
+        if camino.endswith(".html"):
+            return self.ficha_empresite(camino)
+        m = _pagina_empresite.search(camino)
+        return self.listado_empresite(int(m.group(1)) if m else 1)
+
+    def _manejador(self):
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if servidor.latencia_seconds:
+                    time.sleep(servidor.latencia_seconds)
+                with servidor._lock:
+                    cuerpo = servidor._cache.get(self.path)
+                if cuerpo is None:
+                    cuerpo = servidor.contenido(self.path).encode("utf-8")
+                    with servidor._lock:
+                        servidor._cache[self.path] = cuerpo
+                etag = '"%s"' % hashlib.sha1(cuerpo).hexdigest()[:16]
+                no_modificada = self.headers.get("If-None-Match") == etag
+                with servidor._lock:
+                    servidor.peticiones += 1
+                    if no_modificada:
+                        servidor.no_modificadas += 1
+                    else:
+                        servidor.bytes_servidos += len(cuerpo)
+                if no_modificada:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *args):
+                pass
+
+        return Manejador
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puerto", type=int, default=8800)
+    parser.add_argument("--paginas-pa", type=int, default=5)
+    parser.add_argument("--paginas-empresite", type=int, default=3)
+    parser.add_argument("--latencia", type=float, default=0.0, help="Segundos de espera por peticion")
+    args = parser.parse_args()
+    servidor = ServidorFixtures(
+        paginas_pa=args.paginas_pa,
+        paginas_empresite=args.paginas_empresite,
+        latencia_seconds=args.latencia,
+        puerto=args.puerto,
+    )
+    print(f"Sirviendo {CARPETA_FIXTURES} en {servidor.url} (Ctrl+C para parar)")
+    print(f"  Paginas Amarillas: {servidor.url}/search/fontaneros/all-ma/madrid/all-is/coslada/all-ba/all-pu/all-nc/1?what=fontaneros&where=coslada")
+    print(f"  Empresite:         {servidor.url}/actividad/fontaneria/localidad/COSLADA-MADRID/")
+    try:
+        servidor._servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Cache HTTP persistente de los listados, debajo de la descarga (ver6 y lotes).
+
+Repetir una busqueda (categoria + localidad) volvia a descargar todas sus paginas aunque
+no hubieran cambiado desde el dia anterior. CacheHTTP guarda, por URL normalizada (la que
+sale de construir_url), el cuerpo comprimido y las cabeceras ETag / Last-Modified:
+- entrada fresca (guardada o revalidada hace menos de max_edad_horas): se sirve sin red
+- entrada caducada: se pide con If-None-Match / If-Modified-Since; un 304 la renueva sin
+  transferir el cuerpo y un 200 la sustituye
+- no se guardan errores, paginas de desafio (ritmo_adaptativo.parece_desafio) ni
+  respuestas con Cache-Control: no-store
+- tamaño acotado (max_bytes, comprimido): se expulsan las entradas usadas hace mas tiempo
+Las paginas dinamicas suelen llegar con Cache-Control: no-cache, asi que la frescura la
+decide max_edad_horas y no el servidor.
+SQLite (stdlib) como indice_empresas: un fichero, seguro entre hilos con el lock interno.
+Para vaciarla basta con borrar resultados/cache_http.sqlite.
+
+Uso:
+    cache = CacheHTTP()
+    r = cache.get(sesion, url, ritmo=ritmo, timeout=15)  # requests.Response o RespuestaCache
+    bytes_transferidos(r)                                # 0 si vino de la cache
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from archivo_html import _comprimir, _descomprimir
+from ritmo_adaptativo import parece_desafio
+
+RUTA_CACHE = Path("resultados") / "cache_http.sqlite"
+MAX_EDAD_HORAS = 12
+MAX_BYTES = 256 * 2**20
+# Al pasar de max_bytes se expulsa hasta quedar en esta fraccion (no expulsar en cada escritura).
+FRACCION_TRAS_EXPULSAR = 0.9
+
+_SQL_TABLAS = (
+    """
+    CREATE TABLE IF NOT EXISTS respuestas (
+        url TEXT PRIMARY KEY,
+        cuerpo BLOB NOT NULL,
+        codec TEXT NOT NULL,
+        etag TEXT,
+        last_modified TEXT,
+        validada_en REAL NOT NULL,
+        ultimo_uso REAL NOT NULL,
+        bytes INTEGER NOT NULL,
+        bytes_originales INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS respuestas_uso ON respuestas (ultimo_uso)",
+)
+
+
+def normalizar_url(url):
+    """Clave de la cache: esquema y host en minusculas, parametros ordenados, sin fragmento."""
+    partes = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(partes.query, keep_blank_values=True)))
+    return urlunsplit((partes.scheme.lower(), partes.netloc.lower(), partes.path or "/", query, ""))
+
+
+def bytes_transferidos(respuesta):
+    return 0 if getattr(respuesta, "desde_cache", False) else len(respuesta.content)
+
+
+class RespuestaCache:
+    """Lo que usan los scrapers de requests.Response (status_code, text, content, headers)."""
+
+    desde_cache = True
+    status_code = 200
+    encoding = "utf-8"
+
+    def __init__(self, url, content, etag=None, last_modified=None, revalidada=False):
+        self.url = url
+        self.content = content
+        self.text = content.decode("utf-8")
+        self.headers = {k: v for k, v in (("ETag", etag), ("Last-Modified", last_modified)) if v}
+        self.revalidada = revalidada  # True: el servidor respondio 304; False: servida sin red
+
+
+class CacheHTTP:
+    def __init__(self, ruta=RUTA_CACHE, max_edad_horas=MAX_EDAD_HORAS, max_bytes=MAX_BYTES):
+        self.ruta = Path(ruta)
+        self.max_edad_seconds = max(0.0, float(max_edad_horas)) * 3600
+        self.max_bytes = int(max_bytes)
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.ruta), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for sql in _SQL_TABLAS:
+            self._conn.execute(sql)
+        self._conn.commit()
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM respuestas").fetchone()[0]
+        self.frescas = 0
+        self.revalidadas = 0
+        self.descargadas = 0
+        self.expulsadas = 0
+        self.bytes_ahorrados = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _leer(self, clave):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT cuerpo, codec, etag, last_modified, validada_en, bytes_originales FROM respuestas WHERE url = ?",
+                (clave,),
+            ).fetchone()
+
+    def get(self, sesion, url, ritmo=None, **kwargs):
+        """
+        sesion.get(url, **kwargs) pasando por la cache; con ritmo (ritmo_adaptativo.ControlRitmo)
+        la peticion espera su turno del host. Devuelve RespuestaCache si no hizo falta el cuerpo
+        (fresca o 304) y la respuesta de requests en otro caso.
+        """
+        clave = normalizar_url(url)
+        fila = self._leer(clave)
+        ahora = time.time()
+        if fila is not None:
+            cuerpo, codec, etag, last_modified, validada_en, originales = fila
+            if ahora - validada_en < self.max_edad_seconds:
+                with self._lock:
+                    self._conn.execute("UPDATE respuestas SET ultimo_uso = ? WHERE url = ?", (ahora, clave))
+                    self._conn.commit()
+                    self.frescas += 1
+                    self.bytes_ahorrados += originales
+                return RespuestaCache(url, _descomprimir(codec, cuerpo), etag, last_modified)
+            cabeceras = dict(kwargs.pop("headers", None) or {})
+            if etag:
+                cabeceras["If-None-Match"] = etag
+            if last_modified:
+                cabeceras["If-Modified-Since"] = last_modified
+            kwargs["headers"] = cabeceras
+
+        r = ritmo.get(sesion, url, **kwargs) if ritmo is not None else sesion.get(url, **kwargs)
+
+        if r.status_code == 304 and fila is not None:
+            # El 304 puede traer validadores nuevos; si no, siguen los guardados.
+            etag = r.headers.get("ETag") or etag
+            last_modified = r.headers.get("Last-Modified") or last_modified
+            ahora = time.time()
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE respuestas SET etag = ?, last_modified = ?, validada_en = ?, ultimo_uso = ? WHERE url = ?",
+                    (etag, last_modified, ahora, ahora, clave),
+                )
+                self._conn.commit()
+                self.revalidadas += 1
+                self.bytes_ahorrados += originales
+            return RespuestaCache(url, _descomprimir(codec, cuerpo), etag, last_modified, revalidada=True)
+
+        if r.status_code == 200:
+            self.descargadas += 1
+            self._guardar(clave, r)
+        return r
+
+    def _guardar(self, clave, r):
+        if "no-store" in (r.headers.get("Cache-Control") or "").lower():
+            return
+        texto = r.text
+        if parece_desafio(texto):
+            return
+        originales = texto.encode("utf-8")
+        codec, cuerpo = _comprimir(originales)
+        ahora = time.time()
+        with self._lock:
+            anterior = self._conn.execute("SELECT bytes FROM respuestas WHERE url = ?", (clave,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO respuestas "
+                "(url, cuerpo, codec, etag, last_modified, validada_en, ultimo_uso, bytes, bytes_originales) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    clave,
+                    cuerpo,
+                    codec,
+                    r.headers.get("ETag"),
+                    r.headers.get("Last-Modified"),
+                    ahora,
+                    ahora,
+                    len(cuerpo),
+                    len(originales),
+                ),
+            )
+            self._bytes += len(cuerpo) - (anterior[0] if anterior else 0)
+            if self._bytes > self.max_bytes:
+                self._expulsar()
+            self._conn.commit()
+
+    def _expulsar(self):
+        # Con el lock tomado: las menos usadas primero hasta bajar de FRACCION_TRAS_EXPULSAR.
+        objetivo = self.max_bytes * FRACCION_TRAS_EXPULSAR
+        borrar = []
+        for url, tamano in self._conn.execute("SELECT url, bytes FROM respuestas ORDER BY ultimo_uso"):
+            if self._bytes <= objetivo:
+                break
+            borrar.append((url,))
+            self._bytes -= tamano
+        self._conn.executemany("DELETE FROM respuestas WHERE url = ?", borrar)
+        self.expulsadas += len(borrar)
+
+    def resumen(self):
+        with self._lock:
+            entradas = self._conn.execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+        return (
+            f"Cache HTTP: {self.frescas} sin red, {self.revalidadas} revalidadas (304), "
+            f"{self.descargadas} descargadas, {self.bytes_ahorrados / 2**20:.1f} MiB ahorrados | "
+            f"{entradas} entradas, {self._bytes / 2**20:.1f} MiB, {self.expulsadas} expulsadas"
+        )
@@ -0,0 +1,238 @@
+"""
+CLI sin pantalla del Consultor (cron, servidores sin display). No importa Tkinter.
+
+Cada subcomando escribe su resultado como JSON en stdout (--jsonl: una fila por linea
+en los listados) y el progreso en stderr. Ejemplos:
+
+    python consultor_cli.py analizar
+    python consultor_cli.py deduplicar --aplicar --eliminar-invalidos
+    python consultor_cli.py redundancias > grupos.json
+    python consultor_cli.py fusionar --grupos grupos.json
+    python consultor_cli.py huerfanas --eliminar
+    python consultor_cli.py enviar --tipos RE --limite 20
+"""
+import argparse
+import datetime as dt
+import json
+import sys
+from decimal import Decimal
+
+import consultor_core as core
+from registros_compactos import a_json
+
+
+def _log(msg):
+    print(msg, file=sys.stderr, flush=True)
+
+
+def _a_json(obj):
+    # Lo que devuelve MySQL (fechas, DECIMAL); el resto como registros_compactos.a_json
+    # (filas compactas a dict, TypeError para tipos desconocidos).
+    if isinstance(obj, (dt.date, dt.datetime, dt.time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    return a_json(obj)
+
+
+def _salida(datos, jsonl=False):
+    if jsonl and isinstance(datos, list):
+        for fila in datos:
+            print(json.dumps(fila, ensure_ascii=False, default=_a_json))
+        return
+    print(json.dumps(datos, ensure_ascii=False, indent=2, default=_a_json))
+
+
+def _leer_grupos(ruta):
+    f = sys.stdin if ruta == "-" else open(ruta, "r", encoding="utf-8")
+    try:
+        grupos = json.load(f)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    if not isinstance(grupos, list):
+        raise ValueError("--grupos debe contener una lista JSON de grupos")
+    return grupos
+
+
+def _emails_para_envio(tipos, incluir_enviados=False):
+    # Mismo reparto que la ventana de envio: los EN solo si se piden explicitamente.
+    tipos = {t.strip().upper() for t in tipos}
+    for pagina in core.iterar_emails_empresas():
+        for e in pagina:
+            if e.get("id_estado") == "EN" and not incluir_enviados:
+                continue
+            if (e.get("id_tipo_email") or "").strip().upper() in tipos:
+                yield e
+
+
+def cmd_analizar(args):
+    return core.resumen_limpieza_emails(recontar=args.recontar)
+
+
+def cmd_deduplicar(args):
+    return core.deduplicar_emails(
+        aplicar=args.aplicar,
+        eliminar_invalidos=args.eliminar_invalidos,
+        log_func=_log,
+        tamano_lote=args.lote,
+    )
+
+
+def cmd_indices(args):
+    return {"aplicados": core.migrar_columnas_normalizadas(log_func=_log)}
+
+
+def cmd_estadisticas(args):
+    if args.accion == "instalar":
+        return core.instalar_estadisticas_emails(log_func=_log)
+    return core.verificar_estadisticas_emails(log_func=_log)
+
+
+def cmd_redundancias(args):
+    return core.buscar_redundancias_email_nombre_empresa()
+
+
+def cmd_parecidas(args):
+    return core.buscar_empresas_similares_db(umbral=args.umbral, log_func=_log)
+
+
+def cmd_fusionar(args):
+    grupos = []
+    if args.grupos:
+        grupos.extend(_leer_grupos(args.grupos))
+    for ids in args.ids or []:
+        grupos.append([i.strip() for i in ids.split(",") if i.strip()])
+    if not grupos:
+        raise ValueError("Indica --ids o --grupos")
+    return core.fusionar_grupos_empresas(grupos, log_func=_log, tamano_lote=args.lote)
+
+
+def cmd_huerfanas(args):
+    empresas = core.listar_empresas_sin_emails_validos(solo_sin_telefono=not args.con_telefono)
+    if not args.eliminar:
+        return empresas
+    ids = [e["id_empresa"] for e in empresas if e.get("id_empresa")]
+    res = core.eliminar_empresas(ids, log_func=_log, tamano_lote=args.lote)
+    res["candidatas"] = len(ids)
+    return res
+
+
+def cmd_estados(args):
+    return core.obtener_estados_email()
+
+
+def cmd_emails(args):
+    return list(_emails_para_envio(args.tipos.split(","), incluir_enviados=args.incluir_enviados))
+
+
+def cmd_recontacto(args):
+    return core.reactivar_enviados_si_nuevo_mes()
+
+
+def cmd_enviar(args):
+    recontacto = core.reactivar_enviados_si_nuevo_mes()
+    if recontacto.get("performed"):
+        _log(f"Recontacto mensual aplicado ({recontacto['month']}): {recontacto['updated']} estados EN -> PE.")
+
+    destinatarios = core.filtrar_destinatarios_unicos(_emails_para_envio(args.tipos.split(",")))
+    if args.limite:
+        destinatarios = destinatarios[: args.limite]
+    if args.simular:
+        return {"destinatarios": [d["email"] for d in destinatarios]}
+
+    cuerpo = core.PLANTILLA_EMAIL
+    if args.plantilla:
+        with open(args.plantilla, "r", encoding="utf-8") as f:
+            cuerpo = f.read()
+    _log(f"Enviando a {len(destinatarios)} destinatarios...")
+    return core.enviar_emails_lote(
+        destinatarios,
+        args.asunto,
+        cuerpo,
+        warmup_enabled=not args.sin_warmup,
+        log_func=_log,
+        on_limites=lambda limits: _log(f"Warm-up: {limits}") if limits else None,
+    )
+
+
+def construir_parser():
+    parser = argparse.ArgumentParser(
+        prog="consultor_cli", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--jsonl", action="store_true", help="Listados como JSON Lines (una fila por linea)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("analizar", help="Contadores de emails invalidos y duplicados")
+    p.add_argument("--recontar", action="store_true", help="Ignorar estadisticas materializadas")
+    p.set_defaults(func=cmd_analizar)
+
+    p = sub.add_parser("deduplicar", help="Elimina emails duplicados (y opcionalmente invalidos)")
+    p.add_argument("--aplicar", action="store_true", help="Sin esto solo se muestra el resumen")
+    p.add_argument("--eliminar-invalidos", action="store_true")
+    p.add_argument("--lote", type=int, default=core.DEDUP_CHUNK_SIZE)
+    p.set_defaults(func=cmd_deduplicar)
+
+    p = sub.add_parser("indices", help="Crea columnas normalizadas e indices")
+    p.set_defaults(func=cmd_indices)
+
+    p = sub.add_parser("estadisticas", help="Estadisticas materializadas de limpieza")
+    p.add_argument("accion", choices=["instalar", "verificar"])
+    p.set_defaults(func=cmd_estadisticas)
+
+    p = sub.add_parser("redundancias", help="Mismo email + mismo nombre con distinta id_empresa")
+    p.set_defaults(func=cmd_redundancias)
+
+    p = sub.add_parser("parecidas", help="Empresas parecidas (telefono/dominio/CP + nombre)")
+    p.add_argument("--umbral", type=float, default=None)
+    p.set_defaults(func=cmd_parecidas)
+
+    p = sub.add_parser("fusionar", help="Fusiona grupos de empresas duplicadas")
+    p.add_argument("--ids", action="append", help="Grupo de ids separados por comas (repetible)")
+    p.add_argument("--grupos", help="JSON con grupos (salida de redundancias/parecidas); '-' para stdin")
+    p.add_argument("--lote", type=int, default=core.DEDUP_CHUNK_SIZE)
+    p.set_defaults(func=cmd_fusionar)
+
+    p = sub.add_parser("huerfanas", help="Empresas sin emails validos")
+    p.add_argument("--con-telefono", action="store_true", help="Incluir tambien las que tienen telefono")
+    p.add_argument("--eliminar", action="store_true", help="Eliminarlas (y sus datos asociados)")
+    p.add_argument("--lote", type=int, default=core.DEDUP_CHUNK_SIZE)
+    p.set_defaults(func=cmd_huerfanas)
+
+    p = sub.add_parser("estados", help="Estados de envio por email")
+    p.set_defaults(func=cmd_estados)
+
+    p = sub.add_parser("emails", help="Emails validos listos para envio")
+    p.add_argument("--tipos", default="RE", help="Tipos de email separados por comas (RE,IN,CO,AD)")
+    p.add_argument("--incluir-enviados", action="store_true")
+    p.set_defaults(func=cmd_emails)
+
+    p = sub.add_parser("recontacto", help="Reactiva EN -> PE si ha cambiado el mes")
+    p.set_defaults(func=cmd_recontacto)
+
+    p = sub.add_parser("enviar", help="Envia la plantilla a los emails pendientes")
+    p.add_argument("--tipos", default="RE", help="Tipos de email separados por comas (RE,IN,CO,AD)")
+    p.add_argument("--asunto", default=core.ASUNTO_EMAIL)
+    p.add_argument("--plantilla", help="Fichero HTML (por defecto PLANTILLA_EMAIL)")
+    p.add_argument("--limite", type=int, default=0, help="Maximo de destinatarios (0 = sin limite)")
+    p.add_argument("--sin-warmup", action="store_true")
+    p.add_argument("--simular", action="store_true", help="Solo lista los destinatarios")
+    p.set_defaults(func=cmd_enviar)
+    return parser
+
+
+def main(argv=None):
+    args = construir_parser().parse_args(argv)
+    try:
+        res = args.func(args)
+    except Exception as exc:
+        _log(f"Error: {exc}")
+        return 1
+    _salida(res, jsonl=args.jsonl)
+    if isinstance(res, dict) and res.get("errores"):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2337 @@
+"""
+Capa de datos y envio del Consultor (sin Tkinter): MySQL, limpieza/deduplicacion,
+fusiones, estados de email, warm-up y envio SMTP, y el ejecutor de trabajos en segundo plano.
+
+La usan la GUI (Consultor_db_v5.py) y la CLI (consultor_cli.py); importarla no carga Tk.
+"""
+import json
+import queue
+import threading
+import random
+import time
+import os
+import sys
+from pathlib import Path
+import datetime as dt
+from dotenv import load_dotenv
+
+import dedup_empresas
+from registros_compactos import FilaEmail
+
+# mysql.connector y smtplib/ssl se importan en conectar_db/enviar_email: la CLI (--help,
+# subcomandos que fallan pronto) y los benchmarks no pagan su carga si no los usan.
+# dotenv se queda arriba porque DB_CONFIG/SMTP_* se leen al importar.
+
+# ---------------- CONFIG ----------------
+def _get_base_dir():
+    # When bundled (PyInstaller), __file__ points inside the temp bundle.
+    # Use the folder that contains the executable so `.env` and state live next to it.
+    if getattr(sys, "frozen", False):
+        return Path(sys.executable).resolve().parent
+    return Path(__file__).resolve().parent
+
+
+BASE_DIR = _get_base_dir()
+load_dotenv(BASE_DIR / ".env")
+
+
+def env_int(key, default):
+    try:
+        return int(os.getenv(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "port": env_int("DB_PORT", 3306),
+    "user": os.getenv("DB_USER"),
+    "password": os.getenv("DB_PASSWORD"),
+    "database": os.getenv("DB_NAME"),
+    "charset": os.getenv("DB_CHARSET", "utf8mb4"),
+}
+
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = env_int("SMTP_PORT", 587)
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASS = os.getenv("SMTP_PASS")
+
+WARMUP_STATE_PATH = BASE_DIR / "warmup_state.json"
+RECONTACT_STATE_PATH = BASE_DIR / "recontact_state.json"
+# Límite diario progresivo (día 0..N desde el primer envío registrado)
+WARMUP_DAILY_SCHEDULE = [10, 20, 30, 40, 60, 80, 100, 120, 150]
+WARMUP_HOURLY_LIMIT = 15
+WARMUP_DELAY_BETWEEN_EMAILS_SECONDS = (25.0, 75.0)  # jitter humano
+WARMUP_LONG_PAUSE_EVERY = 5
+WARMUP_LONG_PAUSE_SECONDS = (120.0, 300.0)
+
+ESTADOS_DESCRIPCION = {
+    "EN": "Enviado",
+    "ER": "Error",
+    "PE": "Pendiente",
+}
+
+ASUNTO_EMAIL = "Propuesta Soluciones Informáticas JM Ordenadores para {empresa}"
+
+PLANTILLA_EMAIL = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="UTF-8">
+<title>JMOrdenadores</title>
+</head>
+<body style="margin:0; padding:0; background-color:#f4f6f8; font-family: Arial, Helvetica, sans-serif;">
+<table width="100%" cellpadding="0" cellspacing="0" style="background-color:#f4f6f8; padding:20px;">
+  <tr>
+    <td align="center">
+      <table width="600" cellpadding="0" cellspacing="0" style="background-color:#ffffff; border-radius:8px; overflow:hidden; box-shadow:0 2px 8px rgba(0,0,0,0.05);">
+        
+        <tr>
+          <td style="background-color:#0b3c5d; padding:20px; text-align:center;">
+            <img src="https://jmordenadores.com/assets/logoblue-DnLYxD6_.png"
+                 alt="JMOrdenadores"
+                 style="max-width:220px;">
+          </td>
+        </tr>
+
+        <tr>
+          <td style="padding:30px; color:#333333; font-size:15px; line-height:1.6;">
+
+            <p>{saludo}</p>
+
+            <p>
+              Nos ponemos en contacto tras revisar vuestra actividad como 
+              {tipo_empresa} en {localidad}.
+            </p>
+
+            <p>
+              En <strong>JMOrdenadores</strong> ofrecemos soluciones informáticas
+              específicas para empresas en Madrid,
+              ayudando a mejorar el rendimiento, la seguridad y la estabilidad
+              de sus sistemas.
+            </p>
+
+            <p style="margin:20px 0;">
+              <strong>Queremos que nos conozcáis sin compromiso:</strong>
+            </p>
+
+            <ul style="padding-left:20px;">
+              <li><strong>Primera visita totalmente gratuita</strong></li>
+              <li><strong>Resolución de la primera incidencia sin coste</strong></li>
+              <li><strong>Concertación de cita telefonica para adaptar el servicio a su medida</strong></li>
+            </ul>
+
+            <p>Además, ofrecemos:</p>
+
+            <ul style="padding-left:20px;">
+              <li>Soporte informático cercano y profesional</li>
+              <li>Venta y configuración de equipos y dispositivos</li>
+              <li>Servidores de almacenamiento y copias de seguridad</li>
+              <li>Consultoría en ciberseguridad</li>
+              <li>Planes de mantenimiento con cuotas mensuales</li>
+              <li>Precios muy competitivos</li>
+            </ul>
+
+            <p>
+              Nuestro objetivo es que negocios como <strong>{empresa}</strong>
+              puedan centrarse en su actividad mientras nosotros nos ocupamos
+              de que la infraestructura informática funcione sin problemas.
+            </p>
+
+            <p style="text-align:center; margin:30px 0;">
+              <a href="https://jmordenadores.com"
+                 style="background-color:#0b3c5d; color:#ffffff; text-decoration:none; padding:12px 25px; border-radius:5px; display:inline-block;">
+                Visitar nuestra web
+              </a>
+            </p>
+
+            <p>
+              No duden en contactarnos, estaremos encantados de valorar vuestra situación sin ningún compromiso.
+            </p>
+
+            <p style="margin-top:30px;">
+              Un saludo,<br>
+              <strong>José Miguel</strong><br>
+              JMOrdenadores
+            </p>
+
+          </td>
+        </tr>
+
+        <tr>
+          <td style="background-color:#f0f0f0; padding:15px; text-align:center; font-size:12px; color:#777;">
+            © JMOrdenadores · Soporte informático profesional<br>
+            <a href="https://jmordenadores.com" style="color:#0b3c5d; text-decoration:none;">
+              jmordenadores.com
+            </a>
+          </td>
+        </tr>
+
+      </table>
+    </td>
+  </tr>
+</table>
+</body>
+</html>
+"""
+
+
+# ---------------- DB ----------------
+INVALID_EMAIL_VALUES = ("no disponible", "", "none", "null")
+INVALID_PHONE_VALUES = ("no disponible", "", "none", "null")
+# Empresas por pagina en la carga incremental de emails (keyset).
+EMAILS_PAGE_SIZE = 500
+# Filas por lote en los DELETE de mantenimiento (commit por lote).
+DEDUP_CHUNK_SIZE = 5000
+# Empresas por lote al buscar duplicados parecidos (dedup_empresas).
+EMPRESAS_LOTE_DEDUP = 5000
+# Empresas por tramo (una transaccion) al recontar las estadisticas de emails.
+EMPRESAS_LOTE_ESTADISTICAS = 2000
+# Columnas normalizadas sobre TEXT: longitud de la VARCHAR generada (indexable con utf8mb4).
+LONGITUD_NORM_TEXTO = 255
+# Estadisticas materializadas de limpieza de emails (ver instalar_estadisticas_emails).
+# Email normalizado mas largo que cabe en la PK de mant_email_grupo junto a un tipo de hasta
+# 255 caracteres (3072 bytes en utf8mb4).
+LONGITUD_MAXIMA_CLAVE_EMAIL = 500
+MANT_TRIGGERS_EMAIL = ("trg_email_mant_ai", "trg_email_mant_au", "trg_email_mant_ad")
+
+
+def conectar_db():
+    import mysql.connector
+
+    return mysql.connector.connect(**DB_CONFIG)
+
+
+def obtener_empresas():
+    conn = conectar_db()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT id_empresa, nombre FROM empresa ORDER BY nombre")
+    empresas = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return empresas
+
+
+def _keyset_empresa_sql(ultimo):
+    """
+    Condicion keyset para seguir despues de (nombre, id_empresa) con ORDER BY em.nombre, em.id_empresa.
+    MySQL ordena los NULL primero, asi que si el ultimo nombre era NULL quedan el resto de NULL + todos los no NULL.
+    """
+    if ultimo is None:
+        return "1=1", []
+    nombre, id_empresa = ultimo
+    if nombre is None:
+        return "(em.nombre IS NOT NULL OR em.id_empresa > %s)", [id_empresa]
+    return "(em.nombre > %s OR (em.nombre = %s AND em.id_empresa > %s))", [nombre, nombre, id_empresa]
+
+
+def _sql_invalid_email_literal():
+    # Literal (no parametros) para SQL reutilizable; los valores son constantes del modulo.
+    return ",".join("'" + v.replace("'", "''") + "'" for v in INVALID_EMAIL_VALUES)
+
+
+def _sql_estados_por_email_norm(cursor):
+    """
+    (origen, expr_email_norm, expr_estado) segun el esquema de estados disponible, con la misma
+    prioridad de esquemas que obtener_estados_email; origen es el FROM ... JOIN ... a filtrar
+    por expr_email_norm. None si no hay estados.
+    """
+    columnas_email = _obtener_columnas_tabla(cursor, "email")
+    norm_x = _email_norm_sql("x", "email", columnas_email)
+    col_estado_en_email = _primera_columna_existente(
+        columnas_email, ["id_estado", "id_estado_email", "estado_email", "estado"]
+    )
+    if col_estado_en_email:
+        return "FROM email x", norm_x, f"x.{col_estado_en_email}"
+
+    if _tabla_existe(cursor, "email_estado"):
+        return "FROM email_estado ee JOIN email x ON x.id_email = ee.id_email", norm_x, "ee.id_estado"
+
+    if not _tabla_existe(cursor, "estado_email"):
+        return None
+    columnas_estado = _obtener_columnas_tabla(cursor, "estado_email")
+    col_estado = _primera_columna_existente(
+        columnas_estado, ["id_estado", "id_estado_email", "estado_email", "estado"]
+    )
+    col_ref_id_email = _primera_columna_existente(columnas_estado, ["id_email"])
+    col_ref_email = _primera_columna_existente(columnas_estado, ["email"])
+
+    if col_ref_id_email and col_estado:
+        return (
+            f"FROM estado_email ee JOIN email x ON x.id_email = ee.{col_ref_id_email}",
+            norm_x,
+            f"ee.{col_estado}",
+        )
+    if col_ref_email and col_estado:
+        return "FROM estado_email ee", _email_norm_sql("ee", col_ref_email), f"ee.{col_estado}"
+    return None
+
+
+def _sql_emails_envio(cursor):
+    """
+    Consulta unica (por pagina de empresas) para la ventana de envio:
+    email valido + tipo_empresa/localidad de la ultima busqueda + estado actual del email,
+    ya deduplicado por (email_norm, id_empresa, tipo). Placeholders: keyset y LIMIT.
+    El estado es por email normalizado: si la misma direccion esta EN en otra empresa, cuenta como EN.
+    Se calcula con una subconsulta correlacionada por cada email de la pagina (indice de
+    email_norm), no agregando los estados de toda la tabla en cada pagina.
+    """
+    invalid_lit = _sql_invalid_email_literal()
+    norm = _email_norm_sql("e", "email", _obtener_columnas_tabla(cursor, "email"))
+    estados = _sql_estados_por_email_norm(cursor)
+    if estados:
+        origen, norm_estado, estado = estados
+        col_estado = f"""COALESCE((
+            SELECT CASE
+                       WHEN SUM(UPPER(TRIM({estado})) = 'EN') > 0 THEN 'EN'
+                       WHEN SUM(UPPER(TRIM({estado})) = 'ER') > 0 THEN 'ER'
+                       ELSE MAX(UPPER(TRIM({estado})))
+                   END
+            {origen}
+            WHERE {norm_estado} = pg.email_norm AND {estado} IS NOT NULL
+        ), '')"""
+    else:
+        col_estado = "''"
+
+    return f"""
+        SELECT pg.id_empresa, pg.id_email, pg.id_tipo_email, pg.nombre, pg.email,
+               pg.tipo_empresa, pg.localidad, {col_estado} AS id_estado
+        FROM (
+            SELECT em.id_empresa, MIN(e.id_email) AS id_email,
+                   UPPER(TRIM(e.id_tipo_email)) AS id_tipo_email, em.nombre, MIN(e.email) AS email,
+                   {norm} AS email_norm, b.tipo_empresa, b.localidad
+            FROM (
+                SELECT em.id_empresa, em.nombre
+                FROM empresa em
+                WHERE {{keyset}}
+                  AND EXISTS (
+                      SELECT 1 FROM email e
+                      WHERE e.id_empresa = em.id_empresa
+                        AND e.email IS NOT NULL
+                        AND {norm} NOT IN ({invalid_lit})
+                  )
+                ORDER BY em.nombre, em.id_empresa
+                LIMIT %s
+            ) em
+            JOIN email e ON e.id_empresa = em.id_empresa
+            LEFT JOIN busqueda b ON b.id_busqueda = (
+                SELECT MAX(be.id_busqueda)
+                FROM busqueda_empresa be
+                WHERE be.id_empresa = em.id_empresa
+            )
+            WHERE e.email IS NOT NULL
+              AND {norm} NOT IN ({invalid_lit})
+            GROUP BY em.id_empresa, em.nombre, {norm}, UPPER(TRIM(e.id_tipo_email)),
+                     b.tipo_empresa, b.localidad
+        ) pg
+        ORDER BY pg.nombre, pg.id_empresa, pg.id_tipo_email, pg.email
+    """
+
+
+def iterar_emails_empresas(tamano_pagina=EMAILS_PAGE_SIZE):
+    """
+    Generador de paginas de emails validos listos para la ventana de envio (ver _sql_emails_envio).
+    - Pagina por empresa con keyset (nombre, id_empresa): sin OFFSET ni IN con todos los ids.
+    - Una consulta por pagina; todos los emails de una empresa van en la misma pagina.
+    - Cada fila es un registros_compactos.FilaEmail (se lee igual que el dict del cursor):
+      la ventana de envio las mantiene todas en memoria.
+    Pensado para consumirse fuera del hilo de Tk.
+    """
+    conn = conectar_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        plantilla = _sql_emails_envio(cursor)
+        ultimo = None
+        while True:
+            keyset, params = _keyset_empresa_sql(ultimo)
+            cursor.execute(plantilla.replace("{keyset}", keyset), params + [int(tamano_pagina)])
+            filas = cursor.fetchall()
+            if not filas:
+                return
+            ultimo = (filas[-1]["nombre"], filas[-1]["id_empresa"])
+            yield [FilaEmail.desde_fila(fila) for fila in filas]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _chunked(seq, size):
+    for i in range(0, len(seq), size):
+        yield seq[i : i + size]
+
+
+class OperacionCancelada(Exception):
+    """Trabajo cancelado entre lotes (ver EjecutorTrabajos)."""
+
+
+def _comprobar_cancelacion(cancelar):
+    # cancelar: threading.Event (o None). Se comprueba entre lotes, nunca a mitad de un commit.
+    if cancelar is not None and cancelar.is_set():
+        raise OperacionCancelada()
+
+
+def _email_norm_sql(alias, column_email, columnas=None):
+    # LOWER(TRIM(...)) handles basic normalization; NULL stays NULL.
+    # Si la tabla ya tiene la columna generada (migrar_columnas_normalizadas), usarla: es indexable.
+    if columnas and column_email == "email" and "email_norm" in columnas:
+        return f"{alias}.email_norm"
+    return f"LOWER(TRIM({alias}.{column_email}))"
+
+
+def _nombre_norm_sql(alias, columnas=None):
+    if columnas and "nombre_norm" in columnas:
+        return f"{alias}.nombre_norm"
+    return f"LOWER(TRIM({alias}.nombre))"
+
+
+def _indice_existe(cursor, nombre_tabla, nombre_indice):
+    cursor.execute(
+        """
+        SELECT 1
+        FROM information_schema.statistics
+        WHERE table_schema = %s AND table_name = %s AND index_name = %s
+        LIMIT 1
+        """,
+        (DB_CONFIG["database"], nombre_tabla, nombre_indice),
+    )
+    return cursor.fetchone() is not None
+
+
+def _sql_columna_normalizada(cursor, nombre_tabla, nombre_columna):
+    # (tipo, expresion) de la columna generada: misma longitud que la original para que ningun
+    # valor valido se quede fuera; TEXT no es indexable entero y se recorta a LONGITUD_NORM_TEXTO.
+    longitud = _longitud_columna_texto(cursor, nombre_tabla, nombre_columna)
+    if longitud:
+        return f"VARCHAR({longitud})", f"LOWER(TRIM({nombre_columna}))"
+    return f"VARCHAR({LONGITUD_NORM_TEXTO})", f"LEFT(LOWER(TRIM({nombre_columna})), {LONGITUD_NORM_TEXTO})"
+
+
+def migrar_columnas_normalizadas(log_func=None):
+    """
+    Migracion idempotente: columnas generadas STORED email.email_norm / empresa.nombre_norm
+    (LOWER(TRIM(...)), con la longitud de la columna original) e indices para que
+    dedup/redundancias no normalicen al vuelo.
+    - email: (id_empresa, id_tipo_email, email_norm) y (email_norm)
+    - empresa: (nombre_norm)
+    Devuelve la lista de pasos aplicados. Sobre tablas grandes el ALTER tarda (reescribe la tabla).
+    """
+    log = log_func or (lambda msg: None)
+    conn = conectar_db()
+    cursor = conn.cursor()
+    aplicados = []
+    try:
+        columnas_email = _obtener_columnas_tabla(cursor, "email")
+        col_email = _primera_columna_existente(columnas_email, ["email"])
+        col_empresa = _primera_columna_existente(columnas_email, ["id_empresa"])
+        col_tipo = _primera_columna_existente(columnas_email, ["id_tipo_email", "tipo_email", "tipo"])
+        if not (col_email and col_empresa):
+            raise RuntimeError(f"Esquema email no soportado: columnas={sorted(columnas_email)}")
+
+        pasos = []
+        if "email_norm" not in columnas_email:
+            tipo_norm, expr_norm = _sql_columna_normalizada(cursor, "email", col_email)
+            pasos.append(
+                (
+                    "email.email_norm",
+                    f"""
+                    ALTER TABLE email
+                    ADD COLUMN email_norm {tipo_norm}
+                    GENERATED ALWAYS AS ({expr_norm}) STORED
+                    """,
+                )
+            )
+        cols_idx = [col_empresa] + ([col_tipo] if col_tipo else []) + ["email_norm"]
+        if not _indice_existe(cursor, "email", "idx_email_empresa_tipo_norm"):
+            pasos.append(
+                (
+                    "email.idx_email_empresa_tipo_norm",
+                    f"ALTER TABLE email ADD INDEX idx_email_empresa_tipo_norm ({', '.join(cols_idx)})",
+                )
+            )
+        if not _indice_existe(cursor, "email", "idx_email_norm"):
+            pasos.append(("email.idx_email_norm", "ALTER TABLE email ADD INDEX idx_email_norm (email_norm)"))
+
+        columnas_empresa = _obtener_columnas_tabla(cursor, "empresa")
+        if "nombre_norm" not in columnas_empresa:
+            tipo_norm, expr_norm = _sql_columna_normalizada(cursor, "empresa", "nombre")
+            pasos.append(
+                (
+                    "empresa.nombre_norm",
+                    f"""
+                    ALTER TABLE empresa
+                    ADD COLUMN nombre_norm {tipo_norm}
+                    GENERATED ALWAYS AS ({expr_norm}) STORED
+                    """,
+                )
+            )
+        if not _indice_existe(cursor, "empresa", "idx_empresa_nombre_norm"):
+            pasos.append(
+                ("empresa.idx_empresa_nombre_norm", "ALTER TABLE empresa ADD INDEX idx_empresa_nombre_norm (nombre_norm)")
+            )
+
+        for nombre, sql in pasos:
+            log(f"Migracion: {nombre}...")
+            cursor.execute(sql)
+            aplicados.append(nombre)
+        conn.commit()
+        log(f"Migracion completada ({len(aplicados)} pasos aplicados).")
+        return aplicados
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _esquema_email_dedup(cursor):
+    """
+    Columnas de email relevantes para deduplicar: pk, email, id_empresa, tipo (opcional)
+    y la expresion de email normalizado a usar.
+    """
+    columnas_email = _obtener_columnas_tabla(cursor, "email")
+    esquema = {
+        "pk": _primera_columna_existente(columnas_email, ["id_email", "id"]),
+        "email": _primera_columna_existente(columnas_email, ["email"]),
+        "empresa": _primera_columna_existente(columnas_email, ["id_empresa"]),
+        "tipo": _primera_columna_existente(columnas_email, ["id_tipo_email", "tipo_email", "tipo"]),
+    }
+    if not (esquema["pk"] and esquema["email"] and esquema["empresa"]):
+        raise RuntimeError(f"Esquema email no soportado: columnas={sorted(columnas_email)}")
+    esquema["norm"] = _email_norm_sql("e1", esquema["email"], columnas_email)
+    # Para DELETE de una sola tabla (admite LIMIT pero no alias en MySQL < 8.0.16).
+    esquema["norm_tabla"] = _email_norm_sql("email", esquema["email"], columnas_email)
+    esquema["info"] = _info_columnas(cursor, "email")
+    # Clave de duplicado: (id_empresa, tipo, email_norm) -> encaja con idx_email_empresa_tipo_norm.
+    empresa, tipo, norm = _sql_clave_email(esquema, "e1")
+    esquema["clave"] = [empresa] + ([tipo] if esquema["tipo"] else []) + [norm]
+    return esquema
+
+
+def _longitud_clave_email(esq):
+    # Longitud del email normalizado en la clave; None = sin limite propio (TEXT) o demasiado
+    # largo para la PK de mant_email_grupo: se recorta a LONGITUD_MAXIMA_CLAVE_EMAIL.
+    info = esq["info"]
+    columna = info.get("email_norm") if esq["norm"].endswith(".email_norm") else info.get(esq["email"])
+    longitud = _longitud_texto(columna)
+    return longitud if longitud and longitud <= LONGITUD_MAXIMA_CLAVE_EMAIL else None
+
+
+def _sql_clave_email(esq, ref):
+    """
+    (empresa, tipo, email_norm) de la clave de duplicado sobre el alias ref (e1, NEW, OLD).
+    La comparten el recuento, el borrado de duplicados y los triggers de estadisticas: si cada
+    camino agrupara distinto, verificar_estadisticas_emails veria desfase siempre.
+    Va en la PK de mant_email_*: NULL -> 0/'' (solo si la columna admite NULL) y los emails
+    que no caben se recortan a LONGITUD_MAXIMA_CLAVE_EMAIL.
+    """
+    info = esq["info"]
+
+    def sin_nulos(col, defecto):
+        expr = f"{ref}.{col}"
+        return f"COALESCE({expr}, {defecto})" if info.get(col, {}).get("nula", True) else expr
+
+    tipo = sin_nulos(esq["tipo"], "''") if esq["tipo"] else "''"
+    norm = _email_norm_sql(ref, esq["email"], info)
+    if _longitud_clave_email(esq) is None:
+        norm = f"LEFT({norm}, {LONGITUD_MAXIMA_CLAVE_EMAIL})"
+    return sin_nulos(esq["empresa"], "0"), tipo, norm
+
+
+def _soporta_window_functions(cursor):
+    # ROW_NUMBER() OVER: MySQL >= 8.0 / MariaDB >= 10.2.
+    cursor.execute("SELECT VERSION()")
+    fila = cursor.fetchone()
+    version = str((fila.get("VERSION()") if isinstance(fila, dict) else fila[0]) or "")
+    try:
+        mayor, menor = (int(x) for x in version.split("-")[0].split(".")[:2])
+    except ValueError:
+        return False
+    if "mariadb" in version.lower():
+        return (mayor, menor) >= (10, 2)
+    return mayor >= 8
+
+
+def _recontar_limpieza_emails(cursor, esq):
+    # Recuento completo sobre email: una pasada para invalidos y otra agrupada para duplicados.
+    col_email = esq["email"]
+    norm = esq["norm"]
+
+    invalid_list = ",".join(["%s"] * len(INVALID_EMAIL_VALUES))
+    cursor.execute(
+        f"""
+        SELECT COUNT(*)
+        FROM email e1
+        WHERE e1.{col_email} IS NULL
+           OR {norm} IN ({invalid_list})
+        """,
+        INVALID_EMAIL_VALUES,
+    )
+    invalid_emails = int(cursor.fetchone()[0] or 0)
+
+    # Filtramos invalidos para no contar duplicados de basura.
+    cursor.execute(
+        f"""
+        SELECT COUNT(*), COALESCE(SUM(t.n - 1), 0)
+        FROM (
+            SELECT COUNT(*) AS n
+            FROM email e1
+            WHERE e1.{col_email} IS NOT NULL
+              AND {norm} NOT IN ({invalid_list})
+            GROUP BY {", ".join(esq["clave"])}
+            HAVING COUNT(*) > 1
+        ) t
+        """,
+        INVALID_EMAIL_VALUES,
+    )
+    fila = cursor.fetchone()
+    return {
+        "invalid_emails": invalid_emails,
+        "duplicate_rows_to_delete": int(fila[1] or 0),
+        "duplicate_groups": int(fila[0] or 0),
+    }
+
+
+def resumen_limpieza_emails(recontar=False):
+    """
+    Devuelve contadores para:
+    - invalid_emails: emails NULL o placeholders tipo 'no disponible'
+    - duplicate_rows_to_delete: filas duplicadas que se eliminarian conservando la menor PK
+    - duplicate_groups: grupos duplicados detectados
+    Si las estadisticas materializadas estan instaladas (instalar_estadisticas_emails) se derivan
+    de mant_email_grupo/mant_email_invalido (milisegundos). recontar=True, o sin estadisticas,
+    fuerza el recuento completo.
+    """
+    conn = conectar_db()
+    cursor = conn.cursor()
+    try:
+        if not recontar:
+            stats = _leer_estadisticas_emails(cursor)
+            if stats is not None:
+                return stats
+        return _recontar_limpieza_emails(cursor, _esquema_email_dedup(cursor))
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# Los triggers solo escriben en la fila de su clave (empresa, tipo, email), no en contadores
+# globales; los totales se suman al leer (_conteos_estadisticas). En REPEATABLE READ el
+# UPDATE + DELETE de la baja puede bloquear tambien el hueco junto a su clave, asi que altas y
+# bajas de claves vecinas del indice pueden esperarse un momento.
+
+def _sql_trigger_alta(esq, ref):
+    empresa, tipo, norm = _sql_clave_email(esq, ref)
+    return f"""
+    IF {ref}.{esq["email"]} IS NULL OR {norm} IN ({_sql_invalid_email_literal()}) THEN
+        INSERT INTO mant_email_invalido (id_empresa, tipo, n)
+        VALUES ({empresa}, {tipo}, 1)
+        ON DUPLICATE KEY UPDATE n = n + 1;
+    ELSE
+        INSERT INTO mant_email_grupo (id_empresa, tipo, email_norm, n)
+        VALUES ({empresa}, {tipo}, {norm}, 1)
+        ON DUPLICATE KEY UPDATE n = n + 1;
+    END IF;
+    """
+
+
+def _sql_trigger_baja(esq, ref):
+    empresa, tipo, norm = _sql_clave_email(esq, ref)
+    donde_invalido = f"id_empresa = {empresa} AND tipo = {tipo}"
+    donde = f"{donde_invalido} AND email_norm = {norm}"
+    return f"""
+    IF {ref}.{esq["email"]} IS NULL OR {norm} IN ({_sql_invalid_email_literal()}) THEN
+        UPDATE mant_email_invalido SET n = n - 1 WHERE {donde_invalido};
+        DELETE FROM mant_email_invalido WHERE {donde_invalido} AND n <= 0;
+    ELSE
+        UPDATE mant_email_grupo SET n = n - 1 WHERE {donde};
+        DELETE FROM mant_email_grupo WHERE {donde} AND n <= 0;
+    END IF;
+    """
+
+
+def _tipos_tablas_estadisticas(esq):
+    # Tipos de la clave en mant_email_*, sacados de email: un tipo o email mas largo que la
+    # columna haria fallar (modo estricto) el trigger y con el el INSERT del usuario en email.
+    # (tipo, longitud) como _info_columnas; los tipos no textuales (INT...) se guardan como texto.
+    longitud_tipo = _longitud_texto(esq["info"].get(esq["tipo"])) if esq["tipo"] else 1
+    return {
+        "id_empresa": ("bigint", None),
+        "tipo": ("varchar", longitud_tipo or 32),
+        "email_norm": ("varchar", _longitud_clave_email(esq) or LONGITUD_MAXIMA_CLAVE_EMAIL),
+    }
+
+
+def _sql_tipo(tipo):
+    nombre, longitud = tipo
+    return f"{nombre.upper()}({longitud})" if longitud else nombre.upper()
+
+
+def _asegurar_tablas_estadisticas(cursor, esq):
+    tipos = {col: _sql_tipo(t) for col, t in _tipos_tablas_estadisticas(esq).items()}
+    # Filas por clave de duplicado (solo emails validos); n > 1 es un grupo duplicado.
+    # idx_mant_email_grupo_n: los totales leen solo los grupos duplicados (pocos).
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS mant_email_grupo (
+            id_empresa {tipos["id_empresa"]} NOT NULL,
+            tipo {tipos["tipo"]} NOT NULL,
+            email_norm {tipos["email_norm"]} NOT NULL,
+            n INT NOT NULL,
+            PRIMARY KEY (id_empresa, tipo, email_norm),
+            KEY idx_mant_email_grupo_n (n)
+        )
+        """
+    )
+    if not _indice_existe(cursor, "mant_email_grupo", "idx_mant_email_grupo_n"):
+        cursor.execute("CREATE INDEX idx_mant_email_grupo_n ON mant_email_grupo (n)")
+    # Emails invalidos por empresa y tipo (una fila por empresa con alguno, no uno global).
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS mant_email_invalido (
+            id_empresa {tipos["id_empresa"]} NOT NULL,
+            tipo {tipos["tipo"]} NOT NULL,
+            n INT NOT NULL,
+            PRIMARY KEY (id_empresa, tipo)
+        )
+        """
+    )
+    # Tablas de una instalacion anterior (o email cambio de esquema): mismos tipos que ahora.
+    for tabla in ("mant_email_grupo", "mant_email_invalido"):
+        actuales = _info_columnas(cursor, tabla)
+        cambios = [
+            f"MODIFY {col} {_sql_tipo(tipo)} NOT NULL"
+            for col, tipo in _tipos_tablas_estadisticas(esq).items()
+            if col in actuales and (actuales[col]["tipo"], tipo[1] and actuales[col]["longitud"]) != tipo
+        ]
+        if cambios:
+            cursor.execute(f"ALTER TABLE {tabla} {', '.join(cambios)}")
+
+
+def _estadisticas_instaladas(cursor):
+    cursor.execute(
+        """
+        SELECT COUNT(*)
+        FROM information_schema.triggers
+        WHERE trigger_schema = %s AND event_object_table = 'email' AND trigger_name IN (%s, %s, %s)
+        """,
+        (DB_CONFIG["database"],) + MANT_TRIGGERS_EMAIL,
+    )
+    fila = cursor.fetchone()
+    n = (fila.get("COUNT(*)") if isinstance(fila, dict) else fila[0]) or 0
+    return int(n) == len(MANT_TRIGGERS_EMAIL)
+
+
+def _conteos_estadisticas(cursor):
+    cursor.execute("SELECT COALESCE(SUM(n), 0) FROM mant_email_invalido")
+    fila = cursor.fetchone()
+    invalid_emails = int((fila.get("COALESCE(SUM(n), 0)") if isinstance(fila, dict) else fila[0]) or 0)
+    cursor.execute(
+        "SELECT COUNT(*) AS grupos, COALESCE(SUM(n - 1), 0) AS filas FROM mant_email_grupo WHERE n > 1"
+    )
+    fila = cursor.fetchone()
+    grupos, filas = (fila["grupos"], fila["filas"]) if isinstance(fila, dict) else fila
+    return {
+        "invalid_emails": invalid_emails,
+        "duplicate_rows_to_delete": int(filas or 0),
+        "duplicate_groups": int(grupos or 0),
+    }
+
+
+def _leer_estadisticas_emails(cursor):
+    # None si no hay triggers (los contadores estarian desfasados).
+    if not _estadisticas_instaladas(cursor):
+        return None
+    return _conteos_estadisticas(cursor)
+
+
+def _tramos_empresas(cursor, esq, tamano):
+    # Cortes de id_empresa (email y contadores actuales) en tramos de tamano empresas. El primero
+    # no tiene limite inferior ni el ultimo superior: una empresa nueva siempre cae en alguno.
+    col = esq["empresa"]
+    limites = []
+    for sql in (
+        f"SELECT MIN({col}), MAX({col}) FROM email",
+        "SELECT MIN(id_empresa), MAX(id_empresa) FROM mant_email_grupo",
+        "SELECT MIN(id_empresa), MAX(id_empresa) FROM mant_email_invalido",
+    ):
+        cursor.execute(sql)
+        fila = cursor.fetchone()
+        fila = list(fila.values()) if isinstance(fila, dict) else fila
+        limites.extend(int(v) for v in fila if v is not None)
+    if not limites:
+        return [(None, None)]
+    cortes = list(range(min(limites) + tamano, max(limites) + 1, tamano))
+    return list(zip([None] + cortes, cortes + [None]))
+
+
+def _recontar_tramo_estadisticas(cursor, esq, desde, hasta):
+    # Una transaccion: bloquear las filas de email del tramo, borrar sus contadores y recontarlos.
+    empresa, tipo, norm = _sql_clave_email(esq, "e1")
+    col = f"e1.{esq['empresa']}"
+    condiciones, condiciones_mant, params = [], [], []
+    if desde is not None:
+        condiciones.append(f"{col} >= %s")
+        condiciones_mant.append("id_empresa >= %s")
+        params.append(desde)
+    if hasta is not None:
+        condiciones.append(f"{col} < %s")
+        condiciones_mant.append("id_empresa < %s")
+        params.append(hasta)
+    rango = " AND ".join(condiciones) or "1 = 1"
+    if esq["info"].get(esq["empresa"], {}).get("nula", True) and (desde is None or desde <= 0) and (
+        hasta is None or hasta > 0
+    ):
+        # id_empresa NULL cuenta como 0 en la clave: va en el tramo del 0.
+        rango = f"(({rango}) OR {col} IS NULL)"
+    rango_mant = " AND ".join(condiciones_mant) or "1 = 1"
+    invalid_list = ",".join(["%s"] * len(INVALID_EMAIL_VALUES))
+
+    # LOCK IN SHARE MODE (REPEATABLE READ): bloquea las filas y huecos del tramo hasta el commit.
+    cursor.execute(f"SELECT COUNT(*) FROM email e1 WHERE {rango} LOCK IN SHARE MODE", params)
+    cursor.fetchone()
+    cursor.execute(f"DELETE FROM mant_email_grupo WHERE {rango_mant}", params)
+    cursor.execute(f"DELETE FROM mant_email_invalido WHERE {rango_mant}", params)
+    cursor.execute(
+        f"""
+        INSERT INTO mant_email_grupo (id_empresa, tipo, email_norm, n)
+        SELECT {empresa}, {tipo}, {norm}, COUNT(*)
+        FROM email e1
+        WHERE ({rango})
+          AND e1.{esq["email"]} IS NOT NULL
+          AND {norm} NOT IN ({invalid_list})
+        GROUP BY {empresa}, {tipo}, {norm}
+        """,
+        params + list(INVALID_EMAIL_VALUES),
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO mant_email_invalido (id_empresa, tipo, n)
+        SELECT {empresa}, {tipo}, COUNT(*)
+        FROM email e1
+        WHERE ({rango})
+          AND (e1.{esq["email"]} IS NULL OR {norm} IN ({invalid_list}))
+        GROUP BY {empresa}, {tipo}
+        """,
+        params + list(INVALID_EMAIL_VALUES),
+    )
+
+
+def recalcular_estadisticas_emails(log_func=None):
+    """
+    Reconstruye mant_email_grupo y mant_email_invalido desde email (recuento completo), por
+    tramos de EMPRESAS_LOTE_ESTADISTICAS empresas en vez de con LOCK TABLES sobre todo email.
+    Cada tramo es una transaccion corta que lee sus filas de email con bloqueo compartido: una
+    alta/baja concurrente de ese tramo espera al commit y su trigger se aplica sobre el recuento
+    nuevo; las de otros tramos siguen. Nada queda fuera ni se cuenta dos veces.
+    """
+    log = log_func or (lambda msg: None)
+    conn = conectar_db()
+    cursor = conn.cursor()
+    try:
+        esq = _esquema_email_dedup(cursor)
+        _asegurar_tablas_estadisticas(cursor, esq)
+        conn.commit()
+        # Los bloqueos de huecos que hacen consistente cada tramo son los de REPEATABLE READ.
+        cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+
+        tramos = _tramos_empresas(cursor, esq, EMPRESAS_LOTE_ESTADISTICAS)
+        conn.commit()
+        log(f"Estadisticas: recontando grupos de email ({len(tramos)} tramos)...")
+        for desde, hasta in tramos:
+            try:
+                _recontar_tramo_estadisticas(cursor, esq, desde, hasta)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        stats = _conteos_estadisticas(cursor)
+        log(f"Estadisticas recalculadas: {stats}")
+        return stats
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def instalar_estadisticas_emails(log_func=None):
+    """
+    Estadisticas materializadas de limpieza de emails: tablas mant_email_grupo/mant_email_invalido
+    y triggers AFTER INSERT/UPDATE/DELETE en email que las mantienen fila a fila (cualquier
+    ingesta, fusion o borrado queda contado). Idempotente: recrea los triggers y recalcula.
+    Requiere privilegio TRIGGER (y log_bin_trust_function_creators si hay binlog sin SUPER).
+    """
+    log = log_func or (lambda msg: None)
+    conn = conectar_db()
+    cursor = conn.cursor()
+    try:
+        esq = _esquema_email_dedup(cursor)
+        _asegurar_tablas_estadisticas(cursor, esq)
+        trg_ai, trg_au, trg_ad = MANT_TRIGGERS_EMAIL
+        campos = [esq["email"], esq["empresa"]] + ([esq["tipo"]] if esq["tipo"] else [])
+        cambia = " OR ".join(f"NOT (OLD.{c} <=> NEW.{c})" for c in campos)
+        triggers = [
+            (trg_ai, "INSERT", _sql_trigger_alta(esq, "NEW")),
+            (trg_ad, "DELETE", _sql_trigger_baja(esq, "OLD")),
+            (
+                trg_au,
+                "UPDATE",
+                f"IF {cambia} THEN {_sql_trigger_baja(esq, 'OLD')} {_sql_trigger_alta(esq, 'NEW')} END IF;",
+            ),
+        ]
+        for nombre, evento, cuerpo in triggers:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+            cursor.execute(
+                f"""
+                CREATE TRIGGER {nombre} AFTER {evento} ON email
+                FOR EACH ROW
+                BEGIN
+                    {cuerpo}
+                END
+                """
+            )
+            log(f"Estadisticas: trigger {nombre} creado")
+        # Contadores globales de versiones anteriores: los triggers ya no los mantienen.
+        cursor.execute("DROP TABLE IF EXISTS mant_stats")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    return recalcular_estadisticas_emails(log_func=log_func)
+
+
+def verificar_estadisticas_emails(log_func=None):
+    """
+    Accion "verificar": recuento completo y comparacion con lo materializado.
+    Si no coinciden (o no hay estadisticas) se reconstruyen. Devuelve
+    {"materializado": dict|None, "recuento": dict, "coincide": bool}.
+    """
+    log = log_func or (lambda msg: None)
+    conn = conectar_db()
+    cursor = conn.cursor()
+    try:
+        materializado = _leer_estadisticas_emails(cursor)
+    finally:
+        cursor.close()
+        conn.close()
+
+    recuento = resumen_limpieza_emails(recontar=True)
+    coincide = materializado == recuento
+    if materializado is None:
+        log("Estadisticas: no instaladas, solo recuento completo.")
+    elif not coincide:
+        log(f"Estadisticas desfasadas ({materializado}); recalculando...")
+        recuento = recalcular_estadisticas_emails(log_func=log_func)
+    return {"materializado": materializado, "recuento": recuento, "coincide": coincide}
+
+
+def _preparar_tmp_emails_duplicados(cursor, esq, filtro_sql="", filtro_params=()):
+    """
+    Rellena la tabla temporal tmp_email_dup con las PK a borrar (todas menos la menor de cada grupo).
+    MySQL 8 / MariaDB 10.2+: ROW_NUMBER() OVER (PARTITION BY clave). Si no, PK "keeper" por grupo.
+    filtro_sql (opcional, sobre alias e1) acota las filas candidatas. Devuelve cuantas PK hay.
+    """
+    col_pk = esq["pk"]
+    clave = ", ".join(esq["clave"])
+    invalid_list = ",".join(["%s"] * len(INVALID_EMAIL_VALUES))
+    where = f"""
+        WHERE e1.{esq["email"]} IS NOT NULL
+          AND {esq["norm"]} NOT IN ({invalid_list})
+          {filtro_sql}
+    """
+    params = list(INVALID_EMAIL_VALUES) + list(filtro_params)
+
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_email_dup")
+    cursor.execute("CREATE TEMPORARY TABLE tmp_email_dup (pk INT NOT NULL PRIMARY KEY)")
+    if _soporta_window_functions(cursor):
+        cursor.execute(
+            f"""
+            INSERT INTO tmp_email_dup (pk)
+            SELECT t.pk
+            FROM (
+                SELECT e1.{col_pk} AS pk,
+                       ROW_NUMBER() OVER (PARTITION BY {clave} ORDER BY e1.{col_pk}) AS rn
+                FROM email e1
+                {where}
+            ) t
+            WHERE t.rn > 1
+            """,
+            params,
+        )
+    else:
+        # Keepers: MIN(pk) por grupo con duplicados; se borran las demas filas del grupo.
+        cols_k = [f"k.c{i}" for i in range(len(esq["clave"]))]
+        sel_k = ", ".join(f"{expr} AS c{i}" for i, expr in enumerate(esq["clave"]))
+        join_k = " AND ".join(f"{expr} = {ck}" for expr, ck in zip(esq["clave"], cols_k))
+        cursor.execute(
+            f"""
+            INSERT INTO tmp_email_dup (pk)
+            SELECT e1.{col_pk}
+            FROM email e1
+            JOIN (
+                SELECT {sel_k}, MIN(e1.{col_pk}) AS keeper
+                FROM email e1
+                {where}
+                GROUP BY {clave}
+                HAVING COUNT(*) > 1
+            ) k ON {join_k}
+            {where}
+              AND e1.{col_pk} > k.keeper
+            """,
+            params * 2,
+        )
+    cursor.execute("SELECT COUNT(*) FROM tmp_email_dup")
+    fila = cursor.fetchone()
+    return int((fila.get("COUNT(*)") if isinstance(fila, dict) else fila[0]) or 0)
+
+
+def _borrar_emails_tmp_por_lotes(conn, cursor, esq, total, tamano_lote, log, cancelar=None):
+    """
+    Borra de email las PK de tmp_email_dup en lotes con commit por lote (locks cortos).
+    """
+    borrados = 0
+    ultimo = 0
+    while True:
+        _comprobar_cancelacion(cancelar)
+        cursor.execute("SELECT pk FROM tmp_email_dup WHERE pk > %s ORDER BY pk LIMIT %s", (ultimo, int(tamano_lote)))
+        filas = cursor.fetchall()
+        if not filas:
+            break
+        pks = [f.get("pk") if isinstance(f, dict) else f[0] for f in filas]
+        ultimo = pks[-1]
+        formato = ",".join(["%s"] * len(pks))
+        cursor.execute(f"DELETE FROM email WHERE {esq['pk']} IN ({formato})", pks)
+        borrados += int(cursor.rowcount or 0)
+        conn.commit()
+        log(f"Dedup: {borrados}/{total} filas duplicadas eliminadas")
+    return borrados
+
+
+def deduplicar_emails(
+    aplicar=False, eliminar_invalidos=False, log_func=None, tamano_lote=DEDUP_CHUNK_SIZE, cancelar=None
+):
+    """
+    Deduplica emails conservando la menor PK por (email_normalizado, id_empresa, id_tipo_email si existe).
+    - aplicar=False: no borra, solo devuelve resumen.
+    - eliminar_invalidos=True: borra emails NULL o placeholders.
+    - Borra por lotes de tamano_lote con commit por lote; log_func recibe el progreso.
+    - cancelar (threading.Event): si se activa, para entre lotes con OperacionCancelada
+      (lo ya borrado queda confirmado).
+    """
+    log = log_func or (lambda msg: None)
+    stats_before = resumen_limpieza_emails()
+    if not aplicar and not eliminar_invalidos:
+        return stats_before
+
+    conn = conectar_db()
+    cursor = conn.cursor()
+    try:
+        esq = _esquema_email_dedup(cursor)
+        invalid_list = ",".join(["%s"] * len(INVALID_EMAIL_VALUES))
+
+        if eliminar_invalidos:
+            borrados_inv = 0
+            while True:
+                _comprobar_cancelacion(cancelar)
+                cursor.execute(
+                    f"""
+                    DELETE FROM email
+                    WHERE {esq["email"]} IS NULL
+                       OR {esq["norm_tabla"]} IN ({invalid_list})
+                    LIMIT %s
+                    """,
+                    list(INVALID_EMAIL_VALUES) + [int(tamano_lote)],
+                )
+                n = int(cursor.rowcount or 0)
+                conn.commit()
+                if n <= 0:
+                    break
+                borrados_inv += n
+                log(f"Invalidos: {borrados_inv} filas eliminadas")
+
+        if aplicar:
+            total = _preparar_tmp_emails_duplicados(cursor, esq)
+            log(f"Dedup: {total} filas duplicadas a eliminar")
+            _borrar_emails_tmp_por_lotes(conn, cursor, esq, total, tamano_lote, log, cancelar)
+            cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_email_dup")
+
+        conn.commit()
+        stats_after = resumen_limpieza_emails()
+        return {"before": stats_before, "after": stats_after}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _sql_empresas_sin_emails_validos(solo_sin_telefono=True):
+    invalid_list = ",".join(["%s"] * len(INVALID_EMAIL_VALUES))
+    sql = f"""
+        SELECT em.id_empresa, em.nombre, em.telefono, em.web
+        FROM empresa em
+        LEFT JOIN email e
+          ON e.id_empresa = em.id_empresa
+         AND e.email IS NOT NULL
+         AND LOWER(TRIM(e.email)) NOT IN ({invalid_list})
+        WHERE e.id_empresa IS NULL
+    """
+    params = list(INVALID_EMAIL_VALUES)
+
+    if solo_sin_telefono:
+        invalid_phone_list = ",".join(["%s"] * len(INVALID_PHONE_VALUES))
+        sql += f"""
+          AND (
+                em.telefono IS NULL
+             OR TRIM(em.telefono) = ''
+             OR LOWER(TRIM(em.telefono)) IN ({invalid_phone_list})
+          )
+        """
+        params.extend(INVALID_PHONE_VALUES)
+
+    sql += " ORDER BY em.nombre"
+    return sql, params
+
+
+def listar_empresas_sin_emails_validos(solo_sin_telefono=True):
+    """
+    Devuelve empresas que no tienen emails validos (tras filtrar placeholders).
+    Por seguridad, por defecto solo devuelve las que tambien estan sin telefono util.
+    """
+    conn = conectar_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        sql, params = _sql_empresas_sin_emails_validos(solo_sin_telefono)
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def iterar_empresas_sin_emails_validos(solo_sin_telefono=True, tamano_lote=EMPRESAS_LOTE_DEDUP):
+    """
+    Como listar_empresas_sin_emails_validos pero por lotes (fetchmany), para mostrar
+    resultados parciales mientras la consulta sigue devolviendo filas.
+    """
+    conn = conectar_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        sql, params = _sql_empresas_sin_emails_validos(solo_sin_telefono)
+        cursor.execute(sql, params)
+        while True:
+            filas = cursor.fetchmany(int(tamano_lote))
+            if not filas:
+                return
+            yield filas
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def eliminar_empresas(ids_empresas, log_func=None, tamano_lote=DEDUP_CHUNK_SIZE, cancelar=None):
+    """
+    Elimina empresas y sus dependencias basicas.
+    Seguridad: espera una lista de ids (no auto-selecciona).
+    Los ids se cargan una vez en una tabla temporal y cada tabla dependiente se borra con
+    DELETE ... JOIN por tramos de tamano_lote empresas (commit por tramo, progreso en log_func).
+    cancelar (threading.Event) detiene entre tramos; los tramos ya confirmados no se deshacen.
+    """
+    if not ids_empresas:
+        return {"deleted_empresas": 0}
+
+    log = log_func or (lambda msg: None)
+    conn = conectar_db()
+    cursor = conn.cursor()
+    try:
+        # Esquema: una sola consulta a information_schema por tabla, antes de empezar.
+        columnas_email = _obtener_columnas_tabla(cursor, "email")
+        col_pk_email = _primera_columna_existente(columnas_email, ["id_email", "id"])
+        col_empresa_en_email = _primera_columna_existente(columnas_email, ["id_empresa"])
+        hay_email_estado = _tabla_existe(cursor, "email_estado")
+        col_estado_id_email = col_estado_id_empresa = None
+        if _tabla_existe(cursor, "estado_email"):
+            columnas_estado = _obtener_columnas_tabla(cursor, "estado_email")
+            col_estado_id_email = _primera_columna_existente(columnas_estado, ["id_email"])
+            col_estado_id_empresa = _primera_columna_existente(columnas_estado, ["id_empresa"])
+        hay_busqueda_empresa = _tabla_existe(cursor, "busqueda_empresa")
+
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_borrar_empresa")
+        cursor.execute(
+            """
+            CREATE TEMPORARY TABLE tmp_borrar_empresa (
+                seq INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                id_empresa INT NOT NULL,
+                UNIQUE KEY (id_empresa)
+            )
+            """
+        )
+        ids_unicos = sorted({_id_empresa(i) for i in ids_empresas if i})
+        for chunk in _chunked(ids_unicos, 1000):
+            cursor.executemany("INSERT IGNORE INTO tmp_borrar_empresa (id_empresa) VALUES (%s)", [(i,) for i in chunk])
+        conn.commit()
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM tmp_borrar_empresa")
+        max_seq = int(cursor.fetchone()[0] or 0)
+
+        deletes = []
+        join_t = "JOIN tmp_borrar_empresa t ON t.id_empresa = {col} WHERE t.seq BETWEEN %s AND %s"
+        if col_pk_email and col_empresa_en_email:
+            # email_estado (si existe) referencia id_email
+            if hay_email_estado:
+                deletes.append(
+                    "DELETE ee FROM email_estado ee "
+                    f"JOIN email e ON e.{col_pk_email} = ee.id_email "
+                    + join_t.format(col=f"e.{col_empresa_en_email}")
+                )
+            # estado_email puede referenciar id_email o id_empresa, dependiendo del esquema
+            if col_estado_id_email:
+                deletes.append(
+                    "DELETE s FROM estado_email s "
+                    f"JOIN email e ON e.{col_pk_email} = s.{col_estado_id_email} "
+                    + join_t.format(col=f"e.{col_empresa_en_email}")
+                )
+        if col_estado_id_empresa:
+            deletes.append("DELETE s FROM estado_email s " + join_t.format(col=f"s.{col_estado_id_empresa}"))
+        if col_empresa_en_email:
+            deletes.append("DELETE e FROM email e " + join_t.format(col=f"e.{col_empresa_en_email}"))
+        if hay_busqueda_empresa:
+            deletes.append("DELETE be FROM busqueda_empresa be " + join_t.format(col="be.id_empresa"))
+        sql_empresa = "DELETE em FROM empresa em " + join_t.format(col="em.id_empresa")
+
+        deleted_empresas = 0
+        for desde in range(1, max_seq + 1, int(tamano_lote)):
+            _comprobar_cancelacion(cancelar)
+            hasta = desde + int(tamano_lote) - 1
+            for sql in deletes:
+                cursor.execute(sql, (desde, hasta))
+            cursor.execute(sql_empresa, (desde, hasta))
+            deleted_empresas += int(cursor.rowcount or 0)
+            conn.commit()
+            log(f"Eliminacion: {min(hasta, max_seq)}/{max_seq} empresas procesadas ({deleted_empresas} borradas)")
+
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_borrar_empresa")
+        return {"deleted_empresas": deleted_empresas}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def buscar_redundancias_email_nombre_empresa():
+    """
+    Busca casos donde el mismo email (normalizado) aparece asociado a empresas con el mismo nombre (normalizado),
+    pero con distinto id_empresa. Esto suele indicar empresas duplicadas.
+    Devuelve una lista de dicts con: email_norm, nombre_norm, ids_empresas (lista), ejemplo_email, ejemplo_nombre.
+    """
+    conn = conectar_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        invalid_list = ",".join(["%s"] * len(INVALID_EMAIL_VALUES))
+        norm_email = _email_norm_sql("e", "email", _obtener_columnas_tabla(cursor, "email"))
+        norm_nombre = _nombre_norm_sql("em", _obtener_columnas_tabla(cursor, "empresa"))
+        cursor.execute(
+            f"""
+            SELECT
+                {norm_email} AS email_norm,
+                {norm_nombre} AS nombre_norm,
+                GROUP_CONCAT(DISTINCT em.id_empresa ORDER BY em.id_empresa SEPARATOR ',') AS ids_empresas,
+                MIN(e.email) AS ejemplo_email,
+                MIN(em.nombre) AS ejemplo_nombre,
+                COUNT(DISTINCT em.id_empresa) AS n_empresas
+            FROM email e
+            JOIN empresa em ON em.id_empresa = e.id_empresa
+            WHERE e.email IS NOT NULL
+              AND {norm_email} NOT IN ({invalid_list})
+              AND em.nombre IS NOT NULL
+              AND {norm_nombre} <> ''
+            GROUP BY {norm_email}, {norm_nombre}
+            HAVING COUNT(DISTINCT em.id_empresa) > 1
+            ORDER BY n_empresas DESC, nombre_norm, email_norm
+            """,
+            INVALID_EMAIL_VALUES,
+        )
+        rows = cursor.fetchall() or []
+        out = []
+        for r in rows:
+            ids_raw = (r.get("ids_empresas") or "").strip()
+            ids = [x.strip() for x in ids_raw.split(",") if x.strip()]
+            out.append(
+                {
+                    "email_norm": r.get("email_norm") or "",
+                    "nombre_norm": r.get("nombre_norm") or "",
+                    "ids_empresas": ids,
+                    "ejemplo_email": r.get("ejemplo_email") or "",
+                    "ejemplo_nombre": r.get("ejemplo_nombre") or "",
+                }
+            )
+        return out
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def iterar_empresas_por_lotes(tamano_lote=EMPRESAS_LOTE_DEDUP, cancelar=None):
+    """
+    Generador de lotes de empresas (keyset por id_empresa) con los campos que usa
+    dedup_empresas: nombre, telefono, web, codigo_postal (si existen) y un email valido.
+    """
+    invalid_list = ",".join(["%s"] * len(INVALID_EMAIL_VALUES))
+    conn = conectar_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        columnas_empresa = _obtener_columnas_tabla(cursor, "empresa")
+        cols = [c for c in ["telefono", "web", "codigo_postal"] if c in columnas_empresa]
+        norm = _email_norm_sql("e", "email", _obtener_columnas_tabla(cursor, "email"))
+        select_cols = ", ".join(["em.id_empresa", "em.nombre"] + [f"em.{c}" for c in cols])
+        ultimo = 0
+        while True:
+            _comprobar_cancelacion(cancelar)
+            cursor.execute(
+                f"""
+                SELECT {select_cols},
+                       (SELECT MIN(e.email)
+                        FROM email e
+                        WHERE e.id_empresa = em.id_empresa
+                          AND e.email IS NOT NULL
+                          AND {norm} NOT IN ({invalid_list})) AS email
+                FROM empresa em
+                WHERE em.id_empresa > %s
+                ORDER BY em.id_empresa
+                LIMIT %s
+                """,
+                list(INVALID_EMAIL_VALUES) + [ultimo, int(tamano_lote)],
+            )
+            filas = cursor.fetchall()
+            if not filas:
+                return
+            ultimo = filas[-1]["id_empresa"]
+            yield filas
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def buscar_empresas_similares_db(umbral=None, log_func=None, cancelar=None):
+    """
+    Variante "fuzzy" de buscar_redundancias_email_nombre_empresa: recorre todas las empresas por lotes
+    y devuelve grupos candidatos a fusionar_empresas (ver dedup_empresas).
+    """
+    kwargs = {"log_func": log_func}
+    if umbral is not None:
+        kwargs["umbral"] = umbral
+    return dedup_empresas.buscar_empresas_similares(iterar_empresas_por_lotes(cancelar=cancelar), **kwargs)
+
+
+def _id_empresa(valor):
+    # Los grupos de redundancias traen ids como texto (GROUP_CONCAT); los normalizamos a int.
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return valor
+
+
+def _plan_fusion(grupos):
+    """
+    Convierte grupos (listas de ids o dicts con ids_empresas y prefer_id opcional) en un mapa
+    id_dup -> id_canonical. Los grupos que comparten empresas se unen (union-find).
+    Canonical: prefer_id si el grupo lo indica, si no el menor id_empresa.
+    """
+    uf = dedup_empresas.UnionFind()
+    preferidos = []
+    for g in grupos or []:
+        if isinstance(g, dict):
+            ids = g.get("ids_empresas") or []
+            prefer_id = g.get("prefer_id")
+        else:
+            ids, prefer_id = g, None
+        ids = [_id_empresa(i) for i in ids if i]
+        if len(ids) < 2:
+            continue
+        for i in ids[1:]:
+            uf.union(ids[0], i)
+        prefer_id = _id_empresa(prefer_id) if prefer_id else None
+        if prefer_id in ids:
+            preferidos.append(prefer_id)
+
+    componentes = {}
+    for i in list(uf.padre):
+        componentes.setdefault(uf.find(i), []).append(i)
+    canonical_de_raiz = {raiz: raiz for raiz in componentes}
+    for prefer_id in preferidos:
+        canonical_de_raiz[uf.find(prefer_id)] = prefer_id
+
+    mapa = {}
+    for raiz, ids in componentes.items():
+        canonical = canonical_de_raiz[raiz]
+        for i in ids:
+            if i != canonical:
+                mapa[i] = canonical
+    return mapa
+
+
+def _valor_util(col, valor):
+    if valor is None:
+        return False
+    texto = str(valor).strip()
+    if not texto:
+        return False
+    return not (col == "telefono" and texto.lower() in INVALID_PHONE_VALUES)
+
+
+def fusionar_grupos_empresas(grupos, log_func=None, tamano_lote=DEDUP_CHUNK_SIZE, cancelar=None):
+    """
+    Fusion masiva de grupos de empresas duplicadas en una sola transaccion:
+    - Tabla temporal tmp_fusion (id_dup -> id_canonical) y UPDATE/INSERT/DELETE con JOIN sobre ella.
+    - Completa campos vacios de cada canonical con el primer duplicado que los tenga.
+    - Al final deduplica solo los emails de las empresas canonical afectadas.
+    Si cancelar (threading.Event) se activa antes del commit, la fusion se deshace entera.
+    """
+    log = log_func or (lambda msg: None)
+    mapa = _plan_fusion(grupos)
+    if not mapa:
+        return {"merged": 0, "canonicals": [], "emails_deduplicados": 0}
+    canonicals = sorted(set(mapa.values()))
+    log(f"Fusion: {len(mapa)} duplicadas -> {len(canonicals)} empresas canonical")
+
+    conn = conectar_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_fusion")
+        cursor.execute(
+            """
+            CREATE TEMPORARY TABLE tmp_fusion (
+                id_dup INT NOT NULL PRIMARY KEY,
+                id_canonical INT NOT NULL,
+                KEY (id_canonical)
+            )
+            """
+        )
+        pares = sorted(mapa.items())
+        for chunk in _chunked(pares, 1000):
+            cursor.executemany("INSERT INTO tmp_fusion (id_dup, id_canonical) VALUES (%s, %s)", chunk)
+
+        # Completar campos de empresa canonical si estan vacios.
+        columnas_empresa = _obtener_columnas_tabla(cursor, "empresa")
+        candidate_cols = ["telefono", "web", "direccion", "codigo_postal", "localidad"]
+        cols = [c for c in candidate_cols if c in columnas_empresa]
+        if cols:
+            cursor.execute(
+                f"""
+                SELECT m.id_canonical, m.id_dup,
+                       {", ".join(f"c.{c} AS can_{c}" for c in cols)},
+                       {", ".join(f"d.{c} AS dup_{c}" for c in cols)}
+                FROM tmp_fusion m
+                JOIN empresa c ON c.id_empresa = m.id_canonical
+                JOIN empresa d ON d.id_empresa = m.id_dup
+                ORDER BY m.id_canonical, m.id_dup
+                """
+            )
+            updates = {}
+            for r in cursor.fetchall() or []:
+                can = r["id_canonical"]
+                for col in cols:
+                    can_val = r.get(f"can_{col}")
+                    can_ok = (
+                        can_val is not None
+                        and str(can_val).strip() != ""
+                        and str(can_val).strip().lower() not in INVALID_PHONE_VALUES
+                    )
+                    if can_ok or col in updates.get(can, {}):
+                        continue
+                    dv = r.get(f"dup_{col}")
+                    if _valor_util(col, dv):
+                        updates.setdefault(can, {})[col] = dv
+            for can, valores in updates.items():
+                set_sql = ", ".join([f"{k}=%s" for k in valores.keys()])
+                cursor.execute(f"UPDATE empresa SET {set_sql} WHERE id_empresa=%s", list(valores.values()) + [can])
+            log(f"Fusion: {len(updates)} empresas canonical completadas con datos de duplicadas")
+
+        # email -> canonical
+        cursor.execute(
+            """
+            UPDATE email e
+            JOIN tmp_fusion m ON m.id_dup = e.id_empresa
+            SET e.id_empresa = m.id_canonical
+            """
+        )
+        log(f"Fusion: {int(cursor.rowcount or 0)} emails movidos")
+
+        # busqueda_empresa -> canonical (insert missing then delete duplicates rows)
+        if _tabla_existe(cursor, "busqueda_empresa"):
+            cursor.execute(
+                """
+                INSERT IGNORE INTO busqueda_empresa (id_busqueda, id_empresa)
+                SELECT be.id_busqueda, m.id_canonical
+                FROM busqueda_empresa be
+                JOIN tmp_fusion m ON m.id_dup = be.id_empresa
+                """
+            )
+            cursor.execute(
+                """
+                DELETE be
+                FROM busqueda_empresa be
+                JOIN tmp_fusion m ON m.id_dup = be.id_empresa
+                """
+            )
+
+        # estado_email puede tener id_empresa
+        if _tabla_existe(cursor, "estado_email"):
+            columnas_estado = _obtener_columnas_tabla(cursor, "estado_email")
+            col_id_empresa = _primera_columna_existente(columnas_estado, ["id_empresa"])
+            if col_id_empresa:
+                cursor.execute(
+                    f"""
+                    UPDATE estado_email s
+                    JOIN tmp_fusion m ON m.id_dup = s.{col_id_empresa}
+                    SET s.{col_id_empresa} = m.id_canonical
+                    """
+                )
+
+        # Eliminar empresas duplicadas.
+        cursor.execute(
+            """
+            DELETE em
+            FROM empresa em
+            JOIN tmp_fusion m ON m.id_dup = em.id_empresa
+            """
+        )
+        deleted = int(cursor.rowcount or 0)
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_fusion")
+        if cancelar is not None and cancelar.is_set():
+            conn.rollback()
+            raise OperacionCancelada()
+        conn.commit()
+        log(f"Fusion: {deleted} empresas duplicadas eliminadas")
+
+        # Deduplicar emails solo de las empresas canonical (por si colisionan tras el merge).
+        cursor_dedup = conn.cursor()
+        try:
+            esq = _esquema_email_dedup(cursor_dedup)
+            emails_dedup = 0
+            for chunk in _chunked(canonicals, 1000):
+                formato = ",".join(["%s"] * len(chunk))
+                total = _preparar_tmp_emails_duplicados(
+                    cursor_dedup, esq, f"AND e1.{esq['empresa']} IN ({formato})", chunk
+                )
+                emails_dedup += _borrar_emails_tmp_por_lotes(
+                    conn, cursor_dedup, esq, total, tamano_lote, log, cancelar
+                )
+            cursor_dedup.execute("DROP TEMPORARY TABLE IF EXISTS tmp_email_dup")
+        finally:
+            cursor_dedup.close()
+
+        return {"merged": deleted, "canonicals": canonicals, "emails_deduplicados": emails_dedup}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def fusionar_empresas(ids_empresas, prefer_id=None):
+    """
+    Consolida varias empresas en una:
+    - Mueve emails / busqueda_empresa / estado_email a la empresa canonical.
+    - Intenta completar campos vacios en empresa canonical con datos de duplicadas.
+    - Elimina empresas duplicadas al final.
+    Atajo de fusionar_grupos_empresas para un solo grupo.
+    """
+    ids_empresas = [i for i in (ids_empresas or []) if i]
+    if len(ids_empresas) < 2:
+        return {"merged": 0}
+
+    res = fusionar_grupos_empresas([{"ids_empresas": ids_empresas, "prefer_id": prefer_id}])
+    canonical = res["canonicals"][0] if res["canonicals"] else None
+    return {"merged": res["merged"], "canonical": canonical, "duplicates_deleted": res["merged"]}
+
+def _obtener_columnas_tabla(cursor, nombre_tabla):
+    cursor.execute(
+        """
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = %s
+        """,
+        (DB_CONFIG["database"], nombre_tabla),
+    )
+    columnas = set()
+    for fila in cursor.fetchall():
+        if isinstance(fila, dict):
+            nombre_columna = (
+                fila.get("column_name")
+                or fila.get("COLUMN_NAME")
+                or fila.get("Column_name")
+            )
+            if nombre_columna:
+                columnas.add(nombre_columna)
+        elif fila:
+            columnas.add(fila[0])
+    return columnas
+
+
+def _info_columnas(cursor, nombre_tabla):
+    """{columna: {"tipo", "longitud", "nula"}} segun information_schema.columns."""
+    cursor.execute(
+        """
+        SELECT column_name, data_type, character_maximum_length, is_nullable
+        FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = %s
+        """,
+        (DB_CONFIG["database"], nombre_tabla),
+    )
+    info = {}
+    for fila in cursor.fetchall():
+        if isinstance(fila, dict):
+            fila = {k.lower(): v for k, v in fila.items()}
+            fila = (
+                fila.get("column_name"),
+                fila.get("data_type"),
+                fila.get("character_maximum_length"),
+                fila.get("is_nullable"),
+            )
+        nombre, tipo, longitud, nula = fila
+        info[nombre] = {
+            "tipo": str(tipo or "").lower(),
+            "longitud": int(longitud) if longitud else None,
+            "nula": str(nula or "").upper() == "YES",
+        }
+    return info
+
+
+def _longitud_texto(info_columna):
+    # Longitud de una columna CHAR/VARCHAR; None si es de otro tipo (TEXT...) o no existe.
+    if not info_columna or info_columna["tipo"] not in ("char", "varchar"):
+        return None
+    return info_columna["longitud"]
+
+
+def _longitud_columna_texto(cursor, nombre_tabla, nombre_columna):
+    """Longitud de una columna CHAR/VARCHAR segun information_schema; None si es de otro tipo (TEXT...)."""
+    return _longitud_texto(_info_columnas(cursor, nombre_tabla).get(nombre_columna))
+
+
+def _tabla_tiene_columna(cursor, nombre_tabla, nombre_columna):
+    return nombre_columna in _obtener_columnas_tabla(cursor, nombre_tabla)
+
+
+def _tabla_existe(cursor, nombre_tabla):
+    cursor.execute(
+        """
+        SELECT 1
+        FROM information_schema.tables
+        WHERE table_schema = %s AND table_name = %s
+        """,
+        (DB_CONFIG["database"], nombre_tabla),
+    )
+    return cursor.fetchone() is not None
+
+
+def _primera_columna_existente(columnas, candidatas):
+    for candidata in candidatas:
+        if candidata in columnas:
+            return candidata
+    return None
+
+
+def _asegurar_tabla_email_estado(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS email_estado (
+            id_email INT NOT NULL,
+            id_estado VARCHAR(2) NOT NULL,
+            fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (id_email)
+        )
+        """
+    )
+
+
+def actualizar_estado_email(registro, id_estado):
+    conn = conectar_db()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        columnas_email = _obtener_columnas_tabla(cursor, "email")
+        columna_estado_en_email = _primera_columna_existente(
+            columnas_email, ["id_estado", "id_estado_email", "estado_email", "estado"]
+        )
+        columna_pk_email = _primera_columna_existente(columnas_email, ["id_email"])
+        columna_email_texto = _primera_columna_existente(columnas_email, ["email"])
+
+        if columna_estado_en_email and columna_pk_email and registro.get("id_email"):
+            cursor.execute(
+                f"UPDATE email SET {columna_estado_en_email} = %s WHERE {columna_pk_email} = %s",
+                (id_estado, registro["id_email"]),
+            )
+            conn.commit()
+            return
+
+        if columna_estado_en_email and columna_email_texto and registro.get("email"):
+            cursor.execute(
+                f"UPDATE email SET {columna_estado_en_email} = %s WHERE {columna_email_texto} = %s",
+                (id_estado, registro["email"]),
+            )
+            conn.commit()
+            return
+
+        columnas_estado = _obtener_columnas_tabla(cursor, "estado_email")
+        columna_estado = _primera_columna_existente(
+            columnas_estado, ["id_estado", "id_estado_email", "estado_email", "estado"]
+        )
+        columna_ref_id_email = _primera_columna_existente(columnas_estado, ["id_email"])
+        columna_ref_email = _primera_columna_existente(columnas_estado, ["email"])
+        columna_ref_empresa = _primera_columna_existente(columnas_estado, ["id_empresa"])
+
+        if columna_ref_id_email and columna_estado and registro.get("id_email"):
+            cursor.execute(
+                f"SELECT 1 FROM estado_email WHERE {columna_ref_id_email} = %s",
+                (registro["id_email"],),
+            )
+            existe = cursor.fetchone() is not None
+            if existe:
+                cursor.execute(
+                    f"UPDATE estado_email SET {columna_estado} = %s WHERE {columna_ref_id_email} = %s",
+                    (id_estado, registro["id_email"]),
+                )
+            else:
+                cursor.execute(
+                    f"INSERT INTO estado_email ({columna_ref_id_email}, {columna_estado}) VALUES (%s, %s)",
+                    (registro["id_email"], id_estado),
+                )
+            conn.commit()
+            return
+
+        if columna_ref_email and columna_estado and registro.get("email"):
+            cursor.execute(
+                f"SELECT 1 FROM estado_email WHERE {columna_ref_email} = %s",
+                (registro["email"],),
+            )
+            existe = cursor.fetchone() is not None
+            if existe:
+                cursor.execute(
+                    f"UPDATE estado_email SET {columna_estado} = %s WHERE {columna_ref_email} = %s",
+                    (id_estado, registro["email"]),
+                )
+            else:
+                if columna_ref_empresa and registro.get("id_empresa"):
+                    cursor.execute(
+                        f"INSERT INTO estado_email ({columna_ref_email}, {columna_ref_empresa}, {columna_estado}) VALUES (%s, %s, %s)",
+                        (registro["email"], registro["id_empresa"], id_estado),
+                    )
+                else:
+                    cursor.execute(
+                        f"INSERT INTO estado_email ({columna_ref_email}, {columna_estado}) VALUES (%s, %s)",
+                        (registro["email"], id_estado),
+                    )
+            conn.commit()
+            return
+
+        if columna_estado and "descripcion" in columnas_estado:
+            _asegurar_tabla_email_estado(cursor)
+            id_email = registro.get("id_email")
+            if not id_email and registro.get("email"):
+                cursor.execute(
+                    "SELECT id_email FROM email WHERE email = %s LIMIT 1",
+                    (registro["email"],),
+                )
+                fila_id = cursor.fetchone()
+                id_email = fila_id.get("id_email") if fila_id else None
+
+            if not id_email:
+                raise RuntimeError("No se encontró id_email para actualizar estado.")
+
+            cursor.execute(
+                """
+                INSERT INTO email_estado (id_email, id_estado)
+                VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE id_estado = VALUES(id_estado)
+                """,
+                (id_email, id_estado),
+            )
+            conn.commit()
+            return
+
+        raise RuntimeError(
+            "No se pudo mapear el esquema para guardar el estado de email. "
+            f"Columnas email={sorted(columnas_email)} | estado_email={sorted(columnas_estado)}"
+        )
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def obtener_estados_email():
+    conn = conectar_db()
+    cursor = conn.cursor(dictionary=True)
+    resultados = []
+
+    try:
+        columnas_email = _obtener_columnas_tabla(cursor, "email")
+        columna_estado_en_email = _primera_columna_existente(
+            columnas_email, ["id_estado", "id_estado_email", "estado_email", "estado"]
+        )
+        columnas_estado = _obtener_columnas_tabla(cursor, "estado_email")
+        columna_estado = _primera_columna_existente(
+            columnas_estado, ["id_estado", "id_estado_email", "estado_email", "estado"]
+        )
+        columna_ref_id_email = _primera_columna_existente(columnas_estado, ["id_email"])
+        columna_ref_email = _primera_columna_existente(columnas_estado, ["email"])
+
+        if columna_estado_en_email:
+            cursor.execute(
+                f"""
+                SELECT em.nombre, e.email, e.{columna_estado_en_email} AS id_estado,
+                       COALESCE(ee.descripcion, '') AS descripcion
+                FROM email e
+                JOIN empresa em ON em.id_empresa = e.id_empresa
+                LEFT JOIN estado_email ee ON ee.id_estado = e.{columna_estado_en_email}
+                ORDER BY em.nombre, e.email
+                """
+            )
+            for fila in cursor.fetchall():
+                id_estado = fila.get("id_estado")
+                resultados.append(
+                    {
+                        "nombre": fila.get("nombre", ""),
+                        "email": fila.get("email", ""),
+                        "id_estado": id_estado or "",
+                        "descripcion": fila.get("descripcion", "")
+                        or ESTADOS_DESCRIPCION.get(id_estado, ""),
+                    }
+                )
+            return resultados
+
+        if _tabla_existe(cursor, "email_estado"):
+            cursor.execute(
+                """
+                SELECT em.nombre, e.email, ee.id_estado, COALESCE(es.descripcion, '') AS descripcion
+                FROM email_estado ee
+                JOIN email e ON e.id_email = ee.id_email
+                JOIN empresa em ON em.id_empresa = e.id_empresa
+                LEFT JOIN estado_email es ON es.id_estado = ee.id_estado
+                ORDER BY em.nombre, e.email
+                """
+            )
+            for fila in cursor.fetchall():
+                id_estado = fila.get("id_estado")
+                resultados.append(
+                    {
+                        "nombre": fila.get("nombre", ""),
+                        "email": fila.get("email", ""),
+                        "id_estado": id_estado or "",
+                        "descripcion": fila.get("descripcion", "")
+                        or ESTADOS_DESCRIPCION.get(id_estado, ""),
+                    }
+                )
+            return resultados
+
+        if columna_ref_id_email and columna_estado:
+            cursor.execute(
+                f"""
+                SELECT em.nombre, e.email, ee.{columna_estado} AS id_estado
+                FROM estado_email ee
+                JOIN email e ON e.id_email = ee.{columna_ref_id_email}
+                JOIN empresa em ON em.id_empresa = e.id_empresa
+                ORDER BY em.nombre, e.email
+                """
+            )
+            for fila in cursor.fetchall():
+                id_estado = fila.get("id_estado")
+                resultados.append(
+                    {
+                        "nombre": fila.get("nombre", ""),
+                        "email": fila.get("email", ""),
+                        "id_estado": id_estado or "",
+                        "descripcion": ESTADOS_DESCRIPCION.get(id_estado, ""),
+                    }
+                )
+            return resultados
+
+        if columna_ref_email and columna_estado:
+            cursor.execute(
+                f"""
+                SELECT COALESCE(em.nombre, '') AS nombre, ee.{columna_ref_email} AS email, ee.{columna_estado} AS id_estado
+                FROM estado_email ee
+                LEFT JOIN email e ON e.email = ee.{columna_ref_email}
+                LEFT JOIN empresa em ON em.id_empresa = e.id_empresa
+                ORDER BY ee.{columna_ref_email}
+                """
+            )
+            for fila in cursor.fetchall():
+                id_estado = fila.get("id_estado")
+                resultados.append(
+                    {
+                        "nombre": fila.get("nombre", ""),
+                        "email": fila.get("email", ""),
+                        "id_estado": id_estado or "",
+                        "descripcion": ESTADOS_DESCRIPCION.get(id_estado, ""),
+                    }
+                )
+            return resultados
+
+        raise RuntimeError(
+            "No se pudo mapear el esquema para consultar estados de email. "
+            f"Columnas email={sorted(columnas_email)} | estado_email={sorted(columnas_estado)}"
+        )
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# ---------------- EMAIL ----------------
+def enviar_email(destinatario, asunto, cuerpo_html):
+    import smtplib
+    import ssl
+    from email.message import EmailMessage
+
+    if not SMTP_USER or not SMTP_PASS:
+        raise RuntimeError("SMTP_USER/SMTP_PASS no configurados en .env")
+
+    msg = EmailMessage()
+    msg["From"] = SMTP_USER
+    msg["To"] = destinatario
+    msg["Subject"] = asunto
+    msg.set_content("Tu cliente de email no soporta HTML")
+    msg.add_alternative(cuerpo_html, subtype="html")
+
+    context = ssl.create_default_context()
+
+    # Gmail tipicamente: 587 (STARTTLS) o 465 (SSL directo).
+    if int(SMTP_PORT) == 465:
+        with smtplib.SMTP_SSL(SMTP_SERVER, int(SMTP_PORT), context=context, timeout=25) as server:
+            server.login(SMTP_USER, SMTP_PASS)
+            server.send_message(msg)
+    else:
+        with smtplib.SMTP(SMTP_SERVER, int(SMTP_PORT), timeout=25) as server:
+            server.ehlo()
+            server.starttls(context=context)
+            server.ehlo()
+            server.login(SMTP_USER, SMTP_PASS)
+            server.send_message(msg)
+
+
+def _atomic_write_json(path, payload):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    tmp.replace(path)
+
+
+def _load_warmup_state():
+    if not WARMUP_STATE_PATH.exists():
+        return {
+            "start_date": None,  # YYYY-MM-DD
+            "sent_by_date": {},  # YYYY-MM-DD -> int
+            "sent_timestamps": [],  # unix seconds (for hourly cap)
+        }
+    try:
+        with open(WARMUP_STATE_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f) or {}
+        data.setdefault("start_date", None)
+        data.setdefault("sent_by_date", {})
+        data.setdefault("sent_timestamps", [])
+        return data
+    except Exception:
+        # Si el archivo se corrompe, no bloqueamos el envío, pero empezamos limpio.
+        return {
+            "start_date": None,
+            "sent_by_date": {},
+            "sent_timestamps": [],
+        }
+
+
+def _save_warmup_state(state):
+    _atomic_write_json(WARMUP_STATE_PATH, state)
+
+
+def _load_recontact_state():
+    if not RECONTACT_STATE_PATH.exists():
+        return {"last_reset_month": None}
+    try:
+        with open(RECONTACT_STATE_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f) or {}
+        data.setdefault("last_reset_month", None)
+        return data
+    except Exception:
+        return {"last_reset_month": None}
+
+
+def _save_recontact_state(state):
+    _atomic_write_json(RECONTACT_STATE_PATH, state)
+
+
+def _reset_estados_enviados_a_pendiente():
+    """
+    Intenta resetear estados EN -> PE en los posibles esquemas soportados.
+    """
+    conn = conectar_db()
+    cursor = conn.cursor(dictionary=True)
+    total = 0
+    try:
+        columnas_email = _obtener_columnas_tabla(cursor, "email")
+        col_estado_email = _primera_columna_existente(
+            columnas_email, ["id_estado", "id_estado_email", "estado_email", "estado"]
+        )
+        if col_estado_email:
+            cursor.execute(
+                f"UPDATE email SET {col_estado_email} = %s WHERE {col_estado_email} = %s",
+                ("PE", "EN"),
+            )
+            total += int(cursor.rowcount or 0)
+
+        if _tabla_existe(cursor, "email_estado"):
+            cursor.execute("UPDATE email_estado SET id_estado = %s WHERE id_estado = %s", ("PE", "EN"))
+            total += int(cursor.rowcount or 0)
+
+        if _tabla_existe(cursor, "estado_email"):
+            columnas_estado = _obtener_columnas_tabla(cursor, "estado_email")
+            col_estado = _primera_columna_existente(
+                columnas_estado, ["id_estado", "id_estado_email", "estado_email", "estado"]
+            )
+            # Si hay columna descripcion, tratamos estado_email como catalogo y no lo tocamos.
+            if col_estado and "descripcion" not in columnas_estado:
+                cursor.execute(
+                    f"UPDATE estado_email SET {col_estado} = %s WHERE {col_estado} = %s",
+                    ("PE", "EN"),
+                )
+                total += int(cursor.rowcount or 0)
+
+        conn.commit()
+        return total
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def reactivar_enviados_si_nuevo_mes():
+    """
+    Si cambia el mes (YYYY-MM), reactiva los emails enviados para recontacto.
+    """
+    state = _load_recontact_state()
+    mes_actual = dt.date.today().strftime("%Y-%m")
+    ultimo_mes = state.get("last_reset_month")
+
+    if ultimo_mes == mes_actual:
+        return {"performed": False, "month": mes_actual, "updated": 0}
+
+    updated = _reset_estados_enviados_a_pendiente()
+    state["last_reset_month"] = mes_actual
+    _save_recontact_state(state)
+    return {"performed": True, "month": mes_actual, "updated": updated}
+
+
+def _warmup_limits(state):
+    hoy = dt.date.today().isoformat()
+    if not state.get("start_date"):
+        state["start_date"] = hoy
+
+    try:
+        start = dt.date.fromisoformat(state["start_date"])
+    except Exception:
+        start = dt.date.today()
+        state["start_date"] = start.isoformat()
+
+    dias = max(0, (dt.date.today() - start).days)
+    idx = min(dias, len(WARMUP_DAILY_SCHEDULE) - 1)
+    limite_diario = WARMUP_DAILY_SCHEDULE[idx]
+    enviados_hoy = int(state.get("sent_by_date", {}).get(hoy, 0) or 0)
+    restante_hoy = max(0, limite_diario - enviados_hoy)
+    return {
+        "date": hoy,
+        "days_since_start": dias,
+        "daily_limit": limite_diario,
+        "sent_today": enviados_hoy,
+        "remaining_today": restante_hoy,
+        "hourly_limit": WARMUP_HOURLY_LIMIT,
+    }
+
+
+def _warmup_can_send_more_now(state):
+    """
+    Devuelve (ok, wait_seconds, sent_last_hour_count).
+    """
+    now = time.time()
+    one_hour_ago = now - 3600
+    stamps = [s for s in (state.get("sent_timestamps") or []) if isinstance(s, (int, float)) and s >= one_hour_ago]
+    state["sent_timestamps"] = stamps
+    if len(stamps) < WARMUP_HOURLY_LIMIT:
+        return True, 0.0, len(stamps)
+
+    oldest = min(stamps) if stamps else now
+    wait = max(5.0, (oldest + 3600) - now)
+    return False, wait, len(stamps)
+
+
+def _warmup_mark_sent(state):
+    hoy = dt.date.today().isoformat()
+    state.setdefault("sent_by_date", {})
+    state["sent_by_date"][hoy] = int(state["sent_by_date"].get(hoy, 0) or 0) + 1
+    state.setdefault("sent_timestamps", [])
+    state["sent_timestamps"].append(time.time())
+    # recorta histórico
+    if len(state["sent_timestamps"]) > 5000:
+        state["sent_timestamps"] = state["sent_timestamps"][-2000:]
+
+
+def limpiar_valor(valor, fallback):
+    if not valor:
+        return fallback
+    valor_str = str(valor).strip().lower()
+    if valor_str in ("none", "null", "no disponible", "", "desconocida", "desconocido"):
+        return fallback
+    return str(valor).strip()
+
+
+def generar_saludo(nombre_empresa):
+    nombre_limpio = limpiar_valor(nombre_empresa, "")
+    if not nombre_limpio:
+        return "Estimado equipo,"
+    return f"Estimado equipo de {nombre_limpio},"
+
+
+def _format_template_safe(template, **kwargs):
+    """
+    Formatea plantillas tipo str.format sin romper si faltan claves.
+    """
+    try:
+        return str(template).format(**kwargs)
+    except KeyError:
+        return str(template)
+    except Exception:
+        return str(template)
+
+
+def filtrar_destinatarios_unicos(registros):
+    # Evitar enviar al mismo email mas de una vez (normalizado).
+    unicos = []
+    vistos = set()
+    for r in registros:
+        email_norm = (r.get("email") or "").strip().lower()
+        if not email_norm or email_norm in INVALID_EMAIL_VALUES:
+            continue
+        if email_norm in vistos:
+            continue
+        vistos.add(email_norm)
+        unicos.append(r)
+    return unicos
+
+
+def enviar_emails_lote(
+    registros, asunto_base, cuerpo_base, warmup_enabled=True, log_func=None, on_limites=None, cancelar=None
+):
+    """
+    Envia a cada registro (filas de iterar_emails_empresas) marcando estados PE -> EN/ER.
+    - warmup_enabled: respeta limite diario, limite por hora y delays WARMUP_*.
+    - on_limites(limits): limites de warm-up al empezar (None si esta desactivado).
+    - cancelar (threading.Event): detiene el envio entre emails (tambien corta los delays).
+    Devuelve {"enviados": int, "errores": [str]}.
+    """
+    log = log_func or (lambda msg: None)
+    errores = []
+    enviados = 0
+
+    state = _load_warmup_state()
+    limits = _warmup_limits(state)
+    _save_warmup_state(state)
+    if on_limites:
+        on_limites(limits if warmup_enabled else None)
+
+    def _esperar(segundos):
+        if cancelar is not None:
+            cancelar.wait(segundos)
+        else:
+            time.sleep(segundos)
+
+    for registro in registros:
+        if cancelar is not None and cancelar.is_set():
+            log("Envio cancelado.")
+            break
+
+        if warmup_enabled:
+            state = _load_warmup_state()
+            limits = _warmup_limits(state)
+            if limits["remaining_today"] <= 0:
+                log("Warm-up: limite diario alcanzado. Deteniendo envio para proteger reputacion.")
+                _save_warmup_state(state)
+                break
+
+            ok, wait_s, sent_last_hour = _warmup_can_send_more_now(state)
+            if not ok:
+                log(
+                    f"Warm-up: limite por hora alcanzado ({sent_last_hour}/{WARMUP_HOURLY_LIMIT}). "
+                    f"Deteniendo envio (reanuda en ~{wait_s/60:.0f} min)."
+                )
+                _save_warmup_state(state)
+                break
+
+        email = registro["email"]
+        nombre_empresa = limpiar_valor(registro.get("nombre"), "")
+        # Si no hay nombre, usamos un texto neutro para no dejar frases raras.
+        empresa_para_template = nombre_empresa if nombre_empresa else "vuestra empresa"
+        empresa_para_asunto = nombre_empresa if nombre_empresa else "su empresa"
+
+        tipo_empresa = limpiar_valor(registro.get("tipo_empresa"), "empresa")
+        localidad = limpiar_valor(registro.get("localidad"), "Madrid")
+        saludo = generar_saludo(nombre_empresa)
+
+        try:
+            try:
+                actualizar_estado_email(registro, "PE")
+            except Exception as exc_estado_pe:
+                errores.append(f"{email}: no se pudo marcar estado PE ({exc_estado_pe})")
+
+            cuerpo_personalizado = cuerpo_base.format(
+                empresa=empresa_para_template,
+                tipo_empresa=tipo_empresa,
+                localidad=localidad,
+                saludo=saludo,
+            )
+            asunto_personalizado = _format_template_safe(
+                asunto_base,
+                empresa=empresa_para_asunto,
+                tipo_empresa=tipo_empresa,
+                localidad=localidad,
+            )
+            enviar_email(email, asunto_personalizado, cuerpo_personalizado)
+            enviados += 1
+            log(f"ENVIADO: {email}")
+
+            if warmup_enabled:
+                state = _load_warmup_state()
+                _warmup_mark_sent(state)
+                _save_warmup_state(state)
+
+            try:
+                actualizar_estado_email(registro, "EN")
+            except Exception as exc_estado_en:
+                errores.append(f"{email}: email enviado, pero no se pudo marcar EN ({exc_estado_en})")
+        except Exception as exc:
+            try:
+                actualizar_estado_email(registro, "ER")
+            except Exception as exc_estado_er:
+                errores.append(f"{email}: error de envio y no se pudo marcar ER ({exc_estado_er})")
+            errores.append(f"{email}: {exc}")
+            log(f"ERROR: {email}: {exc}")
+
+        if warmup_enabled:
+            if enviados > 0 and enviados % WARMUP_LONG_PAUSE_EVERY == 0:
+                pausa = random.uniform(*WARMUP_LONG_PAUSE_SECONDS)
+                log(f"Pausa larga warm-up: {pausa:.0f}s")
+                _esperar(pausa)
+            else:
+                delay = random.uniform(*WARMUP_DELAY_BETWEEN_EMAILS_SECONDS)
+                log(f"Delay warm-up: {delay:.0f}s")
+                _esperar(delay)
+
+    return {"enviados": enviados, "errores": errores}
+
+
+# ---------------- TRABAJOS ----------------
+# Hilos fijos para los trabajos de Mantenimiento; los que escriben en BD comparten RECURSO_BD.
+TRABAJOS_HILOS = 2
+RECURSO_BD = "bd"
+ESPERA_LOCK_SECONDS = 0.5
+
+
+class Trabajo:
+    """
+    Trabajo encolado en EjecutorTrabajos. fn(trabajo) puede usar:
+    - trabajo.progreso(msg): linea de log en el hilo de la GUI
+    - trabajo.parcial(datos): resultados parciales (on_parcial en el hilo de la GUI)
+    - trabajo.cancelado: threading.Event para pasar como cancelar= a las funciones de BD
+    """
+
+    def __init__(self, ejecutor, nombre, fn, on_done=None, on_parcial=None, recursos=()):
+        self.nombre = nombre
+        self.fn = fn
+        self.on_done = on_done
+        self.on_parcial = on_parcial
+        self.recursos = tuple(sorted(set(recursos or ())))
+        self.cancelado = threading.Event()
+        self.estado = "en cola"
+        self._ejecutor = ejecutor
+
+    def cancelar(self):
+        self.cancelado.set()
+
+    def progreso(self, msg):
+        self._ejecutor._despachar(self._ejecutor.log_func, f"[{self.nombre}] {msg}")
+
+    def parcial(self, datos):
+        _comprobar_cancelacion(self.cancelado)
+        if self.on_parcial:
+            self._ejecutor._despachar(self.on_parcial, datos)
+
+
+class EjecutorTrabajos:
+    """
+    Pool fijo de hilos + cola. despachar(fn, *args) debe ejecutar fn en el hilo de la GUI
+    (p.ej. root.after(0, fn, *args)); on_done(res, err), on_parcial y on_cambio se llaman por ahi.
+    Trabajos con algun recurso en comun se ejecutan de uno en uno (locks en orden fijo).
+    """
+
+    def __init__(self, despachar, n_hilos=TRABAJOS_HILOS, log_func=None, on_cambio=None):
+        self._despachar = despachar
+        self.log_func = log_func or (lambda msg: None)
+        self.on_cambio = on_cambio
+        self._cola = queue.Queue()
+        self._mutex = threading.Lock()
+        self._locks = {}
+        self._trabajos = []
+        for i in range(int(n_hilos)):
+            threading.Thread(target=self._bucle, name=f"trabajo-{i}", daemon=True).start()
+
+    def enviar(self, nombre, fn, on_done=None, on_parcial=None, recursos=()):
+        trabajo = Trabajo(self, nombre, fn, on_done=on_done, on_parcial=on_parcial, recursos=recursos)
+        with self._mutex:
+            self._trabajos.append(trabajo)
+        self._cola.put(trabajo)
+        self._notificar()
+        return trabajo
+
+    def trabajos(self):
+        with self._mutex:
+            return list(self._trabajos)
+
+    def cancelar_todos(self):
+        for trabajo in self.trabajos():
+            trabajo.cancelar()
+
+    def _notificar(self):
+        if self.on_cambio:
+            self._despachar(self.on_cambio)
+
+    def _lock(self, recurso):
+        with self._mutex:
+            return self._locks.setdefault(recurso, threading.Lock())
+
+    def _bucle(self):
+        while True:
+            trabajo = self._cola.get()
+            try:
+                self._ejecutar(trabajo)
+            finally:
+                with self._mutex:
+                    self._trabajos.remove(trabajo)
+                self._cola.task_done()
+                self._notificar()
+
+    def _ejecutar(self, trabajo):
+        res, err = None, None
+        adquiridos = []
+        try:
+            for recurso in trabajo.recursos:
+                lock = self._lock(recurso)
+                if not lock.acquire(blocking=False):
+                    trabajo.estado = "esperando"
+                    self._notificar()
+                    # Espera cancelable: otro trabajo tiene el recurso.
+                    while not lock.acquire(timeout=ESPERA_LOCK_SECONDS):
+                        _comprobar_cancelacion(trabajo.cancelado)
+                adquiridos.append(lock)
+            _comprobar_cancelacion(trabajo.cancelado)
+            trabajo.estado = "en curso"
+            self._notificar()
+            res = trabajo.fn(trabajo)
+            trabajo.estado = "terminado"
+        except OperacionCancelada as exc:
+            trabajo.estado = "cancelado"
+            err = exc
+        except Exception as exc:
+            trabajo.estado = "error"
+            err = exc
+        finally:
+            for lock in reversed(adquiridos):
+                lock.release()
+        if trabajo.on_done:
+            self._despachar(trabajo.on_done, res, err)
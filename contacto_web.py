@@ -0,0 +1,260 @@
+"""
+Busqueda del email de contacto en la web de una empresa (mini-crawler acotado por dominio).
+
+La portada casi nunca trae el email: suele estar en /contacto, /aviso-legal o en el pie de
+alguna subpagina. buscar_email_web:
+- descarga la portada y, si ya trae un email del dominio, termina
+- puntua los enlaces del mismo dominio por texto y ruta (contacto > aviso legal > privacidad...)
+- descarga en paralelo las mejores candidatas, como mucho MAX_PAGINAS_DOMINIO paginas por web
+  y PRESUPUESTO_SECONDS en total, y para en cuanto aparece un email verificado del dominio
+
+Lo usan WebScrapper_DAGM_ver5/ver6 desde obtener_email_web.
+"""
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urljoin, urlparse
+
+MAX_PAGINAS_DOMINIO = 6
+HILOS_POR_DOMINIO = 3
+PRESUPUESTO_SECONDS = 20.0
+TIMEOUT_PAGINA_SECONDS = 10
+# Descarga en streaming: tope por pagina, tamaño de trozo y solape entre trozos
+# (un email no pasa de 254 caracteres).
+MAX_BYTES_PAGINA = 512 * 1024
+TAMANO_TROZO = 16 * 1024
+SOLAPE = 256
+
+email_regex = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
+
+# Peso de cada palabra si aparece en el texto del enlace o en su ruta.
+PALABRAS_CONTACTO = {
+    "contacto": 10,
+    "contactar": 10,
+    "contacta": 10,
+    "contact": 9,
+    "aviso-legal": 8,
+    "aviso legal": 8,
+    "avisolegal": 8,
+    "legal": 6,
+    "privacidad": 5,
+    "privacy": 4,
+    "quienes-somos": 4,
+    "quienes somos": 4,
+    "sobre-nosotros": 4,
+    "nosotros": 3,
+    "empresa": 3,
+    "about": 3,
+    "donde-estamos": 3,
+    "localizacion": 3,
+    "ubicacion": 3,
+}
+
+EXTENSIONES_NO_HTML = (
+    ".pdf", ".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".zip", ".rar",
+    ".doc", ".docx", ".xls", ".xlsx", ".mp4", ".mp3", ".css", ".js", ".ico",
+)
+
+# Falsos positivos tipicos del regex (retina "logo@2x.png", plantillas, trackers).
+EMAILS_BASURA = re.compile(
+    r"\.(?:png|jpe?g|gif|webp|svg|css|js)$|@(?:\d+x\.|example\.|ejemplo\.|sentry|wixpress\.com|domain\.)",
+    re.I,
+)
+
+
+def dominio_web(url):
+    try:
+        dominio = urlparse(url if "://" in url else "http://" + url).netloc.lower().split(":")[0]
+    except ValueError:
+        return None
+    if dominio.startswith("www."):
+        dominio = dominio[4:]
+    return dominio if "." in dominio else None
+
+
+def email_del_dominio(email, dominio):
+    # tienda.empresa.es <-> info@empresa.es y empresa.es <-> info@mail.empresa.es cuentan como propios.
+    dom_email = email.rsplit("@", 1)[-1].lower()
+    return dom_email == dominio or dom_email.endswith("." + dominio) or dominio.endswith("." + dom_email)
+
+
+def emails_en_html(html, completos_hasta=None, cortado_al_inicio=False):
+    """
+    Emails del HTML en orden de aparicion: primero los mailto: (intencionados), luego el texto.
+    Para trozos de una descarga en streaming:
+    - completos_hasta: ignora coincidencias que acaban despues (pueden seguir en el siguiente trozo)
+    - cortado_al_inicio: ignora las que empiezan en la posicion 0 (pueden venir cortadas por delante)
+    """
+    if completos_hasta is None:
+        completos_hasta = len(html)
+
+    def validas(matches):
+        for m in matches:
+            if m.end() <= completos_hasta and not (cortado_al_inicio and m.start() == 0):
+                yield m.group(m.lastindex or 0)
+
+    vistos = list(validas(re.finditer(r"mailto:([^\"'?>\s]+)", html, re.I)))
+    vistos.extend(validas(email_regex.finditer(html)))
+
+    emails = []
+    for email in vistos:
+        email = email.strip().rstrip(".,;:").lower()
+        if email_regex.fullmatch(email) and not EMAILS_BASURA.search(email) and email not in emails:
+            emails.append(email)
+    return emails
+
+
+def enlaces_contacto(html, base_url, dominio, limite=MAX_PAGINAS_DOMINIO):
+    """
+    Enlaces del mismo dominio con pinta de pagina de contacto, de mayor a menor puntuacion.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    puntuados = {}
+    for a in soup.find_all("a", href=True):
+        href = a["href"].strip()
+        if not href or href.startswith(("#", "mailto:", "tel:", "javascript:")):
+            continue
+        url = urljoin(base_url, href).split("#")[0]
+        partes = urlparse(url)
+        if partes.scheme not in ("http", "https") or dominio_web(url) != dominio:
+            continue
+        ruta = partes.path.lower()
+        if ruta.endswith(EXTENSIONES_NO_HTML):
+            continue
+
+        texto = a.get_text(" ", strip=True).lower()
+        puntos = sum(peso for palabra, peso in PALABRAS_CONTACTO.items() if palabra in texto or palabra in ruta)
+        if puntos and puntos > puntuados.get(url, 0):
+            puntuados[url] = puntos
+
+    base = base_url.split("#")[0].rstrip("/")
+    candidatos = [u for u in sorted(puntuados, key=lambda u: -puntuados[u]) if u.rstrip("/") != base]
+    return candidatos[:limite]
+
+
+def _es_html(content_type):
+    # Sin cabecera se lee igualmente; PDFs, imagenes, zips... no.
+    content_type = (content_type or "").lower()
+    return not content_type or "html" in content_type or "xml" in content_type
+
+
+def descargar_html(url, headers=None, timeout=TIMEOUT_PAGINA_SECONDS, en_email=None, max_bytes=MAX_BYTES_PAGINA):
+    """
+    Descarga en streaming: (status, html leido); status None si falla la conexion.
+    - Content-Type que no es HTML: se corta sin leer el cuerpo (html = "")
+    - en_email(email) -> True: se para en cuanto aparece un email que lo cumpla
+    - como mucho max_bytes del cuerpo y timeout segundos en total
+    Los trozos se escanean con SOLAPE caracteres del anterior para no partir un email.
+    """
+    import codecs
+
+    import requests
+
+    fin = time.monotonic() + timeout
+    try:
+        with requests.get(url, headers=headers, timeout=timeout, stream=True) as r:
+            if r.status_code != 200 or not _es_html(r.headers.get("Content-Type")):
+                return r.status_code, ""
+
+            # requests pone ISO-8859-1 a todo text/* sin charset; las webs actuales son UTF-8.
+            charset = r.encoding if "charset" in (r.headers.get("Content-Type") or "").lower() else "utf-8"
+            try:
+                decodificador = codecs.getincrementaldecoder(charset)(errors="replace")
+            except LookupError:
+                decodificador = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+            trozos = []
+            leidos = 0
+            cola = ""
+            for bloque in r.iter_content(chunk_size=TAMANO_TROZO):
+                leidos += len(bloque)
+                final = leidos >= max_bytes or time.monotonic() >= fin
+                texto = decodificador.decode(bloque, final=final)
+                trozos.append(texto)
+
+                if en_email is not None:
+                    ventana = cola + texto
+                    limite = len(ventana) if final else len(ventana) - SOLAPE
+                    for email in emails_en_html(ventana, completos_hasta=limite, cortado_al_inicio=bool(cola)):
+                        if en_email(email):
+                            return r.status_code, "".join(trozos)
+                    cola = ventana[-2 * SOLAPE:]
+                if final:
+                    break
+            else:
+                # Fin del cuerpo: lo que quedaba en la cola ya es definitivo.
+                if en_email is not None and cola:
+                    for email in emails_en_html(cola, cortado_al_inicio=True):
+                        if en_email(email):
+                            break
+            return r.status_code, "".join(trozos)
+    except requests.RequestException:
+        return None, ""
+
+
+def buscar_email_web(
+    url,
+    headers=None,
+    solo_dominio=True,
+    max_paginas=MAX_PAGINAS_DOMINIO,
+    presupuesto_seconds=PRESUPUESTO_SECONDS,
+    hilos=HILOS_POR_DOMINIO,
+    descargar=None,
+):
+    """
+    Devuelve el primer email del dominio de url encontrado en la portada o en sus paginas de
+    contacto, o None.
+    solo_dominio=False: si no aparece ninguno del dominio, devuelve el primer email visto (ver5).
+    descargar(url, headers, timeout, en_email) -> (status, html); por defecto descargar_html,
+    que corta la descarga en cuanto en_email devuelve True.
+    """
+    descargar = descargar or descargar_html
+    dominio = dominio_web(url)
+    if not dominio:
+        return None
+    if "://" not in url:
+        url = "http://" + url
+
+    limite = time.monotonic() + presupuesto_seconds
+    propios = []
+    otros = []
+
+    def revisar(email):
+        # Llamado desde varios hilos: list.append es atomico, basta con el primero.
+        if email_del_dominio(email, dominio):
+            propios.append(email)
+            return True
+        if email not in otros:
+            otros.append(email)
+        return False
+
+    def restante():
+        return max(0.0, limite - time.monotonic())
+
+    status, html = descargar(url, headers, min(TIMEOUT_PAGINA_SECONDS, restante()), revisar)
+    if propios:
+        return propios[0]
+    if status != 200:
+        return None
+
+    candidatos = enlaces_contacto(html, url, dominio, limite=max(0, max_paginas - 1))
+    if candidatos and restante() > 0:
+        pool = ThreadPoolExecutor(max_workers=max(1, int(hilos)))
+        try:
+            pendientes = {
+                pool.submit(descargar, c, headers, min(TIMEOUT_PAGINA_SECONDS, restante()), revisar)
+                for c in candidatos
+            }
+            while pendientes and restante() > 0:
+                _, pendientes = wait(pendientes, timeout=restante(), return_when=FIRST_COMPLETED)
+                if propios:
+                    return propios[0]
+        finally:
+            # Sin esperar a las descargas en curso: el presupuesto de tiempo manda.
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    if not solo_dominio and otros:
+        return otros[0]
+    return None
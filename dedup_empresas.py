@@ -0,0 +1,189 @@
+"""
+Deteccion offline de empresas duplicadas "parecidas" (no solo nombre exacto).
+
+- Bloqueo: cada empresa se indexa por telefono, dominio (web/email), nombre normalizado
+  y codigo postal + prefijo del nombre. Solo se comparan empresas que comparten bloque.
+- Los bloques con mas de MAX_BLOQUE empresas se descartan (centralitas, dominios genericos...),
+  asi el coste es ~lineal en el numero de empresas.
+- Las claves (telefono, dominio, nombre normalizado) salen de normalizacion, igual que en
+  indice_empresas y los scrapers.
+- Cada par candidato se puntua por similitud de nombre (rapidfuzz si esta instalado, si no difflib)
+  mas bonus por telefono/dominio/CP compartidos. Los pares aceptados se agrupan (union-find).
+
+No toca la base de datos: recibe lotes de dicts (ver Consultor_db_v5.iterar_empresas_por_lotes)
+y devuelve grupos con el mismo formato que buscar_redundancias_email_nombre_empresa.
+"""
+from difflib import SequenceMatcher
+
+from normalizacion import DOMINIOS_GENERICOS, normalizar_nombre_empresa, obtener_dominio, telefono_clave, valor_util
+
+try:
+    from rapidfuzz import fuzz as _rf_fuzz
+except ImportError:  # opcional
+    _rf_fuzz = None
+
+MAX_BLOQUE = 50
+UMBRAL_SCORE = 0.85
+BONUS_TELEFONO = 0.3
+BONUS_DOMINIO = 0.3
+BONUS_CP = 0.1
+PREFIJO_NOMBRE_CP = 4
+
+
+def dominio_empresa(empresa):
+    dominio = obtener_dominio(empresa.get("web"))
+    if not dominio:
+        email = valor_util(empresa.get("email"))
+        if email and "@" in email:
+            dominio = email.rsplit("@", 1)[1].lower().strip()
+    if not dominio or dominio in DOMINIOS_GENERICOS:
+        return None
+    return dominio
+
+
+def similitud_nombres(a, b):
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    if _rf_fuzz is not None:
+        return _rf_fuzz.ratio(a, b) / 100.0
+    sm = SequenceMatcher(None, a, b)
+    # quick_ratio es una cota superior barata: evita el ratio completo en pares claramente distintos.
+    if sm.quick_ratio() < 0.5:
+        return 0.0
+    return sm.ratio()
+
+
+def claves_bloqueo(ficha):
+    claves = []
+    if ficha["telefono"]:
+        claves.append("tel:" + ficha["telefono"])
+    if ficha["dominio"]:
+        claves.append("dom:" + ficha["dominio"])
+    if ficha["nombre_norm"]:
+        claves.append("nom:" + ficha["nombre_norm"])
+        if ficha["cp"]:
+            claves.append(f"cp:{ficha['cp']}:{ficha['nombre_norm'][:PREFIJO_NOMBRE_CP]}")
+    return claves
+
+
+def puntuar_par(a, b):
+    """
+    Devuelve (score, motivos). score en [0, 1].
+    """
+    score = similitud_nombres(a["nombre_norm"], b["nombre_norm"])
+    motivos = [f"nombre={score:.2f}"]
+    if a["telefono"] and a["telefono"] == b["telefono"]:
+        score += BONUS_TELEFONO
+        motivos.append("telefono")
+    if a["dominio"] and a["dominio"] == b["dominio"]:
+        score += BONUS_DOMINIO
+        motivos.append("dominio")
+    if a["cp"] and a["cp"] == b["cp"]:
+        score += BONUS_CP
+        motivos.append("cp")
+    return min(1.0, score), motivos
+
+
+class UnionFind:
+    def __init__(self):
+        self.padre = {}
+
+    def find(self, x):
+        self.padre.setdefault(x, x)
+        raiz = x
+        while self.padre[raiz] != raiz:
+            raiz = self.padre[raiz]
+        while self.padre[x] != raiz:
+            self.padre[x], x = raiz, self.padre[x]
+        return raiz
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.padre[max(ra, rb)] = min(ra, rb)
+
+
+def buscar_empresas_similares(lotes, umbral=UMBRAL_SCORE, max_bloque=MAX_BLOQUE, log_func=None):
+    """
+    lotes: iterable de listas de dicts con id_empresa, nombre y opcionalmente telefono, web,
+    email, codigo_postal. Se procesan en streaming: cada empresa solo se compara con las que
+    ya estaban en sus bloques.
+    Devuelve grupos [{ids_empresas, ejemplo_nombre, ejemplo_email, nombre_norm, score, motivos}]
+    ordenados por tamaño.
+    """
+    log = log_func or (lambda msg: None)
+    fichas = {}
+    bloques = {}
+    saturados = set()
+    comparados = set()
+    uf = UnionFind()
+    mejor_par = {}
+    n_empresas = 0
+
+    for lote in lotes:
+        for emp in lote:
+            id_empresa = emp.get("id_empresa")
+            if id_empresa is None:
+                continue
+            ficha = {
+                "id": id_empresa,
+                "nombre": valor_util(emp.get("nombre")) or "",
+                "email": valor_util(emp.get("email")) or "",
+                "nombre_norm": normalizar_nombre_empresa(emp.get("nombre")),
+                "telefono": telefono_clave(emp.get("telefono")),
+                "dominio": dominio_empresa(emp),
+                "cp": valor_util(emp.get("codigo_postal")),
+            }
+            fichas[id_empresa] = ficha
+            n_empresas += 1
+
+            for clave in claves_bloqueo(ficha):
+                if clave in saturados:
+                    continue
+                miembros = bloques.setdefault(clave, [])
+                if len(miembros) >= max_bloque:
+                    # Bloque demasiado generico: deja de indexar (los pares ya puntuados se mantienen).
+                    saturados.add(clave)
+                    del bloques[clave]
+                    continue
+                for otro in miembros:
+                    par = (otro, id_empresa) if otro < id_empresa else (id_empresa, otro)
+                    if par in comparados:
+                        continue
+                    comparados.add(par)
+                    score, motivos = puntuar_par(fichas[otro], ficha)
+                    if score >= umbral:
+                        uf.union(*par)
+                        mejor_par[par] = (score, motivos)
+                miembros.append(id_empresa)
+        log(f"Similares: {n_empresas} empresas indexadas, {len(comparados)} pares comparados")
+
+    grupos = {}
+    pares_grupo = {}
+    for par, valor in mejor_par.items():
+        raiz = uf.find(par[0])
+        grupos.setdefault(raiz, set()).update(par)
+        pares_grupo.setdefault(raiz, []).append(valor)
+
+    salida = []
+    for raiz, ids in grupos.items():
+        ids_orden = sorted(ids)
+        pares = pares_grupo[raiz]
+        score = min(p[0] for p in pares)
+        motivos = sorted({m for p in pares for m in p[1] if not m.startswith("nombre=")})
+        ejemplo = fichas[ids_orden[0]]
+        salida.append(
+            {
+                "ids_empresas": [str(i) for i in ids_orden],
+                "ejemplo_nombre": ejemplo["nombre"],
+                "ejemplo_email": next((fichas[i]["email"] for i in ids_orden if fichas[i]["email"]), ""),
+                "nombre_norm": ejemplo["nombre_norm"] or "",
+                "score": round(score, 3),
+                "motivos": motivos,
+            }
+        )
+    salida.sort(key=lambda g: (-len(g["ids_empresas"]), g["score"], g["nombre_norm"]))
+    log(f"Similares: {len(salida)} grupos candidatos ({len(saturados)} bloques descartados por tamaño)")
+    return salida
@@ -0,0 +1,228 @@
+"""
+Extraccion de telefonos y emails por lotes (reprocesado de HTML guardado a gran escala).
+
+Los scrapers hacen una busqueda de regex por ficha sobre su get_text() y normalizan cada
+coincidencia en Python. Para millones de fichas eso es millones de llamadas cortas. Aqui:
+- los textos de todo el lote se concatenan en un unico documento (separados por SEPARADOR,
+  que ningun patron puede atravesar) y cada patron recorre el documento una sola vez
+- la posicion de cada coincidencia se traduce a su ficha con bisect sobre los offsets
+- la normalizacion se cachea por valor (los mismos telefonos/emails se repiten mucho)
+
+Motor: pyhyperscan (todos los patrones en una pasada) o google-re2 si estan instalados;
+si no, el modulo re de siempre. Con re, recorrer el documento entero caracter a caracter es
+mas lento que buscar ficha a ficha (la busqueda por ficha para en la primera coincidencia),
+asi que los patrones por defecto usan un prefiltro con busquedas de subcadena en C:
+- email: cada "@" (str.find) y se expande a izquierda y derecha con regex ancladas
+- telefono: tramos de 9+ digitos (str.translate + str.find) y la regex real solo en esa ventana
+Los tres motores devuelven lo mismo que la busqueda ficha a ficha de WebScrapper_DAGM_ver6
+(primera coincidencia de cada patron en cada ficha). El re-parseo del archivo (archivo_html)
+busca asi los telefonos de cada listado: WebScrapper_DAGM_ver6.parsear_listado(html, extractor).
+"""
+import re
+from bisect import bisect_right
+
+from normalizacion import limpiar_email, normalizar_telefono
+
+try:
+    import hyperscan as _hs
+except ImportError:  # opcional
+    _hs = None
+
+try:
+    import re2 as _re2
+except ImportError:  # opcional
+    _re2 = None
+
+# Mismos patrones que WebScrapper_DAGM_ver6 (sin el grupo de captura, que no se usa).
+PATRONES = {
+    "telefono": r"\+34\s?\d{9}|\b\d{9}\b",
+    "email": r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+",
+}
+# Ni \d, ni \s seguido de digito, ni caracteres de email: una coincidencia no salta de ficha.
+SEPARADOR = "\n\x00\n"
+
+_local_email = re.compile(r"[a-zA-Z0-9_.+-]+")
+_dominio_email = re.compile(r"[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
+_digitos_a_cero = str.maketrans("0123456789", "0" * 10)
+_ceros = re.compile("0*")
+# "+34 " delante del tramo de 9 digitos.
+MARGEN_PREFIJO_TELEFONO = 4
+
+
+NORMALIZADORES = {
+    "telefono": normalizar_telefono,
+    "email": limpiar_email,
+}
+
+
+def motor_disponible():
+    if _hs is not None:
+        return "hyperscan"
+    if _re2 is not None:
+        return "re2"
+    return "re"
+
+
+class ExtractorLotes:
+    """
+    extractor = ExtractorLotes()
+    extractor.extraer(["texto ficha 1", "texto ficha 2", ...])
+    -> [{"telefono": "+34912345678", "email": None}, ...]
+    """
+
+    def __init__(self, patrones=None, normalizadores=None, motor=None):
+        self.patrones = dict(patrones or PATRONES)
+        normalizadores = NORMALIZADORES if normalizadores is None else normalizadores
+        self.normalizadores = dict(normalizadores)
+        self.motor = motor or motor_disponible()
+        if self.motor == "hyperscan" and _hs is None or self.motor == "re2" and _re2 is None:
+            raise ValueError(f"Motor {self.motor} no instalado")
+        self._nombres = list(self.patrones)
+
+        if self.motor == "hyperscan":
+            self._db = _hs.Database()
+            self._db.compile(
+                expressions=[self.patrones[n].encode() for n in self._nombres],
+                ids=list(range(len(self._nombres))),
+                flags=[_hs.HS_FLAG_SOM_LEFTMOST] * len(self._nombres),
+            )
+        else:
+            modulo = _re2 if self.motor == "re2" else re
+            self._compilados = {n: modulo.compile(p) for n, p in self.patrones.items()}
+            self._prefiltros = {}
+            if self.motor == "re":
+                for nombre, fn in (("email", self._emails_por_arroba), ("telefono", self._telefonos_por_digitos)):
+                    if self.patrones.get(nombre) == PATRONES[nombre]:
+                        self._prefiltros[nombre] = fn
+
+    # ---------------- COINCIDENCIAS ----------------
+
+    def _emails_por_arroba(self, nombre, documento):
+        # Equivale a finditer(PATRONES["email"]): "@" no es caracter local, asi que el inicio es
+        # el principio del tramo local pegado a la "@" (sin pisar la coincidencia anterior).
+        invertido = documento[::-1]
+        n = len(documento)
+        anterior = 0
+        pos = documento.find("@")
+        while pos >= 0:
+            dominio = _dominio_email.match(documento, pos + 1)
+            if dominio:
+                local = _local_email.match(invertido, n - pos, n - anterior)
+                if local:
+                    anterior = dominio.end()
+                    yield nombre, pos - (local.end() - (n - pos)), anterior
+                    pos = documento.find("@", anterior)
+                    continue
+            pos = documento.find("@", pos + 1)
+
+    def _telefonos_por_digitos(self, nombre, documento):
+        # La regex real solo se ejecuta en ventanas alrededor de tramos de 9+ digitos ASCII.
+        regex = self._compilados[nombre]
+        ceros = documento.translate(_digitos_a_cero)
+        anterior = 0
+        pos = ceros.find("0" * 9)
+        while pos >= 0:
+            fin_tramo = _ceros.match(ceros, pos).end()
+            inicio = pos - MARGEN_PREFIJO_TELEFONO
+            if inicio < anterior:
+                inicio = anterior
+            # endpos una posicion despues del tramo: \b necesita ver el siguiente caracter.
+            m = regex.search(documento, inicio, fin_tramo + 1)
+            while m:
+                anterior = m.end()
+                yield nombre, m.start(), anterior
+                m = regex.search(documento, anterior, fin_tramo + 1)
+            if anterior < fin_tramo:
+                anterior = fin_tramo
+            pos = ceros.find("0" * 9, fin_tramo)
+
+    def _coincidencias_re(self, documento):
+        for nombre, regex in self._compilados.items():
+            prefiltro = self._prefiltros.get(nombre)
+            if prefiltro is not None:
+                yield from prefiltro(nombre, documento)
+                continue
+            for m in regex.finditer(documento):
+                yield nombre, m.start(), m.end()
+
+    def _coincidencias_hyperscan(self, documento):
+        # Hyperscan avisa de cada final posible; con SOM_LEFTMOST el inicio es el mas a la izquierda.
+        # Se reconstruye la semantica de finditer: por inicio el final mas largo, sin solapes.
+        crudas = {n: {} for n in self._nombres}
+
+        def al_coincidir(id_patron, inicio, fin, flags, contexto):
+            finales = crudas[self._nombres[id_patron]]
+            if fin > finales.get(inicio, -1):
+                finales[inicio] = fin
+            return 0
+
+        self._db.scan(documento, match_event_handler=al_coincidir)
+        for nombre, finales in crudas.items():
+            hasta = -1
+            for inicio in sorted(finales):
+                if inicio >= hasta:
+                    hasta = finales[inicio]
+                    yield nombre, inicio, hasta
+
+    # ---------------- LOTE ----------------
+
+    def extraer(self, textos, todos=False):
+        """
+        textos: lista de str (get_text de cada ficha).
+        todos=False: primera coincidencia normalizada de cada patron por ficha (o None).
+        todos=True: lista con todas las coincidencias normalizadas, sin repetir, en orden.
+        """
+        textos = ["" if t is None else t for t in textos]
+        if not textos:
+            return []
+
+        if self.motor == "hyperscan":
+            # Hyperscan trabaja con bytes: los offsets son de la codificacion UTF-8.
+            partes = [t.encode("utf-8") for t in textos]
+            separador = SEPARADOR.encode()
+            documento = separador.join(partes)
+            coincidencias = self._coincidencias_hyperscan(documento)
+        else:
+            partes = textos
+            separador = SEPARADOR
+            documento = separador.join(partes)
+            coincidencias = self._coincidencias_re(documento)
+
+        inicios = []
+        pos = 0
+        for parte in partes:
+            inicios.append(pos)
+            pos += len(parte) + len(separador)
+
+        # Una columna por patron; la normalizacion se cachea por valor crudo.
+        columnas = {n: ([[] for _ in textos] if todos else [None] * len(textos)) for n in self._nombres}
+        caches = {n: {} for n in self._nombres}
+        for nombre, inicio, fin in coincidencias:
+            columna = columnas[nombre]
+            i = bisect_right(inicios, inicio) - 1
+            if not todos and columna[i] is not None:
+                # Las coincidencias de cada patron llegan en orden: la primera ya es la buena.
+                continue
+            crudo = documento[inicio:fin]
+            cache = caches[nombre]
+            valor = cache.get(crudo)
+            if valor is None:
+                valor = crudo.decode("utf-8", "replace") if isinstance(crudo, bytes) else crudo
+                normalizar = self.normalizadores.get(nombre)
+                if normalizar is not None:
+                    valor = normalizar(valor)
+                cache[crudo] = valor
+            if not todos:
+                columna[i] = valor
+            elif valor not in columna[i]:
+                columna[i].append(valor)
+
+        return [dict(zip(self._nombres, fila)) for fila in zip(*(columnas[n] for n in self._nombres))]
+
+
+def extraer_de_cajas(cajas, extractor=None):
+    """
+    Igual que extraer() pero a partir de nodos BeautifulSoup (div.box de Paginas Amarillas).
+    """
+    extractor = extractor or ExtractorLotes()
+    return extractor.extraer([c.get_text(" ", strip=True) for c in cajas])
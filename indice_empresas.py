@@ -0,0 +1,249 @@
+"""
+Indice persistente de empresas ya scrapeadas, compartido entre ejecuciones y scrapers
+(WebScrapper_DAGM_ver5/ver6, Empresite y lotes_paginas_amarillas).
+
+La misma empresa aparece en muchas categorias y localidades; sin indice cada aparicion
+vuelve a pagar el enriquecimiento caro (email desde su web, ficha de Empresite con Selenium).
+Cada empresa se indexa por:
+- telefono normalizado (ultimos 9 digitos)
+- dominio de la web/email (sin dominios de correo gratuitos)
+- URL de la ficha (url_detalle)
+- nombre normalizado + codigo postal (o localidad si no hay CP)
+
+Solo la URL de la ficha y el nombre con zona identifican a una empresa: las sucursales de una
+cadena comparten dominio y varias empresas pueden compartir centralita. Telefono y dominio
+solo casan cuando apuntan los dos a la misma empresa; si una de esas claves ya es de otra
+empresa al registrar, se marca como compartida y deja de usarse.
+
+Antes de enriquecer, el scraper llama a buscar(): si la empresa ya se enriquecio hace menos
+de max_edad_dias se reutilizan sus datos; si no existe o esta caducada se enriquece y se
+guarda con registrar(). SQLite (stdlib): un fichero, seguro entre hilos con el lock interno.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from dedup_empresas import dominio_empresa
+from normalizacion import normalizar_nombre_empresa, telefono_clave, valor_util
+
+RUTA_INDICE = Path("resultados") / "indice_empresas.sqlite"
+MAX_EDAD_DIAS = 30
+# id_empresa de las claves debiles (tel:/dom:) que aparecen en mas de una empresa.
+ID_CLAVE_COMPARTIDA = 0
+# Campos que aporta el enriquecimiento y se reutilizan cuando la empresa esta fresca.
+CAMPOS_ENRIQUECIDOS = (
+    "email",
+    "web",
+    "telefono",
+    "email_posible_info",
+    "email_posible_contacto",
+    "email_posible_administracion",
+)
+
+_SQL_TABLAS = (
+    """
+    CREATE TABLE IF NOT EXISTS empresas (
+        id INTEGER PRIMARY KEY,
+        datos TEXT NOT NULL,
+        fuente TEXT,
+        visto_en REAL NOT NULL,
+        enriquecido_en REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS claves (
+        clave TEXT PRIMARY KEY,
+        id_empresa INTEGER NOT NULL
+    )
+    """,
+)
+
+
+def claves_indice(data):
+    """
+    Claves de busqueda de una empresa (dict con el formato de los scrapers).
+    Las que faltan se omiten: una ficha sin telefono ni web aun casa por URL o nombre.
+    """
+    claves = []
+    telefono = telefono_clave(data.get("telefono"))
+    if telefono:
+        claves.append("tel:" + telefono)
+    dominio = dominio_empresa(data)
+    if dominio:
+        claves.append("dom:" + dominio)
+    url = valor_util(data.get("url_detalle"))
+    if url:
+        claves.append("url:" + url.lower().split("?")[0].rstrip("/"))
+    nombre = normalizar_nombre_empresa(data.get("nombre"))
+    if nombre:
+        # Solo el nombre no basta (cadenas, franquicias): se acota con CP o localidad.
+        zona = valor_util(data.get("codigo_postal")) or normalizar_nombre_empresa(data.get("localidad")) or ""
+        claves.append(f"nom:{nombre}|{zona}")
+    return claves
+
+
+def _es_identificativa(clave):
+    # nom: sin zona es solo el nombre: tan debil como el telefono o el dominio.
+    return clave.startswith("url:") or (clave.startswith("nom:") and not clave.endswith("|"))
+
+
+def _fusionar(anterior, nuevo):
+    # Lo nuevo manda salvo que venga vacio ("No disponible"): no se pierde un email ya encontrado.
+    fusion = dict(anterior)
+    for campo, valor in nuevo.items():
+        if valor_util(valor) or campo not in fusion:
+            fusion[campo] = valor
+    return fusion
+
+
+class IndiceEmpresas:
+    def __init__(self, ruta=RUTA_INDICE, max_edad_dias=MAX_EDAD_DIAS):
+        self.ruta = Path(ruta)
+        self.max_edad_seconds = max(0.0, float(max_edad_dias)) * 86400
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.ruta), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for sql in _SQL_TABLAS:
+            self._conn.execute(sql)
+        self._conn.commit()
+        self.aciertos = 0
+        self.caducadas = 0
+        self.nuevas = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _claves_existentes(self, claves):
+        if not claves:
+            return {}
+        marcas = ",".join("?" * len(claves))
+        return dict(
+            self._conn.execute(
+                f"SELECT clave, id_empresa FROM claves WHERE clave IN ({marcas})", claves
+            ).fetchall()
+        )
+
+    def _id_por_claves(self, claves):
+        """
+        Empresa a la que pertenecen las claves: la de la URL de la ficha, si no la del nombre
+        con zona y, si ninguna casa, la que reunan al menos dos claves debiles (tel:/dom:).
+        """
+        existentes = self._claves_existentes(claves)
+        for prefijo in ("url:", "nom:"):
+            for clave in claves:
+                if clave.startswith(prefijo) and _es_identificativa(clave) and clave in existentes:
+                    return existentes[clave]
+        votos = Counter(
+            id_empresa
+            for clave, id_empresa in existentes.items()
+            if not _es_identificativa(clave) and id_empresa != ID_CLAVE_COMPARTIDA
+        )
+        if votos:
+            id_empresa, coincidencias = votos.most_common(1)[0]
+            if coincidencias >= 2:
+                return id_empresa
+        return None
+
+    def buscar(self, data):
+        """
+        Devuelve (datos_guardados, fresca) o (None, False) si la empresa no esta indexada.
+        fresca=True: se enriquecio hace menos de max_edad_dias y no hace falta repetirlo.
+        """
+        claves = claves_indice(data)
+        with self._lock:
+            id_empresa = self._id_por_claves(claves)
+            if id_empresa is None:
+                self.nuevas += 1
+                return None, False
+            datos, enriquecido_en = self._conn.execute(
+                "SELECT datos, enriquecido_en FROM empresas WHERE id = ?", (id_empresa,)
+            ).fetchone()
+            fresca = bool(enriquecido_en) and time.time() - enriquecido_en < self.max_edad_seconds
+            if fresca:
+                self.aciertos += 1
+            else:
+                self.caducadas += 1
+            return json.loads(datos), fresca
+
+    def registrar(self, data, fuente=None, enriquecida=True):
+        """
+        Inserta o actualiza la empresa y todas sus claves.
+        enriquecida=False (p. ej. ver6 sin email desde web) no renueva la fecha de enriquecimiento,
+        para que una ejecucion posterior con enriquecimiento no la de por fresca.
+        """
+        claves = claves_indice(data)
+        if not claves:
+            return None
+        ahora = time.time()
+        with self._lock:
+            id_empresa = self._id_por_claves(claves)
+            if id_empresa is None:
+                cur = self._conn.execute(
+                    "INSERT INTO empresas (datos, fuente, visto_en, enriquecido_en) VALUES (?, ?, ?, ?)",
+                    (json.dumps(data, ensure_ascii=False), fuente, ahora, ahora if enriquecida else None),
+                )
+                id_empresa = cur.lastrowid
+            else:
+                (datos,) = self._conn.execute(
+                    "SELECT datos FROM empresas WHERE id = ?", (id_empresa,)
+                ).fetchone()
+                self._conn.execute(
+                    """
+                    UPDATE empresas
+                    SET datos = ?, fuente = COALESCE(?, fuente), visto_en = ?,
+                        enriquecido_en = CASE WHEN ? THEN ? ELSE enriquecido_en END
+                    WHERE id = ?
+                    """,
+                    (
+                        json.dumps(_fusionar(json.loads(datos), data), ensure_ascii=False),
+                        fuente,
+                        ahora,
+                        int(enriquecida),
+                        ahora,
+                        id_empresa,
+                    ),
+                )
+            self._guardar_claves(claves, id_empresa)
+            self._conn.commit()
+        return id_empresa
+
+    def _guardar_claves(self, claves, id_empresa):
+        # Una clave que ya es de otra empresa: la URL o el nombre con zona pasan a esta (el
+        # registro actual es el que se acaba de comprobar); telefono o dominio quedan compartidos.
+        existentes = self._claves_existentes(claves)
+        for clave in claves:
+            actual = existentes.get(clave)
+            if actual is None:
+                self._conn.execute(
+                    "INSERT INTO claves (clave, id_empresa) VALUES (?, ?)", (clave, id_empresa)
+                )
+            elif actual not in (id_empresa, ID_CLAVE_COMPARTIDA):
+                nuevo = id_empresa if _es_identificativa(clave) else ID_CLAVE_COMPARTIDA
+                self._conn.execute(
+                    "UPDATE claves SET id_empresa = ? WHERE clave = ?", (nuevo, clave)
+                )
+
+    def completar(self, data, guardados):
+        """
+        Copia en data los campos enriquecidos de una empresa fresca que data no tiene.
+        """
+        for campo in CAMPOS_ENRIQUECIDOS:
+            if not valor_util(data.get(campo)) and valor_util(guardados.get(campo)):
+                data[campo] = guardados[campo]
+        return data
+
+    def resumen(self):
+        return f"índice: {self.aciertos} reutilizadas, {self.caducadas} caducadas o sin enriquecer, {self.nuevas} nuevas"
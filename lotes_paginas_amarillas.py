@@ -0,0 +1,463 @@
+"""
+Crawl por lotes de Páginas Amarillas: muchas búsquedas what × where sin pasar por la GUI.
+
+Reutiliza el scraper de WebScrapper_DAGM_ver6 (construir_url, extraer_info_url, extraer_empresa...)
+y añade:
+- lista de trabajos desde CSV (columnas what, where y opcionalmente provincia, max_paginas, url)
+  o YAML/JSON (lista de trabajos, o listas "what" y "where" para el producto cartesiano)
+- pool de hilos con límite global (--hilos); por host, ritmo adaptativo (ritmo_adaptativo):
+  la concurrencia sube hasta --por-host y la pausa baja mientras el servidor responde bien,
+  y ambas se frenan con 429/503, desafíos o picos de latencia
+- un JSON por trabajo (mismo formato que ver6) + empresas_unificadas.json deduplicado entre
+  trabajos (teléfono, dominio o nombre+CP) + resumen.json
+- índice persistente entre lotes (indice_empresas): las empresas ya enriquecidas no se repiten
+- parseo en procesos (tuberia_parseo, --procesos-parseo): los hilos solo descargan y enriquecen
+- cache HTTP persistente de listados (cache_http): repetir un lote no vuelve a bajar las
+  páginas frescas y las caducadas se revalidan (304 sin cuerpo)
+- métricas del lote (metricas_scraper) en <salida>/metricas.json y, con --metricas-puerto,
+  en formato Prometheus por HTTP; --perfil para cProfile/pyinstrument
+
+Uso:
+    python lotes_paginas_amarillas.py trabajos.yaml --hilos 8 --por-host 2 --max-paginas 5
+"""
+import argparse
+import csv
+import datetime as dt
+import itertools
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import WebScrapper_DAGM_ver6 as pa
+from dedup_empresas import dominio_empresa
+from normalizacion import normalizar_nombre_empresa, telefono_clave
+from archivo_html import FUENTE_PA, ArchivoHTML
+from cache_http import MAX_EDAD_HORAS, RUTA_CACHE, CacheHTTP, bytes_transferidos
+from indice_empresas import MAX_EDAD_DIAS, RUTA_INDICE, IndiceEmpresas
+from metricas_scraper import MetricasScraper, VolcadoMetricas, motor_perfil, perfilar, servir_prometheus
+from paginacion_pa import recorrer_paginas
+from ritmo_adaptativo import CONCURRENCIA_MAXIMA, PAUSA_INICIAL_SECONDS, ControlRitmo
+from tuberia_parseo import TuberiaParseo
+
+HILOS = 4
+POR_HOST = CONCURRENCIA_MAXIMA  # techo del ritmo adaptativo por host
+MAX_PAGINAS = 0  # 0 = todas (fin detectado con paginacion_pa)
+PROVINCIA = "madrid"
+
+_print_lock = threading.Lock()
+_sesiones = threading.local()
+
+
+def log(msg):
+    with _print_lock:
+        print(msg, file=sys.stderr, flush=True)
+
+
+# ---------------- TRABAJOS ----------------
+
+def _normalizar_trabajo(t, max_paginas, provincia):
+    what = (t.get("what") or "").strip()
+    where = (t.get("where") or "").strip()
+    url = (t.get("url") or "").strip()
+    if not url and not (what and where):
+        raise ValueError(f"Trabajo sin what/where ni url: {t}")
+    return {
+        "what": what,
+        "where": where,
+        "provincia": (t.get("provincia") or provincia or "").strip(),
+        "max_paginas": int(t.get("max_paginas") or max_paginas),
+        "url": url,
+    }
+
+
+def _trabajos_desde_dict(datos):
+    """
+    {"what": [...], "where": [...], "provincia": .., "max_paginas": .., "trabajos": [...]}
+    -> producto what × where + trabajos explícitos.
+    """
+    comunes = {k: datos[k] for k in ("provincia", "max_paginas") if k in datos}
+    trabajos = []
+    whats = datos.get("what") or []
+    wheres = datos.get("where") or []
+    if isinstance(whats, str):
+        whats = [whats]
+    if isinstance(wheres, str):
+        wheres = [wheres]
+    for what, where in itertools.product(whats, wheres):
+        trabajos.append(dict(comunes, what=what, where=where))
+    for t in datos.get("trabajos") or []:
+        trabajos.append(dict(comunes, **t))
+    return trabajos
+
+
+def cargar_trabajos(ruta, max_paginas=MAX_PAGINAS, provincia=PROVINCIA):
+    ruta = Path(ruta)
+    extension = ruta.suffix.lower()
+    with open(ruta, "r", encoding="utf-8-sig", newline="") as f:
+        if extension == ".csv":
+            muestra = f.read(4096)
+            f.seek(0)
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+            crudos = list(csv.DictReader(f, dialect=dialecto))
+        elif extension in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("Para leer YAML instala PyYAML (pip install pyyaml) o usa CSV/JSON")
+            crudos = yaml.safe_load(f)
+        elif extension == ".json":
+            crudos = json.load(f)
+        else:
+            raise ValueError(f"Formato de trabajos no soportado: {ruta.name} (usa .csv, .yaml o .json)")
+
+    if isinstance(crudos, dict):
+        crudos = _trabajos_desde_dict(crudos)
+
+    trabajos = []
+    vistos = set()
+    for t in crudos or []:
+        trabajo = _normalizar_trabajo(t, max_paginas, provincia)
+        clave = trabajo["url"] or (trabajo["what"].lower(), trabajo["where"].lower(), trabajo["provincia"].lower())
+        if clave in vistos:
+            continue
+        vistos.add(clave)
+        trabajos.append(trabajo)
+    return trabajos
+
+
+# ---------------- CONCURRENCIA ----------------
+
+def _sesion():
+    import requests
+
+    sesion = getattr(_sesiones, "sesion", None)
+    if sesion is None:
+        sesion = requests.Session()
+        sesion.headers.update(pa.HEADERS)
+        _sesiones.sesion = sesion
+    return sesion
+
+
+def ejecutar_trabajo(
+    indice,
+    trabajo,
+    ritmo,
+    scrapear_email_web,
+    carpeta,
+    indice_empresas=None,
+    archivo=None,
+    tuberia=None,
+    metricas=None,
+    cache=None,
+):
+    base_url = trabajo["url"] or pa.construir_url_busqueda(trabajo["what"], trabajo["where"], trabajo["provincia"])
+    tipo, localidad = pa.extraer_info_url(base_url)
+    etiqueta = f"[{indice + 1}] {tipo} / {localidad}"
+    empresas = []
+    error = None
+
+    metricas = metricas or MetricasScraper("lotes")
+
+    def descargar(url):
+        t0 = time.perf_counter()
+        try:
+            if cache is not None:
+                r = cache.get(_sesion(), url, ritmo=ritmo, timeout=15)
+            else:
+                r = ritmo.get(_sesion(), url, timeout=15)
+        except Exception as exc:
+            metricas.registrar_descarga(None, 0, time.perf_counter() - t0)
+            return None, str(exc)
+        transferidos = bytes_transferidos(r)
+        metricas.registrar_descarga(r.status_code, transferidos, time.perf_counter() - t0)
+        if r.status_code == 200 and archivo is not None and transferidos:
+            archivo.guardar(url, r.text, FUENTE_PA, "listado", base_url=base_url, pagina=paginas_por_url.get(url))
+        return r.status_code, r.text
+
+    paginas_por_url = {}
+
+    def registrar_error(url, mensaje):
+        nonlocal error
+        error = f"{url}: {mensaje}"
+
+    def construir(base, pagina):
+        url = pa.construir_url(base, pagina)
+        paginas_por_url[url] = pagina
+        return url
+
+    def procesar(pagina, registros):
+        for data in registros:
+            with metricas.cronometro("enriquecimiento"):
+                data = pa.enriquecer_empresa(data, scrapear_email_web, indice_empresas)
+            if data:
+                empresas.append(data)
+                metricas.registrar_empresa(data)
+        metricas.registrar_pagina()
+        log(f"{etiqueta}: página {pagina} ({len(registros)} fichas, {len(empresas)} empresas acumuladas)")
+
+    # El ritmo del host ya limita la concurrencia real; más hilos por trabajo que su techo no aportan.
+    paginas = recorrer_paginas(
+        base_url,
+        trabajo["max_paginas"],
+        construir,
+        descargar,
+        pa.parsear_listado,
+        procesar,
+        lambda msg: log(f"{etiqueta}: {msg}"),
+        hilos=ritmo.concurrencia_maxima,
+        tuberia=tuberia,
+        error_func=registrar_error,
+    )
+
+    nombre = f"{indice + 1:04d}_{pa.generar_nombre_archivo(base_url)}"
+    with metricas.cronometro("escritura"), open(carpeta / nombre, "w", encoding="utf-8") as f:
+        json.dump(
+            {"localidad": localidad, "tipo_empresa": tipo, "resultados": empresas},
+            f,
+            ensure_ascii=False,
+            indent=4,
+        )
+
+    return {
+        "indice": indice,
+        "url": base_url,
+        "tipo_empresa": tipo,
+        "localidad": localidad,
+        "paginas": paginas,
+        "empresas": len(empresas),
+        "archivo": nombre,
+        "error": error,
+        "_resultados": empresas,
+    }
+
+
+# ---------------- DEDUP ENTRE TRABAJOS ----------------
+
+def claves_empresa(data):
+    claves = []
+    telefono = telefono_clave(data.get("telefono"))
+    if telefono:
+        claves.append("tel:" + telefono)
+    dominio = dominio_empresa(data)
+    if dominio:
+        claves.append("dom:" + dominio)
+    nombre = normalizar_nombre_empresa(data.get("nombre"))
+    if nombre:
+        claves.append(f"nom:{nombre}|{data.get('codigo_postal') or ''}")
+    return claves
+
+
+def unificar_resultados(resultados):
+    """
+    Une las empresas de todos los trabajos (en orden de trabajo) descartando las que comparten
+    alguna clave con otra ya vista. Anota en cada resumen cuántas empresas nuevas aportó.
+    """
+    vistas = set()
+    unificadas = []
+    for res in sorted(resultados, key=lambda r: r["indice"]):
+        nuevas = 0
+        for data in res["_resultados"]:
+            claves = claves_empresa(data)
+            if any(c in vistas for c in claves):
+                continue
+            vistas.update(claves)
+            nuevas += 1
+            unificadas.append(dict(data, tipo_empresa=res["tipo_empresa"], busqueda_localidad=res["localidad"]))
+        res["nuevas"] = nuevas
+    return unificadas
+
+
+# ---------------- LOTE ----------------
+
+def ejecutar_lote(
+    trabajos,
+    carpeta,
+    hilos=HILOS,
+    por_host=POR_HOST,
+    scrapear_email_web=False,
+    pausa_inicial=PAUSA_INICIAL_SECONDS,
+    indice_empresas=None,
+    archivo=None,
+    procesos_parseo=None,
+    metricas=None,
+    cache=None,
+):
+    """
+    indice_empresas: IndiceEmpresas compartido por todos los trabajos (y ejecuciones anteriores);
+    las empresas ya enriquecidas no vuelven a visitar su web.
+    archivo: ArchivoHTML donde guardar cada listado descargado (re-parseo sin red).
+    cache: CacheHTTP de listados compartida por todos los trabajos (None = siempre a la red).
+    procesos_parseo: procesos compartidos por todos los trabajos para parsear listados
+    (None = uno por CPU, 0 = en los hilos de descarga).
+    por_host / pausa_inicial: techo de concurrencia y pausa de partida del ritmo adaptativo,
+    compartido por todos los trabajos (cada host lleva el suyo).
+    metricas: MetricasScraper del lote (por defecto una nueva); se vuelca a <carpeta>/metricas.json
+    mientras dura el lote.
+    """
+    carpeta = Path(carpeta)
+    carpeta_trabajos = carpeta / "trabajos"
+    carpeta_trabajos.mkdir(parents=True, exist_ok=True)
+    metricas = metricas or MetricasScraper("lotes")
+    ritmo = ControlRitmo(concurrencia_maxima=por_host, pausa_inicial=pausa_inicial, metricas=metricas, log_func=log)
+
+    inicio = time.perf_counter()
+    resultados = []
+    with VolcadoMetricas(metricas, carpeta / "metricas.json"), TuberiaParseo(
+        procesos_parseo, metricas=metricas
+    ) as tuberia, ThreadPoolExecutor(max_workers=max(1, int(hilos))) as pool:
+        futuros = {
+            pool.submit(
+                ejecutar_trabajo,
+                i,
+                t,
+                ritmo,
+                scrapear_email_web,
+                carpeta_trabajos,
+                indice_empresas,
+                archivo,
+                tuberia,
+                metricas,
+                cache,
+            ): (i, t)
+            for i, t in enumerate(trabajos)
+        }
+        for futuro in as_completed(futuros):
+            i, t = futuros[futuro]
+            try:
+                resultados.append(futuro.result())
+            except Exception as exc:
+                log(f"[{i + 1}] {t.get('what')} / {t.get('where')}: ❌ {exc}")
+                resultados.append(
+                    {
+                        "indice": i,
+                        "url": t.get("url"),
+                        "tipo_empresa": t.get("what"),
+                        "localidad": t.get("where"),
+                        "paginas": 0,
+                        "empresas": 0,
+                        "archivo": None,
+                        "error": str(exc),
+                        "_resultados": [],
+                    }
+                )
+
+    unificadas = unificar_resultados(resultados)
+    with open(carpeta / "empresas_unificadas.json", "w", encoding="utf-8") as f:
+        json.dump({"resultados": unificadas}, f, ensure_ascii=False, indent=4)
+
+    for res in resultados:
+        res.pop("_resultados", None)
+    resumen = {
+        "trabajos": len(trabajos),
+        "con_error": sum(1 for r in resultados if r["error"]),
+        "empresas_totales": sum(r["empresas"] for r in resultados),
+        "empresas_unicas": len(unificadas),
+        "segundos": round(time.perf_counter() - inicio, 1),
+        "indice": indice_empresas.resumen() if indice_empresas is not None else None,
+        "cache": cache.resumen() if cache is not None else None,
+        "metricas": metricas.a_dict(),
+        "ritmo": ritmo.resumen(),
+        "detalle": sorted(resultados, key=lambda r: r["indice"]),
+    }
+    with open(carpeta / "resumen.json", "w", encoding="utf-8") as f:
+        json.dump(resumen, f, ensure_ascii=False, indent=2)
+    return resumen
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trabajos", help="Fichero .csv, .yaml o .json con los trabajos")
+    parser.add_argument("--hilos", type=int, default=HILOS, help="Trabajos en paralelo")
+    parser.add_argument(
+        "--por-host", type=int, default=POR_HOST, help="Máximo de peticiones simultáneas por host (ritmo adaptativo)"
+    )
+    parser.add_argument("--max-paginas", type=int, default=MAX_PAGINAS, help="Por defecto para cada trabajo (0 = todas)")
+    parser.add_argument("--provincia", default=PROVINCIA, help="Por defecto para cada trabajo")
+    parser.add_argument("--email-web", action="store_true", help="Buscar email en la web de cada empresa")
+    parser.add_argument(
+        "--pausa-inicial", type=float, default=PAUSA_INICIAL_SECONDS,
+        help="Pausa inicial entre peticiones al mismo host (segundos); luego se adapta a las respuestas",
+    )
+    parser.add_argument("--salida", help="Carpeta de salida (por defecto resultados/lotes/<fichero>_<fecha>)")
+    parser.add_argument("--indice", default=str(RUTA_INDICE), help="Índice persistente de empresas ya vistas")
+    parser.add_argument("--sin-indice", action="store_true", help="Enriquecer todas las empresas de nuevo")
+    parser.add_argument(
+        "--max-edad-dias", type=float, default=MAX_EDAD_DIAS, help="Antigüedad a partir de la que se re-enriquece"
+    )
+    parser.add_argument("--cache", default=str(RUTA_CACHE), help="Cache HTTP persistente de listados")
+    parser.add_argument("--sin-cache", action="store_true", help="Descargar todos los listados de nuevo")
+    parser.add_argument(
+        "--cache-horas", type=float, default=MAX_EDAD_HORAS, help="Horas que un listado se sirve sin revalidar"
+    )
+    parser.add_argument(
+        "--archivar-html", action="store_true", help="Guardar los listados en resultados/archivo_html (archivo_html.py)"
+    )
+    parser.add_argument(
+        "--metricas-puerto", type=int, default=None, help="Servir las métricas en formato Prometheus (http://127.0.0.1:PUERTO/metrics)"
+    )
+    parser.add_argument(
+        "--perfil", choices=["cprofile", "pyinstrument"], default=motor_perfil(),
+        help="Perfilar el lote (por defecto la variable SCRAPER_PERFIL); se guarda junto a resumen.json",
+    )
+    parser.add_argument(
+        "--procesos-parseo", type=int, default=None, help="Procesos de parseo (por defecto uno por CPU; 0 = sin procesos)"
+    )
+    args = parser.parse_args(argv)
+
+    trabajos = cargar_trabajos(args.trabajos, args.max_paginas, args.provincia)
+    if not trabajos:
+        parser.error("El fichero no contiene trabajos")
+    carpeta = Path(args.salida) if args.salida else (
+        pa.OUTPUT_DIR / "lotes" / f"{Path(args.trabajos).stem}_{dt.datetime.now():%Y%m%d_%H%M%S}"
+    )
+    log(f"🚀 {len(trabajos)} trabajos | hilos={args.hilos} | por host={args.por_host} | salida={carpeta}")
+
+    indice_empresas = None if args.sin_indice else IndiceEmpresas(args.indice, args.max_edad_dias)
+    archivo = ArchivoHTML() if args.archivar_html else None
+    cache = None if args.sin_cache else CacheHTTP(args.cache, args.cache_horas)
+    metricas = MetricasScraper("lotes")
+    servidor = None
+    if args.metricas_puerto:
+        servidor = servir_prometheus(metricas, args.metricas_puerto)
+        log(f"📊 Métricas en http://127.0.0.1:{args.metricas_puerto}/metrics")
+    try:
+        with perfilar(args.perfil, carpeta / "perfil", log):
+            resumen = ejecutar_lote(
+                trabajos,
+                carpeta,
+                hilos=args.hilos,
+                por_host=args.por_host,
+                scrapear_email_web=args.email_web,
+                pausa_inicial=args.pausa_inicial,
+                indice_empresas=indice_empresas,
+                archivo=archivo,
+                procesos_parseo=args.procesos_parseo,
+                metricas=metricas,
+                cache=cache,
+            )
+    finally:
+        if servidor is not None:
+            servidor.shutdown()
+        if indice_empresas is not None:
+            indice_empresas.cerrar()
+        if archivo is not None:
+            archivo.cerrar()
+        if cache is not None:
+            cache.cerrar()
+    if resumen["indice"]:
+        log(f"🗂️ {resumen['indice']}")
+    if resumen["cache"]:
+        log(f"💾 {resumen['cache']}")
+    log(f"📊 {metricas.resumen()}")
+    log(
+        f"🎉 Lote finalizado: {resumen['empresas_unicas']} empresas únicas de {resumen['empresas_totales']} "
+        f"({resumen['con_error']} trabajos con error) en {resumen['segundos']}s"
+    )
+    return 1 if resumen["con_error"] == resumen["trabajos"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
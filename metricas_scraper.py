@@ -0,0 +1,262 @@
+"""
+Metricas de los scrapers: tiempos por etapa, bytes, codigos HTTP, reintentos y emails.
+
+Hasta ahora solo habia mensajes de log ("Página N guardada"). MetricasScraper acumula, con
+un lock para los hilos de descarga:
+- segundos y llamadas por etapa: descarga, parseo, enriquecimiento, escritura
+  (con las paginas procesadas sale el coste medio por pagina de cada etapa)
+- bytes descargados, histograma de codigos HTTP ("error" = fallo de red) y reintentos
+- empresas guardadas, cuantas con email y empresas por segundo
+Salidas:
+- a_dict() / VolcadoMetricas: fichero JSON reescrito cada pocos segundos (atomico)
+- a_prometheus() / servir_prometheus(puerto): texto en formato Prometheus por HTTP (/metrics)
+- perfilar(motor, salida): cProfile o pyinstrument (opcional) alrededor de un scraping;
+  los scrapers lo activan con la variable de entorno SCRAPER_PERFIL=cprofile|pyinstrument
+
+Lo usan WebScrapper_DAGM_ver6, WebScrapper_DAGM_ver1_empresite y lotes_paginas_amarillas.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+RUTA_METRICAS = Path("resultados") / "metricas"
+ETAPAS = ("descarga", "parseo", "enriquecimiento", "escritura")
+VOLCADO_CADA_SECONDS = 10.0
+VARIABLE_PERFIL = "SCRAPER_PERFIL"
+NO_DISPONIBLE = "No disponible"
+
+
+class MetricasScraper:
+    def __init__(self, nombre="scraper"):
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self.inicio = time.time()
+        self._t0 = time.perf_counter()
+        self.segundos = {e: 0.0 for e in ETAPAS}
+        self.llamadas = {e: 0 for e in ETAPAS}
+        self.paginas = 0
+        self.bytes_descargados = 0
+        self.estados_http = {}
+        self.reintentos = 0
+        self.empresas = 0
+        self.empresas_con_email = 0
+
+    # ---------------- REGISTRO ----------------
+
+    def sumar_tiempo(self, etapa, segundos):
+        with self._lock:
+            self.segundos[etapa] = self.segundos.get(etapa, 0.0) + segundos
+            self.llamadas[etapa] = self.llamadas.get(etapa, 0) + 1
+
+    @contextlib.contextmanager
+    def cronometro(self, etapa):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sumar_tiempo(etapa, time.perf_counter() - t0)
+
+    def registrar_descarga(self, status, bytes_leidos, segundos):
+        clave = str(status) if status else "error"
+        with self._lock:
+            self.estados_http[clave] = self.estados_http.get(clave, 0) + 1
+            self.bytes_descargados += bytes_leidos or 0
+        self.sumar_tiempo("descarga", segundos)
+
+    def registrar_reintento(self):
+        with self._lock:
+            self.reintentos += 1
+
+    def registrar_empresa(self, data):
+        con_email = bool(data.get("email")) and data.get("email") != NO_DISPONIBLE
+        with self._lock:
+            self.empresas += 1
+            if con_email:
+                self.empresas_con_email += 1
+
+    def registrar_pagina(self):
+        with self._lock:
+            self.paginas += 1
+
+    # ---------------- SALIDAS ----------------
+
+    def a_dict(self):
+        with self._lock:
+            transcurrido = time.perf_counter() - self._t0
+            paginas = self.paginas
+            return {
+                "nombre": self.nombre,
+                "inicio": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.inicio)),
+                "segundos_totales": round(transcurrido, 3),
+                "paginas": paginas,
+                "empresas": self.empresas,
+                "empresas_con_email": self.empresas_con_email,
+                "tasa_email": round(self.empresas_con_email / self.empresas, 4) if self.empresas else 0.0,
+                "empresas_por_segundo": round(self.empresas / transcurrido, 3) if transcurrido else 0.0,
+                "bytes_descargados": self.bytes_descargados,
+                "estados_http": dict(sorted(self.estados_http.items())),
+                "reintentos": self.reintentos,
+                "etapas": {
+                    e: {
+                        "segundos": round(self.segundos[e], 3),
+                        "llamadas": self.llamadas[e],
+                        "segundos_por_pagina": round(self.segundos[e] / paginas, 4) if paginas else 0.0,
+                    }
+                    for e in self.segundos
+                },
+            }
+
+    def a_prometheus(self):
+        d = self.a_dict()
+        etiqueta = f'scraper="{d["nombre"]}"'
+        lineas = []
+
+        def metrica(nombre, tipo, ayuda, valores):
+            lineas.append(f"# HELP scraper_{nombre} {ayuda}")
+            lineas.append(f"# TYPE scraper_{nombre} {tipo}")
+            for extra, valor in valores:
+                etiquetas = etiqueta + (f",{extra}" if extra else "")
+                lineas.append(f"scraper_{nombre}{{{etiquetas}}} {valor}")
+
+        metrica("paginas_total", "counter", "Paginas de listado procesadas", [("", d["paginas"])])
+        metrica("empresas_total", "counter", "Empresas guardadas", [("", d["empresas"])])
+        metrica("empresas_con_email_total", "counter", "Empresas guardadas con email", [("", d["empresas_con_email"])])
+        metrica("bytes_descargados_total", "counter", "Bytes de HTML descargados", [("", d["bytes_descargados"])])
+        metrica("reintentos_total", "counter", "Peticiones repetidas", [("", d["reintentos"])])
+        metrica(
+            "respuestas_http_total", "counter", "Respuestas por codigo HTTP (error = fallo de red)",
+            [(f'codigo="{c}"', n) for c, n in d["estados_http"].items()],
+        )
+        metrica(
+            "etapa_segundos_total", "counter", "Segundos acumulados por etapa",
+            [(f'etapa="{e}"', v["segundos"]) for e, v in d["etapas"].items()],
+        )
+        metrica(
+            "etapa_llamadas_total", "counter", "Veces que se ejecuto cada etapa",
+            [(f'etapa="{e}"', v["llamadas"]) for e, v in d["etapas"].items()],
+        )
+        metrica("empresas_por_segundo", "gauge", "Empresas guardadas por segundo", [("", d["empresas_por_segundo"])])
+        return "\n".join(lineas) + "\n"
+
+    def guardar(self, ruta):
+        ruta = Path(ruta)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = ruta.with_suffix(ruta.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.a_dict(), f, ensure_ascii=False, indent=2)
+        tmp.replace(ruta)
+
+    def resumen(self):
+        d = self.a_dict()
+        etapas = ", ".join(f"{e} {v['segundos']:.1f}s" for e, v in d["etapas"].items() if v["llamadas"])
+        return (
+            f"{d['paginas']} páginas, {d['empresas']} empresas ({d['tasa_email']:.0%} con email), "
+            f"{d['empresas_por_segundo']:.2f} empresas/s, {d['bytes_descargados'] / 2**20:.1f} MiB, "
+            f"HTTP {d['estados_http']}, {etapas}"
+        )
+
+
+class VolcadoMetricas:
+    """Hilo que reescribe el JSON de metricas cada cada_segundos (y una ultima vez al parar)."""
+
+    def __init__(self, metricas, ruta, cada_segundos=VOLCADO_CADA_SECONDS):
+        self.metricas = metricas
+        self.ruta = Path(ruta)
+        self.cada_segundos = cada_segundos
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, daemon=True)
+        self._hilo.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def _bucle(self):
+        while not self._parar.wait(self.cada_segundos):
+            self.metricas.guardar(self.ruta)
+
+    def parar(self):
+        self._parar.set()
+        self._hilo.join()
+        self.metricas.guardar(self.ruta)
+
+
+def servir_prometheus(metricas, puerto, host="127.0.0.1"):
+    """
+    Servidor HTTP en un hilo con las metricas en /metrics (formato de texto de Prometheus).
+    Devuelve el servidor: server.shutdown() para pararlo.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            cuerpo = metricas.a_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, int(puerto)), Manejador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+@contextlib.contextmanager
+def perfilar(motor, salida, log_func=print):
+    """
+    motor: None (no hace nada), "cprofile" (salida.prof, ver con snakeviz o pstats) o
+    "pyinstrument" (salida.html; si no esta instalado se usa cProfile).
+    """
+    if not motor:
+        yield
+        return
+    salida = Path(salida)
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    if motor == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            log_func("⚠️ pyinstrument no está instalado: se perfila con cProfile")
+            motor = "cprofile"
+        else:
+            perfil = Profiler()
+            perfil.start()
+            try:
+                yield
+            finally:
+                perfil.stop()
+                ruta = salida.with_suffix(".html")
+                ruta.write_text(perfil.output_html(), encoding="utf-8")
+                log_func(f"⏱️ Perfil guardado en: {ruta}")
+            return
+    if motor != "cprofile":
+        raise ValueError(f"Perfilador desconocido: {motor}")
+
+    import cProfile
+
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield
+    finally:
+        perfil.disable()
+        ruta = salida.with_suffix(".prof")
+        perfil.dump_stats(str(ruta))
+        log_func(f"⏱️ Perfil guardado en: {ruta}")
+
+
+def motor_perfil():
+    """Perfilador pedido en la variable de entorno SCRAPER_PERFIL (o None)."""
+    return (os.environ.get(VARIABLE_PERFIL) or "").strip().lower() or None
@@ -0,0 +1,104 @@
+"""
+Normalizacion de datos de empresa, compartida por los scrapers (WebScrapper_DAGM_ver6,
+Empresite), la extraccion por lotes, la deduplicacion (dedup_empresas) y el indice de
+empresas (indice_empresas). Cada modulo tenia su propia copia y se iban separando.
+
+- Valores tal como se guardan: limpiar_email, normalizar_telefono (+34XXXXXXXXX)
+- Claves para comparar empresas: valor_util, telefono_clave (ultimos 9 digitos),
+  obtener_dominio, normalizar_nombre_empresa (sin acentos ni forma juridica)
+"""
+import re
+import unicodedata
+from urllib.parse import urlparse
+
+VALORES_VACIOS = ("no disponible", "", "none", "null")
+
+# Dominios de correo gratuitos: no identifican a la empresa.
+DOMINIOS_GENERICOS = {
+    "gmail.com",
+    "hotmail.com",
+    "hotmail.es",
+    "outlook.com",
+    "outlook.es",
+    "yahoo.com",
+    "yahoo.es",
+    "live.com",
+    "icloud.com",
+    "telefonica.net",
+    "msn.com",
+}
+
+SUFIJOS_JURIDICOS = (
+    "s.l.", "sl", "s.l", "s.a.", "sa", "s.a",
+    "sociedad limitada", "sociedad anonima",
+    "slp", "s.l.p", "s.c", "sc",
+    "slu", "s.l.u", "s.l.u.",
+)
+# Solo como ultima palabra: " sa" dentro de "casa sanchez" no es una forma juridica.
+_sufijo_juridico = re.compile(
+    r"[\s,]+(?:%s)\s*$" % "|".join(re.escape(s) for s in sorted(SUFIJOS_JURIDICOS, key=len, reverse=True))
+)
+
+
+def valor_util(v):
+    """El valor como texto sin espacios, o None si esta vacio o es "No disponible"."""
+    if v is None:
+        return None
+    v = str(v).strip()
+    return v if v.lower() not in VALORES_VACIOS else None
+
+
+def limpiar_email(email):
+    return email.strip().rstrip(".,;:")
+
+
+def normalizar_telefono(telefono):
+    telefono = telefono.replace(" ", "").replace("-", "")
+    if telefono.startswith("+34"):
+        return telefono
+    if telefono.isdigit() and len(telefono) == 9:
+        return f"+34{telefono}"
+    return telefono
+
+
+def telefono_clave(telefono):
+    # Ultimos 9 digitos: +34 912345678 / 0034912345678 / 91 234 56 78 -> 912345678
+    telefono = valor_util(telefono)
+    if not telefono:
+        return None
+    digitos = re.sub(r"\D", "", telefono)
+    return digitos[-9:] if len(digitos) >= 9 else None
+
+
+def obtener_dominio(url):
+    url = valor_util(url)
+    if not url:
+        return None
+    if "://" not in url:
+        url = "http://" + url
+    try:
+        dominio = urlparse(url).netloc.lower().split(":")[0]
+    except ValueError:
+        return None
+    if dominio.startswith("www."):
+        dominio = dominio[4:]
+    return dominio if "." in dominio else None
+
+
+def normalizar_nombre_empresa(nombre):
+    # Sin acentos, sin forma juridica final (aunque haya varias: "x sl sa"), solo [a-z0-9].
+    nombre = valor_util(nombre)
+    if not nombre:
+        return None
+
+    nombre = unicodedata.normalize("NFKD", nombre)
+    nombre = nombre.encode("ascii", "ignore").decode("ascii")
+    nombre = nombre.lower().strip()
+
+    anterior = None
+    while nombre != anterior:
+        anterior = nombre
+        nombre = _sufijo_juridico.sub("", nombre)
+
+    nombre = re.sub(r"[^a-z0-9]", "", nombre)
+    return nombre if len(nombre) >= 3 else None
@@ -0,0 +1,161 @@
+"""
+Paginación de listados de Páginas Amarillas, compartida por WebScrapper_DAGM_ver5/ver6 y
+lotes_paginas_amarillas.
+
+En vez de probar página a página hasta un max_paginas adivinado, se lee la página 1:
+- nº total de resultados ("123 resultados") / fichas por página -> nº exacto de páginas
+- si no aparece, el mayor número de página enlazado en la paginación (cota inferior)
+y las páginas restantes conocidas se descargan en paralelo, procesándose en orden.
+Con una tuberia_parseo.TuberiaParseo el parseo de cada página va a un proceso en cuanto
+termina su descarga, en vez de esperar a su turno en el hilo que procesa.
+"""
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+PAGINAS_EN_PARALELO = 4
+
+total_resultados_regex = re.compile(
+    r"(\d{1,3}(?:[.\s]\d{3})+|\d+)\s+(?:resultados|empresas|negocios)\b", re.I
+)
+pagina_href_regex = re.compile(r"/all-nc/\"?(\d+)")
+
+
+def analizar_paginacion(html, por_pagina):
+    """
+    Devuelve (total_paginas, exacto):
+    - exacto=True: calculado con el nº total de resultados
+    - exacto=False: mayor página enlazada (puede haber más después)
+    - (None, False): la página no trae ni contador ni paginación
+    El contador solo se toma como total si viene de un elemento de total ([class*=total]) o
+    supera por_pagina: en un h1/h2 genérico "20 resultados" puede ser lo que trae esta página.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+
+    if por_pagina:
+        for selector, especifico in (("[class*=total]", True), ("h1, h2, [class*=result]", False)):
+            for tag in soup.select(selector):
+                match = total_resultados_regex.search(tag.get_text(" ", strip=True))
+                if not match:
+                    continue
+                total = int(re.sub(r"\D", "", match.group(1)))
+                if especifico or total > por_pagina:
+                    return max(1, math.ceil(total / por_pagina)), True
+
+    maximo = None
+    for a in soup.find_all("a", href=True):
+        match = pagina_href_regex.search(a["href"])
+        if match:
+            maximo = max(maximo or 0, int(match.group(1)))
+    for a in soup.select("[class*=pagina] a, [class*=pagination] a"):
+        texto = a.get_text(strip=True)
+        if texto.isdigit():
+            maximo = max(maximo or 0, int(texto))
+    return maximo, False
+
+
+def _firma(cajas):
+    # Algunas webs devuelven la última página (o la primera) para números fuera de rango.
+    # cajas: nodos de BeautifulSoup o registros ya parseados (dicts) si el parseo va en procesos.
+    return tuple(
+        (c.get_text(" ", strip=True) if hasattr(c, "get_text") else repr(c))[:120] for c in cajas[:3]
+    )
+
+
+def recorrer_paginas(
+    base_url,
+    max_paginas,
+    construir_url,
+    descargar,
+    cajas_fn,
+    procesar,
+    log_func,
+    hilos=PAGINAS_EN_PARALELO,
+    tuberia=None,
+    error_func=None,
+):
+    """
+    Recorre un listado completo.
+    - descargar(url) -> (status_code, html); status None = error de red (html = mensaje)
+    - cajas_fn(html) -> fichas de la página (vacía = no hay más)
+    - procesar(pagina, cajas): extrae/guarda la página (se llama en orden, en este hilo)
+    - max_paginas: tope opcional (0/None = todas)
+    - tuberia (tuberia_parseo.TuberiaParseo): cajas_fn se ejecuta en sus procesos nada más
+      descargarse cada página (tiene que ser una función de módulo que devuelva datos
+      serializables); los hilos de descarga esperan si el parseo va atrasado
+    - error_func(url, mensaje): fallos reales del listado: errores de red y respuestas no 200
+      de la página 1 o de páginas que la paginación daba por existentes (el 404 al probar más
+      allá de la última es el final normal y no se notifica)
+    Devuelve el nº de páginas procesadas.
+    """
+    limite = int(max_paginas or 0) or None
+    firma_anterior = None
+    procesadas = 0
+    conocidas = 1
+
+    def bajar(url, conservar_html=False):
+        status, html = descargar(url)
+        if tuberia is None or status != 200:
+            return status, html, None
+        futuro = tuberia.enviar(cajas_fn, html)
+        # El HTML ya va camino del proceso de parseo: aquí solo espera el resultado.
+        return status, (html if conservar_html else None), futuro
+
+    def tratar(pagina, status, html, futuro=None):
+        nonlocal firma_anterior, procesadas
+        log_func(f"📄 Scrapeando página {pagina}")
+        if status != 200:
+            log_func(f"❌ Error HTTP {status}" if status else f"❌ Error de red: {html}")
+            if error_func is not None and (not status or pagina <= conocidas):
+                url = construir_url(base_url, pagina)
+                error_func(url, f"HTTP {status}" if status else html)
+            return None
+        cajas = futuro.result() if futuro is not None else cajas_fn(html)
+        if not cajas:
+            log_func("⚠️ No hay más empresas")
+            return None
+        firma = _firma(cajas)
+        if firma == firma_anterior:
+            log_func("⚠️ Página repetida: fin de resultados")
+            return None
+        firma_anterior = firma
+        procesar(pagina, cajas)
+        procesadas += 1
+        return cajas
+
+    status, html, futuro = bajar(construir_url(base_url, 1), conservar_html=True)
+    cajas = tratar(1, status, html, futuro)
+    if not cajas:
+        return procesadas
+
+    total, exacto = analizar_paginacion(html, len(cajas))
+    if total:
+        detalle = "según nº de resultados" if exacto else "según la paginación"
+        log_func(f"🔢 {total} páginas ({detalle})")
+    ultima = total or 1
+    if limite:
+        ultima = min(ultima, limite)
+    conocidas = ultima
+
+    paginas = list(range(2, ultima + 1))
+    if paginas:
+        pool = ThreadPoolExecutor(max_workers=max(1, int(hilos)))
+        try:
+            futuros = [pool.submit(bajar, construir_url(base_url, p)) for p in paginas]
+            for pagina, futuro in zip(paginas, futuros):
+                if not tratar(pagina, *futuro.result()):
+                    return procesadas
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    if exacto:
+        return procesadas
+    # Sin contador: seguir probando después de la última página conocida.
+    pagina = ultima + 1
+    while limite is None or pagina <= limite:
+        if not tratar(pagina, *bajar(construir_url(base_url, pagina))):
+            break
+        pagina += 1
+    return procesadas
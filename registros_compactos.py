@@ -0,0 +1,182 @@
+"""
+Registros compactos para lo que se queda en memoria durante toda la ejecucion.
+
+Cada empresa scrapeada es un dict de diez cadenas, casi todas "No disponible"; el scraper de
+Empresite las acumula todas en empresas_totales y el consultor guarda cada fila de email de la
+base de datos como dict (emails_actuales/emails_reales/emails_posibles). Aqui:
+- clases con __slots__ (sin __dict__ por instancia)
+- None en vez de "No disponible"; localidad, codigo_postal, tipos y estados se internan
+  (se repiten en miles de registros y asi comparten una sola cadena)
+- los tres emails posibles (info@, contacto@, administracion@ del mismo dominio) se guardan
+  como el dominio
+- el esquema JSON de siempre solo se genera al serializar: json.dump(..., default=a_json)
+
+La lectura es compatible con los dicts de antes (registro["email"], registro.get("email")),
+asi que quien los consume no cambia.
+"""
+import sys
+
+NO_DISPONIBLE = "No disponible"
+PREFIJOS_POSIBLES = ("info", "contacto", "administracion")
+
+
+def _compactar(valor):
+    return None if valor is None or valor == NO_DISPONIBLE else valor
+
+
+def _internar(valor):
+    return sys.intern(valor) if isinstance(valor, str) else valor
+
+
+class RegistroCompacto:
+    __slots__ = ()
+    CAMPOS = ()
+
+    def _valor(self, campo):
+        return getattr(self, campo)
+
+    def __getitem__(self, campo):
+        if campo not in self.CAMPOS:
+            raise KeyError(campo)
+        return self._valor(campo)
+
+    def get(self, campo, defecto=None):
+        if campo not in self.CAMPOS:
+            return defecto
+        return self._valor(campo)
+
+    def __contains__(self, campo):
+        return campo in self.CAMPOS
+
+    def keys(self):
+        return list(self.CAMPOS)
+
+    def a_dict(self):
+        return {campo: self._valor(campo) for campo in self.keys()}
+
+    def __eq__(self, otro):
+        if not isinstance(otro, RegistroCompacto):
+            return NotImplemented
+        return self.a_dict() == otro.a_dict()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.a_dict()!r})"
+
+
+class Empresa(RegistroCompacto):
+    """
+    Empresa scrapeada (mismo esquema que new_empresa/extraer_empresa de los scrapers).
+    """
+
+    CAMPOS = (
+        "nombre",
+        "telefono",
+        "email",
+        "email_posible_info",
+        "email_posible_contacto",
+        "email_posible_administracion",
+        "web",
+        "direccion",
+        "codigo_postal",
+        "localidad",
+        "url_detalle",
+    )
+    # _posibles: dominio de los tres emails posibles, o tupla con los tres si no siguen el patron.
+    __slots__ = (
+        "nombre",
+        "telefono",
+        "email",
+        "_posibles",
+        "web",
+        "direccion",
+        "codigo_postal",
+        "localidad",
+        "url_detalle",
+    )
+
+    def __init__(self, nombre=None, telefono=None, email=None, web=None, direccion=None,
+                 codigo_postal=None, localidad=None, url_detalle=None, posibles=None):
+        self.nombre = nombre
+        self.telefono = telefono
+        self.email = email
+        self.web = web
+        self.direccion = direccion
+        self.codigo_postal = _internar(codigo_postal)
+        self.localidad = _internar(localidad)
+        self.url_detalle = url_detalle
+        self._posibles = posibles
+
+    @classmethod
+    def desde_dict(cls, data):
+        posibles = tuple(_compactar(data.get(f"email_posible_{p}")) for p in PREFIJOS_POSIBLES)
+        if posibles == (None, None, None):
+            posibles = None
+        else:
+            dominio = (posibles[0] or "").partition("@")[2]
+            if dominio and posibles == tuple(f"{p}@{dominio}" for p in PREFIJOS_POSIBLES):
+                posibles = dominio
+        return cls(
+            nombre=_compactar(data.get("nombre")),
+            telefono=_compactar(data.get("telefono")),
+            email=_compactar(data.get("email")),
+            web=_compactar(data.get("web")),
+            direccion=_compactar(data.get("direccion")),
+            codigo_postal=_compactar(data.get("codigo_postal")),
+            localidad=_compactar(data.get("localidad")),
+            url_detalle=data.get("url_detalle"),
+            posibles=posibles,
+        )
+
+    def _valor(self, campo):
+        if campo.startswith("email_posible_"):
+            posibles = self._posibles
+            if posibles is None:
+                return NO_DISPONIBLE
+            i = PREFIJOS_POSIBLES.index(campo[len("email_posible_"):])
+            if isinstance(posibles, str):
+                return f"{PREFIJOS_POSIBLES[i]}@{posibles}"
+            return posibles[i] or NO_DISPONIBLE
+        valor = getattr(self, campo)
+        if campo == "url_detalle":
+            return valor
+        return NO_DISPONIBLE if valor is None else valor
+
+    def keys(self):
+        # url_detalle solo existe en las empresas de Empresite.
+        return list(self.CAMPOS if self.url_detalle is not None else self.CAMPOS[:-1])
+
+    def __contains__(self, campo):
+        return campo in self.keys()
+
+
+class FilaEmail(RegistroCompacto):
+    """
+    Fila de consultor_core.iterar_emails_empresas (ventana de envio y CLI).
+    """
+
+    CAMPOS = ("id_empresa", "id_email", "id_tipo_email", "nombre", "email", "tipo_empresa", "localidad", "id_estado")
+    __slots__ = CAMPOS
+
+    def __init__(self, id_empresa=None, id_email=None, id_tipo_email=None, nombre=None, email=None,
+                 tipo_empresa=None, localidad=None, id_estado=None):
+        self.id_empresa = id_empresa
+        self.id_email = id_email
+        self.id_tipo_email = _internar(id_tipo_email)
+        self.nombre = nombre
+        self.email = email
+        self.tipo_empresa = _internar(tipo_empresa)
+        self.localidad = _internar(localidad)
+        self.id_estado = _internar(id_estado)
+
+    @classmethod
+    def desde_fila(cls, fila):
+        return cls(**{campo: fila.get(campo) for campo in cls.CAMPOS})
+
+
+def a_json(obj):
+    """default= para json.dump/json.dumps: cada registro se convierte a dict al escribirlo."""
+    if isinstance(obj, RegistroCompacto):
+        return obj.a_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
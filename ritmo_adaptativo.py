@@ -0,0 +1,267 @@
+"""
+Ritmo adaptativo por host (AIMD, como el control de congestion de TCP).
+
+Las pausas fijas (random.uniform(0.3, 0.7) por empresa, DETAIL_DELAY_SECONDS...) son lentas
+cuando la web responde bien y no frenan cuando empieza a rechazar. ControlRitmo ajusta, por
+host, cuantas peticiones van a la vez y la pausa entre ellas segun lo que responde el servidor:
+- 200 (o 304) y rapida: la pausa baja un paso y, tras una ventana de respuestas buenas
+  (tantas como la concurrencia actual), la concurrencia sube en 1 (subida aditiva)
+- 429/503, pagina de desafio (captcha, Cloudflare...), error de red o latencia muy por encima
+  de la media del host: concurrencia a la mitad y pausa al doble (bajada multiplicativa);
+  se respeta Retry-After. Un solo frenazo por VENTANA_FRENO_SECONDS: las respuestas que ya
+  estaban en vuelo no vuelven a frenar.
+
+Uso:
+    ritmo = ControlRitmo(log_func=print)
+    r = ritmo.get(sesion, url, timeout=15)   # requests: espera turno, informa y repite si rechaza
+    with ritmo.turno(url) as turno:          # cualquier otra descarga (Selenium...)
+        html = descargar(url)
+        turno.informar(200, html)
+"""
+import contextlib
+import email.utils
+import random
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+CONCURRENCIA_INICIAL = 2
+CONCURRENCIA_MAXIMA = 8
+PAUSA_INICIAL_SECONDS = 0.5
+PAUSA_MINIMA_SECONDS = 0.0
+PAUSA_MAXIMA_SECONDS = 60.0
+PAUSA_FRENO_SECONDS = 1.0  # pausa minima tras un frenazo
+PASO_PAUSA_SECONDS = 0.05  # lo que baja la pausa con cada respuesta buena
+FACTOR_FRENO = 0.5
+VENTANA_FRENO_SECONDS = 2.0
+FACTOR_LATENCIA = 3.0  # pico = latencia > FACTOR_LATENCIA x media del host...
+LATENCIA_PICO_MINIMA_SECONDS = 1.0  # ...y por encima de este minimo (el ruido de 20 a 70 ms no cuenta)
+ALFA_LATENCIA = 0.2  # peso de la ultima respuesta en la media movil
+JITTER = 0.5  # cada pausa real es pausa x uniform(1 - JITTER, 1 + JITTER)
+RETRY_AFTER_MAXIMO_SECONDS = 300.0
+REINTENTOS = 3
+CODIGOS_FRENO = {429, 503}
+TAMANO_MAXIMO_DESAFIO = 64 * 1024  # las paginas de desafio son pequeñas; un listado real no se analiza
+
+_desafio_regex = re.compile(
+    r"cf-chl|challenge-platform|cf-browser-verification|attention required|captcha-delivery|px-captcha"
+    r"|_incapsula_resource|are you a robot|unusual traffic|verifica que eres humano|captcha",
+    re.I,
+)
+
+
+def parece_desafio(html):
+    """Pagina de captcha/anti-bot en vez del contenido pedido."""
+    return bool(html) and len(html) <= TAMANO_MAXIMO_DESAFIO and bool(_desafio_regex.search(html))
+
+
+def segundos_retry_after(valor):
+    """Cabecera Retry-After (segundos o fecha HTTP) -> segundos, o None."""
+    if not valor:
+        return None
+    valor = str(valor).strip()
+    if valor.isdigit():
+        segundos = float(valor)
+    else:
+        try:
+            segundos = email.utils.parsedate_to_datetime(valor).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(0.0, segundos), RETRY_AFTER_MAXIMO_SECONDS)
+
+
+def host_de(url):
+    return urlparse(url).netloc.lower()
+
+
+class EstadoHost:
+    def __init__(self, host, concurrencia, pausa):
+        self.host = host
+        self.concurrencia = float(concurrencia)
+        self.pausa = float(pausa)
+        self.en_vuelo = 0
+        self.proxima = 0.0  # time.monotonic() a partir del que puede salir la siguiente peticion
+        self.latencia_media = None
+        self.buenas = 0
+        self.ultimo_freno = None
+        self.peticiones = 0
+        self.frenazos = 0
+        self.espera_segundos = 0.0
+
+    def a_dict(self):
+        return {
+            "concurrencia": int(self.concurrencia),
+            "pausa": round(self.pausa, 3),
+            "latencia_media": round(self.latencia_media, 3) if self.latencia_media is not None else None,
+            "peticiones": self.peticiones,
+            "frenazos": self.frenazos,
+            "espera_segundos": round(self.espera_segundos, 1),
+        }
+
+
+class Turno:
+    """Una peticion en vuelo; informar() con lo que respondio el servidor."""
+
+    def __init__(self, control, estado):
+        self.control = control
+        self.estado = estado
+        self.t0 = time.perf_counter()
+        self.informado = False
+        self.rechazado = False  # 429/503, desafio o error de red: merece repetirse
+        self.frenado = False
+
+    def informar(self, status, html=None, retry_after=None, desafio=None):
+        """
+        status None = error de red. desafio: None = detectarlo en html (parece_desafio).
+        Devuelve True si la respuesta fue un rechazo.
+        """
+        self.informado = True
+        if desafio is None:
+            desafio = parece_desafio(html)
+        self.control._informar(self, status, time.perf_counter() - self.t0, desafio, segundos_retry_after(retry_after))
+        return self.rechazado
+
+
+class ControlRitmo:
+    """
+    Compartido por todos los hilos que descargan; cada host lleva su propio ritmo.
+    concurrencia_maxima=1 para descargas en serie (un solo navegador) y factor_latencia=None
+    cuando el tiempo medido no es solo de red (esperas de Selenium).
+    """
+
+    def __init__(
+        self,
+        concurrencia_inicial=CONCURRENCIA_INICIAL,
+        concurrencia_maxima=CONCURRENCIA_MAXIMA,
+        pausa_inicial=PAUSA_INICIAL_SECONDS,
+        pausa_minima=PAUSA_MINIMA_SECONDS,
+        pausa_maxima=PAUSA_MAXIMA_SECONDS,
+        factor_latencia=FACTOR_LATENCIA,
+        metricas=None,
+        log_func=None,
+    ):
+        self.concurrencia_maxima = max(1, int(concurrencia_maxima))
+        self.concurrencia_inicial = min(self.concurrencia_maxima, max(1, int(concurrencia_inicial)))
+        self.pausa_inicial = float(pausa_inicial)
+        self.pausa_minima = float(pausa_minima)
+        self.pausa_maxima = float(pausa_maxima)
+        self.factor_latencia = factor_latencia
+        self.metricas = metricas
+        self.log_func = log_func
+        self._cond = threading.Condition()
+        self._hosts = {}
+
+    def _estado(self, host):
+        estado = self._hosts.get(host)
+        if estado is None:
+            estado = self._hosts[host] = EstadoHost(host, self.concurrencia_inicial, self.pausa_inicial)
+        return estado
+
+    @contextlib.contextmanager
+    def turno(self, url):
+        """Espera a que el host admita otra peticion (concurrencia y pausa) y la cuenta en vuelo."""
+        t0 = time.monotonic()
+        with self._cond:
+            estado = self._estado(host_de(url))
+            while True:
+                ahora = time.monotonic()
+                if estado.en_vuelo < int(estado.concurrencia) and ahora >= estado.proxima:
+                    break
+                self._cond.wait(estado.proxima - ahora if ahora < estado.proxima else None)
+            estado.en_vuelo += 1
+            estado.peticiones += 1
+            estado.espera_segundos += ahora - t0
+            estado.proxima = ahora + estado.pausa * random.uniform(1 - JITTER, 1 + JITTER)
+        turno = Turno(self, estado)
+        try:
+            yield turno
+        finally:
+            if not turno.informado:
+                turno.informar(None)
+            with self._cond:
+                estado.en_vuelo -= 1
+                self._cond.notify_all()
+
+    def _informar(self, turno, status, segundos, desafio, retry_after):
+        estado = turno.estado
+        with self._cond:
+            motivo = None
+            if status is None:
+                motivo = "error de red"
+            elif status in CODIGOS_FRENO:
+                motivo = f"HTTP {status}"
+            elif desafio:
+                motivo = "página de desafío"
+            turno.rechazado = motivo is not None
+
+            if status is not None and not desafio:
+                media = estado.latencia_media
+                if (
+                    motivo is None
+                    and self.factor_latencia
+                    and media is not None
+                    and segundos > max(LATENCIA_PICO_MINIMA_SECONDS, self.factor_latencia * media)
+                ):
+                    motivo = f"latencia {segundos:.1f}s (media {media:.1f}s)"
+                # El pico tambien entra en la media: si el host se vuelve lento para siempre, deja de ser pico.
+                estado.latencia_media = segundos if media is None else media + ALFA_LATENCIA * (segundos - media)
+
+            if motivo is not None:
+                turno.frenado = self._frenar(estado, motivo, retry_after)
+            elif status in (200, 304):
+                estado.pausa = max(self.pausa_minima, estado.pausa - PASO_PAUSA_SECONDS)
+                estado.buenas += 1
+                if estado.buenas >= int(estado.concurrencia) and estado.concurrencia < self.concurrencia_maxima:
+                    estado.concurrencia = min(self.concurrencia_maxima, estado.concurrencia + 1)
+                    estado.buenas = 0
+            self._cond.notify_all()
+
+    def _frenar(self, estado, motivo, retry_after):
+        ahora = time.monotonic()
+        if retry_after:
+            estado.proxima = max(estado.proxima, ahora + retry_after)
+        if estado.ultimo_freno is not None and ahora - estado.ultimo_freno < VENTANA_FRENO_SECONDS:
+            return False
+        estado.ultimo_freno = ahora
+        estado.frenazos += 1
+        estado.buenas = 0
+        estado.concurrencia = max(1.0, estado.concurrencia * FACTOR_FRENO)
+        estado.pausa = min(self.pausa_maxima, max(estado.pausa * 2, PAUSA_FRENO_SECONDS))
+        estado.proxima = max(estado.proxima, ahora + estado.pausa)
+        if self.log_func:
+            espera = f", Retry-After {retry_after:.0f}s" if retry_after else ""
+            self.log_func(
+                f"🐢 {estado.host}: {motivo} -> concurrencia {int(estado.concurrencia)}, pausa {estado.pausa:.1f}s{espera}"
+            )
+        return True
+
+    def get(self, sesion, url, reintentos=REINTENTOS, **kwargs):
+        """
+        sesion.get(url, **kwargs) (requests.Session o el propio modulo requests) con turno del host.
+        Si el servidor rechaza (429/503, desafio, error de red) se repite tras el frenazo, hasta
+        reintentos veces; devuelve la ultima respuesta o propaga la ultima excepcion.
+        """
+        import requests
+
+        for intento in range(reintentos + 1):
+            ultimo = intento == reintentos
+            if intento and self.metricas is not None:
+                self.metricas.registrar_reintento()
+            with self.turno(url) as turno:
+                try:
+                    r = sesion.get(url, **kwargs)
+                except requests.RequestException:
+                    turno.informar(None)
+                    if ultimo:
+                        raise
+                    continue
+                # Solo se decodifica lo que puede ser una pagina de desafio.
+                html = r.text if len(r.content) <= TAMANO_MAXIMO_DESAFIO else None
+                turno.informar(r.status_code, html, r.headers.get("Retry-After"))
+            if not turno.rechazado or ultimo:
+                return r
+
+    def resumen(self):
+        with self._cond:
+            return {host: estado.a_dict() for host, estado in self._hosts.items()}
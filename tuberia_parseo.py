@@ -0,0 +1,126 @@
+"""
+Etapa de parseo en procesos, separada de la descarga.
+
+Los scrapers parseaban con BeautifulSoup en el mismo hilo que descargaba: el parseo (CPU) y
+las esperas de red se turnaban, y con el GIL los hilos de descarga nunca pasan de un nucleo.
+Con TuberiaParseo:
+- el hilo que descarga envia el HTML crudo (enviar) y vuelve a descargar
+- un ProcessPoolExecutor ejecuta la funcion de extraccion y devuelve registros ya
+  estructurados (dicts); en memoria se quedan los registros, no el HTML
+- como mucho max_pendientes HTML en vuelo: si el parseo va atrasado, enviar bloquea al hilo
+  de descarga (contrapresion) y la memoria no crece con el tamaño del crawl
+
+La funcion de extraccion tiene que ser de modulo (se envia por pickle) y devolver datos
+serializables: WebScrapper_DAGM_ver6.parsear_listado, extraer_datos_ficha_desde_html...
+Con procesos=0 se parsea en el mismo hilo (misma interfaz, sin procesos).
+Con metricas (metricas_scraper.MetricasScraper) se suma el tiempo de CPU de cada parseo,
+medido dentro del proceso, a la etapa "parseo".
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# HTML en vuelo por proceso: uno parseandose y otro esperando en la cola del pool.
+PENDIENTES_POR_PROCESO = 2
+
+
+def procesos_por_defecto():
+    return os.cpu_count() or 1
+
+
+def _cronometrado(funcion, args):
+    t0 = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - t0
+
+
+class TuberiaParseo:
+    """
+    with TuberiaParseo() as tuberia:
+        futuro = tuberia.enviar(parsear_listado, html)   # desde cualquier hilo
+        registros = futuro.result()
+    procesos: None = uno por CPU, 0 = sin procesos (parseo en el hilo que llama a enviar).
+    """
+
+    def __init__(self, procesos=None, max_pendientes=None, metricas=None):
+        self.procesos = procesos_por_defecto() if procesos is None else max(0, int(procesos))
+        self.max_pendientes = max(1, int(max_pendientes or max(1, self.procesos) * PENDIENTES_POR_PROCESO))
+        self._huecos = threading.BoundedSemaphore(self.max_pendientes)
+        self._lock = threading.Lock()
+        self.metricas = metricas
+        self.enviados = 0
+        self.esperas = 0  # veces que un hilo de descarga tuvo que esperar a que el parseo liberase hueco
+        self._pool = None
+        if self.procesos:
+            # spawn: los scrapers tienen hilos vivos (GUI, descargas) y fork con hilos puede colgarse.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.procesos, mp_context=multiprocessing.get_context("spawn")
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.cerrar(cancelar=exc_type is not None)
+
+    def enviar(self, funcion, *args):
+        """Future con funcion(*args); bloquea mientras haya max_pendientes parseos en vuelo."""
+        if self._pool is None:
+            futuro = Future()
+            try:
+                resultado, segundos = _cronometrado(funcion, args)
+            except Exception as exc:
+                futuro.set_exception(exc)
+            else:
+                self._sumar_parseo(segundos)
+                futuro.set_result(resultado)
+            with self._lock:
+                self.enviados += 1
+            return futuro
+
+        if not self._huecos.acquire(blocking=False):
+            with self._lock:
+                self.esperas += 1
+            self._huecos.acquire()
+        try:
+            interno = self._pool.submit(_cronometrado, funcion, args)
+        except BaseException:
+            self._huecos.release()
+            raise
+        with self._lock:
+            self.enviados += 1
+        futuro = Future()
+        interno.add_done_callback(lambda f: self._terminado(f, futuro))
+        return futuro
+
+    def _terminado(self, interno, futuro):
+        self._huecos.release()
+        if interno.cancelled():
+            futuro.cancel()
+            return
+        exc = interno.exception()
+        if exc is not None:
+            futuro.set_exception(exc)
+            return
+        resultado, segundos = interno.result()
+        self._sumar_parseo(segundos)
+        futuro.set_result(resultado)
+
+    def _sumar_parseo(self, segundos):
+        if self.metricas is not None:
+            self.metricas.sumar_tiempo("parseo", segundos)
+
+    def resumen(self):
+        return {
+            "procesos": self.procesos,
+            "max_pendientes": self.max_pendientes,
+            "enviados": self.enviados,
+            "esperas": self.esperas,
+        }
+
+    def cerrar(self, cancelar=False):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=cancelar)
+            self._pool = None